@@ -1,3 +1,15 @@
+from .ardoqpy_logging import *
+from .ardoqpy_metrics import *
+from .ardoqpy_codec import *
+from .ardoqpy_transport import *
+from .ardoqpy_model import *
 from .ardoqpy import *
-from .ardoqpy_sync import *
 from .ardoqpy_v2 import *
+from .ardoqpy_store import *
+from .ardoqpy_stream import *
+from .ardoqpy_records import *
+from .ardoqpy_graph import *
+from .ardoqpy_query import *
+from .ardoqpy_pipeline import *
+from .ardoqpy_sync import *
+from .ardoqpy_async import *
@@ -1,11 +1,17 @@
 # coding: utf-8
 
-import requests
+import hashlib
 import json
-from http import cookiejar
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 import logging
+import random
+import threading
+import time
+from ardoqpy import RequestEvent, Span, NO_SPAN, emit, resource_template, Transport, WorkspaceModel
 
-logging.basicConfig(format='%(asctime)s %(message)s', level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 '''
@@ -19,12 +25,6 @@ logger = logging.getLogger(__name__)
 '''
 
 
-class BlockAll(cookiejar.CookiePolicy):
-    return_ok = set_ok = domain_return_ok = path_return_ok = lambda self, *args, **kwargs: False
-    netscape = True
-    rfc2965 = hide_cookie2 = False
-
-
 class ArdoqClientException(Exception):
     pass
 
@@ -45,13 +45,428 @@ class BadRequest(ArdoqClientException):
     """Error in data provided in the request."""
 
 
-class ArdoqClient(object):
+class TooManyRequests(ServiceUnavailable):
+    """The request was rate limited by ardoq (HTTP 429)."""
+
+
+def exception_for_status(code):
+    """
+    :param code: HTTP status code of a failed request
+    :return: the ArdoqClientException subclass for that status
+    """
+    if code == 400 or code == 422:
+        return BadRequest
+    if code == 401 or code == 403:
+        return AuthorizationError
+    if code == 404:
+        return NotFoundError
+    if code == 429:
+        return TooManyRequests
+    if code >= 500:
+        return ServiceUnavailable
+    return ArdoqClientException
+
+
+def retry_after_seconds(value):
+    """
+    :param value: Retry-After header. either seconds or an HTTP date
+    :return: seconds to wait or None if there is no usable header
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy(object):
+    """
+    decides if a failed request is retried and how long to wait before the retry
+    waits are exponential backoff with full jitter, or the Retry-After header from ardoq if there is one,
+    up to max_retry_after seconds so a large or bogus header can't stall a run
+    ArdoqClient, API and AsyncArdoqClient use RetryPolicy() by default, i.e. up to 5 retries
+    only idempotent methods are retried after server errors and connection errors.
+    POST and PATCH are only retried for safe_statuses, where ardoq rejected the request without processing it
+    subclass and override should_retry and delay for other rules
+    """
+    idempotent_methods = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60, max_retry_after=120,
+                 retry_statuses=(429, 500, 502, 503, 504), safe_statuses=(429,)):
+        """
+        :param max_retries: max number of retries for one request. 0 turns retries off
+        :param backoff: wait before the first retry in seconds. doubles for each retry
+        :param max_backoff: max wait in seconds when there is no Retry-After header
+        :param max_retry_after: max wait in seconds for a Retry-After header. longer waits are cut to this
+        :param retry_statuses: HTTP status codes that can be retried
+        :param safe_statuses: status codes that are retried for non-idempotent methods too
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = retry_statuses
+        self.safe_statuses = safe_statuses
+
+    def should_retry(self, method, status, attempt):
+        """
+        :param method: HTTP method
+        :param status: HTTP status code, None if the request failed with a connection error or timeout
+        :param attempt: number of retries already done
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status is None:
+            return method in self.idempotent_methods
+        if status not in self.retry_statuses:
+            return False
+        return method in self.idempotent_methods or status in self.safe_statuses
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt: number of retries already done
+        :param retry_after: Retry-After header from the response, if any
+        :return: seconds to wait before the next retry
+        """
+        seconds = retry_after_seconds(retry_after)
+        if seconds is not None:
+            return min(seconds, self.max_retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class TokenBucket(object):
+    """
+    client side rate limiter. allows rate requests per second on average with bursts of up to burst requests
+    thread safe, so one bucket can be shared by all the clients and threads that count against the same quota
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        takes a token
+        :return: seconds to wait before the token can be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+
+def _cache_resource(url):
+    # (first, last) resource names in a url path, singular. ids aren't words, so they are never taken for names
+    # /api/component/search -> (component, search), /api/v2/workspaces/{id}/context -> (workspace, context)
+    words = [seg[:-1] if seg.endswith('s') else seg
+             for seg in urlsplit(url).path.split('/') if seg.isalpha() and seg != 'api']
+    if not words:
+        return '', ''
+    return words[0], words[-1]
+
+
+class ResponseCache(object):
+    """
+    LRU cache of GET responses for ArdoqClient and API, for reads of slowly changing resources like models
+    a response is served from the cache for ttl seconds. after that it is revalidated with If-None-Match or
+    If-Modified-Since if ardoq sent an ETag or Last-Modified, and a 304 renews it without downloading the body
+    writes invalidate the cached responses of the same resource, including its sub-resources like component/search,
+    and of the resources that contain it, e.g. a component write drops cached components, component searches
+    and workspaces but keeps models.
+    call invalidate() after changes made by other clients
+    the response bodies are cached and decoded on each hit, so callers can change what they get.
+    thread safe, so one cache can be shared by several clients. responses are keyed by the credentials of the client
+    too (a hash of its token and org), so clients with other tokens or orgs don't get each other's responses
+    """
+
+    # resource written -> other cached resources it makes stale, matched to the last name in their url. None for all
+    invalidates = {
+        'component': ('workspace', 'aggregated'),
+        'reference': ('workspace', 'aggregated'),
+        'tag': ('workspace', 'aggregated'),
+        'workspace': None,
+        'batch': None,
+        'model': ('context',),
+        'field': ('model', 'context'),
+    }
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=60):
+        """
+        :param max_entries: max number of cached responses. the least recently used are dropped
+        :param max_bytes: max total size of the cached bodies
+        :param ttl: seconds a response is used without asking ardoq. 0 revalidates on every read
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (url, params, credentials) -> [body, etag, last_modified, stored, (first, last) name]
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url, params=None, credentials=''):
+        '''
+        :param credentials: identity of the client's credentials, see _credentials_key
+        '''
+        if not params:
+            return url, (), credentials
+        return url, tuple(sorted((k, str(v)) for k, v in params.items() if v is not None)), credentials
+
+    def lookup(self, key):
+        """
+        :return: (body, validator headers). body is None on a miss. headers is None if the body is fresh
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            if time.monotonic() - entry[3] < self.ttl:
+                self.hits += 1
+                return entry[0], None
+            headers = {}
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+            if not headers:  # nothing to revalidate with
+                self._drop(key)
+                self.misses += 1
+                return None, None
+            return entry[0], headers
+
+    def renew(self, key):
+        # ardoq answered 304 Not Modified
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[3] = time.monotonic()
+            self.revalidated += 1
+
+    def store(self, key, body, etag=None, last_modified=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = [body, etag, last_modified, time.monotonic(), _cache_resource(key[0])]
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._size -= len(entry[0])
+
+    def invalidate(self, url=None):
+        """
+        drops the responses a write to url makes stale. drops everything if url is None
+        """
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            collection = _cache_resource(url)[0]
+            stale = self.invalidates.get(collection, ())
+            for key in [k for k, e in self._entries.items()
+                        if stale is None or collection in e[4] or e[4][1] in stale]:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'hits': self.hits,
+                    'revalidated': self.revalidated, 'misses': self.misses}
+
+
+def _credentials_key(headers):
+    # identity of the token and org in request headers, for ResponseCache keys. hashed so keys don't hold tokens
+    creds = '\n'.join('%s: %s' % (k, headers[k]) for k in ('Authorization', 'X-org') if k in headers)
+    return hashlib.sha256(creds.encode('utf-8')).hexdigest()
+
+
+class RestClient(object):
+    """
+    the request layer shared by ArdoqClient and API
+    sends requests on a Transport, waits for the rate limiter, retries according to the retry policy,
+    raises ArdoqClientException subclasses for errors, and calls the hooks after each request
+    """
+
+    def __init__(self, headers, retry=RetryPolicy(), rate_limit=None, hooks=None, transport=None, cache=None):
+        '''
+        :param headers: headers sent with each request, e.g. authorization
+        :param retry: RetryPolicy for throttled and failed requests. None turns retries off
+        :param rate_limit: optional, max requests per second, or a TokenBucket to share between clients
+        :param hooks: optional, list of callables that get a RequestEvent after each request (see Metrics)
+        :param transport: optional, Transport to use, e.g. one shared with other clients and threads.
+            defaults to a Transport with a pool of 10 connections
+        :param cache: optional, ResponseCache for GET responses
+        '''
+        self._headers = headers
+        self.transport = transport or Transport()
+        self.session = self.transport.session  # the underlying requests.Session, or httpx.Client for http2
+        self.retry = retry
+        if rate_limit is not None and not isinstance(rate_limit, TokenBucket):
+            rate_limit = TokenBucket(rate_limit)
+        self.rate_limiter = rate_limit
+        self.hooks = list(hooks or [])
+        self.cache = cache
+        self._cache_credentials = _credentials_key(headers)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _span(self, name, **attrs):
+        # times a block as a SpanEvent for the hooks. does nothing if there are no hooks
+        if not self.hooks:
+            return NO_SPAN
+        return Span(self.hooks, name, attrs)
+
+    def _new_transport(self, pool_size=None):
+        '''
+        creates a transport with the options of the client transport and its own connections
+        :param pool_size: max number of pooled connections. defaults to the pool size of the client transport
+        '''
+        return self.transport.copy(pool_size=pool_size or self.transport.pool_size)
+
+    def _unwrap_response(self, resp):
+        code = resp.status_code
+
+        if code == 200 or code == 201:
+            return self.transport.codec.loads(resp.content)
+        elif code == 204:
+            return {}
+        else:
+            logger.debug('request: %s', resp.request.body)
+            raise exception_for_status(code)({'code': code, 'reason': resp.reason, 'text': resp.text})
+
+    def _http_request(self, method, url, transport=None, raw=False, **kwargs):
+        """
+        sends the request, waiting for the rate limiter, and retries it according to the retry policy
+        this is _request in ArdoqClient
+        :param transport: optional, transport to use instead of the client transport
+        :param raw: return the response instead of the unwrapped json. errors are still raised
+        :return: the unwrapped response
+        """
+        if self.cache is not None and method != 'GET':
+            try:
+                return self._observed(method, url, transport, raw, **kwargs)
+            finally:
+                self.cache.invalidate(url)
+        return self._observed(method, url, transport, raw, **kwargs)
+
+    def _observed(self, method, url, transport, raw, **kwargs):
+        # _send with a RequestEvent for the hooks
+        if not self.hooks:
+            return self._send(method, url, transport, raw, None, **kwargs)
+        event = RequestEvent(method, resource_template(url))
+        start = time.perf_counter()
+        try:
+            return self._send(method, url, transport, raw, event, **kwargs)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.seconds = time.perf_counter() - start
+            emit(self.hooks, event)
+
+    def _cached_get(self, url, params=None):
+        """
+        GET through the response cache. a fresh cached response is returned without a request,
+        a stale one is revalidated
+        """
+        key = self.cache.key(url, params, self._cache_credentials)
+        body, validators = self.cache.lookup(key)
+        if body is not None and validators is None:
+            return self.transport.codec.loads(body)
+        resp = self._observed('GET', url, None, True, params=params, headers=validators)
+        if resp.status_code == 304 and body is not None:
+            self.cache.renew(key)
+            return self.transport.codec.loads(body)
+        res = self._unwrap_response(resp)
+        if resp.status_code == 200:
+            self.cache.store(key, resp.content, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+        return res
+
+    def _send(self, method, url, transport, raw, event, headers=None, **kwargs):
+        # the retry loop of _http_request. fills in event if it isn't None
+        transport = transport or self.transport
+        headers = dict(self._headers, **headers) if headers else self._headers
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                if event is None:
+                    self.rate_limiter.acquire()
+                else:
+                    start = time.perf_counter()
+                    self.rate_limiter.acquire()
+                    event.queue_seconds += time.perf_counter() - start
+            try:
+                resp = transport.request(method, url, headers=headers, **kwargs)
+            except transport.errors as e:
+                if event is not None:
+                    event.status = None
+                    event.retries = attempt
+                if self.retry is None or not self.retry.should_retry(method, None, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning('%s %s failed: %s. retry %s in %.2fs', method, url, e, attempt + 1, delay,
+                               extra={'method': method, 'url': url, 'error': type(e).__name__,
+                                      'retry': attempt + 1, 'delay': delay})
+            else:
+                code = resp.status_code
+                if event is not None:
+                    event.status = code
+                    event.retries = attempt
+                    event.bytes_out = len(resp.request.body or b'')
+                    if raw and code < 400:  # the body might not have been read yet
+                        event.bytes_in = int(resp.headers.get('Content-Length') or 0)
+                    else:
+                        event.bytes_in = len(resp.content)
+                if raw and code < 400:
+                    return resp
+                if code < 400 or self.retry is None or not self.retry.should_retry(method, code, attempt):
+                    return self._unwrap_response(resp)
+                delay = self.retry.delay(attempt, resp.headers.get('Retry-After'))
+                logger.warning('%s %s returned %s. retry %s in %.2fs', method, url, code, attempt + 1, delay,
+                               extra={'method': method, 'url': url, 'status': code, 'retry': attempt + 1,
+                                      'delay': delay})
+            time.sleep(delay)
+            attempt += 1
+
+
+class ArdoqClient(RestClient):
     '''
         Example usage::
             ...
     '''
 
-    def __init__(self, hosturl=None, token=None, org=None, version='v1'):
+    def __init__(self, hosturl=None, token=None, org=None, version='v1', retry=RetryPolicy(), rate_limit=None,
+                 hooks=None, transport=None, cache=None):
         '''
         Create an Ardoq API client for a specific version of the ardoq rest API
         Cannot mix versions. Either v1 or v2
@@ -60,84 +475,121 @@ class ArdoqClient(object):
         :param org:
             organization to use. This is now deprecated. But kept for backwards compatibility
         :param version: API version number. 'v1' or 'v2'. defaults to 'v1'.
+        :param retry: RetryPolicy for throttled and failed requests. None turns retries off
+        :param rate_limit: optional, max requests per second, or a TokenBucket to share between clients
+        :param hooks: optional, list of callables that get a RequestEvent after each request (see Metrics)
+        :param transport: optional, Transport to use, e.g. one shared with other clients and threads.
+            defaults to a Transport with a pool of 10 connections
+        :param cache: optional, ResponseCache for GET responses, e.g. ResponseCache(ttl=300) to read models
+            once every 5 minutes
         '''
 
         if hosturl[-1] == '/':
             hosturl = hosturl[:-1]
         self.hosturl = hosturl
         self.version = version
-        logging.info(f"creating Ardoq Client for API version {version}")
+        logger.info("creating Ardoq Client for API version %s", version)
         if version == 'v2':
             self.baseurl = hosturl + '/api/v2/'
         else:
             self.baseurl = hosturl + '/api/'
         self.token = token
         if org:
-            logging.warning("org parameter is now DEPRECATED. The org should be specified in the URL")
+            logger.warning("org parameter is now DEPRECATED. The org should be specified in the URL")
         self.org = org
-        self.session = requests.Session()
-        self.session.cookies.set_policy(BlockAll())  # for stopping cookies that mess up high-volume API calls to ardoq
-        _headers = {'Authorization': 'Token token=' + self.token}
-        self.session.headers.update(_headers)
+        super().__init__({'Authorization': 'Token token=' + self.token}, retry=retry, rate_limit=rate_limit,
+                         hooks=hooks, transport=transport, cache=cache)
         self.workspaces = None
         self.workspace = None
         self.model = None
+        self._workspace_models = {}  # ws_id -> WorkspaceModel. see get_workspace_model
 
-    @staticmethod
-    def _unwrap_response(resp):
-        code = resp.status_code
-
-        if code == 200 or code == 201:
-            return resp.json()
-        elif code == 204:
-            return {}
-        else:
-            logging.debug('request: %s', resp.request.body)
-            raise ArdoqClientException({'code': code, 'reason': resp.reason, 'text': resp.text})
+    _request = RestClient._http_request
 
     def _get(self, resrc, **kwargs):
         url = self.baseurl + resrc
-        logger.debug(f"GET {url} with params {kwargs}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET %s with params %s", url, kwargs, extra={'method': 'GET', 'url': url})
         if self.org:
             kwargs['org'] = self.org
-        resp = self.session.get(url, params=kwargs)
-        return self._unwrap_response(resp)
+        if self.cache is not None:
+            return self._cached_get(url, kwargs)
+        return self._request('GET', url, params=kwargs)
 
     def _patch(self, resrc, payload, **kwargs):
-        url = self.baseurl + resrc
+        # PATCH only exists in the v2 API. it is used for both versions of the client
+        url = self.hosturl + '/api/v2/' + resrc
         kwargs.update({
             'org': self.org
         })
-        resp = self.session.patch(url, json=payload, params=kwargs)
-        return self._unwrap_response(resp)
+        return self._request('PATCH', url, json=payload, params=kwargs)
 
     def _post(self, resrc, payload, **kwargs):
         url = self.baseurl + resrc
         kwargs.update({
             'org': self.org
         })
-        resp = self.session.post(url, json=payload, params=kwargs)
-        return self._unwrap_response(resp)
+        return self._request('POST', url, json=payload, params=kwargs)
 
     def _put(self, resrc, payload, **kwargs):
         url = self.baseurl + resrc
         kwargs.update({
             'org': self.org
         })
-        resp = self.session.put(url, json=payload, params=kwargs)
-        return self._unwrap_response(resp)
+        return self._request('PUT', url, json=payload, params=kwargs)
 
     def _delete(self, resrc, **kwargs):
         url = self.baseurl + resrc
         kwargs.update({
             'org': self.org
         })
-        resp = self.session.delete(url, params=kwargs)
-        return self._unwrap_response(resp)
+        return self._request('DELETE', url, params=kwargs)
 
     def pprint(self, obj):
         print(json.dumps(obj, sort_keys=True, indent=4))
 
+    def _next_url(self, page):
+        href = page.get('_links', {}).get('next', {}).get('href') if isinstance(page, dict) else None
+        if href and href.startswith('/'):
+            href = self.hosturl + href
+        return href
+
+    def _page_params(self, url, params=None):
+        # query params of a page request. the org goes on every page, like the other calls, unless a next link has it
+        params = dict(params or {})
+        if self.org and 'org' not in params and 'org=' not in urlsplit(url).query:
+            params['org'] = self.org
+        return params
+
+    def _iter_pages(self, resrc, params=None, prefetch=False):
+        """
+        generator for the pages of a v2 list. follows _links.next until there are no more pages
+        :param prefetch: get the next page on a background thread while the caller works on the current one
+        """
+        url = self.baseurl + resrc
+        page_params = self._page_params(url, params)
+        if not prefetch:
+            while url:
+                page = self._request('GET', url, params=page_params)
+                url = self._next_url(page)
+                page_params = self._page_params(url) if url else None  # the next link has the query params
+                yield page
+            return
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(self._request, 'GET', url, params=page_params)
+            while future is not None:
+                page = future.result()
+                url = self._next_url(page)
+                future = pool.submit(self._request, 'GET', url, params=self._page_params(url)) if url else None
+                yield page
+
+    def _iter_values(self, resrc, params=None, prefetch=False):
+        for page in self._iter_pages(resrc, params=params, prefetch=prefetch):
+            if isinstance(page, list):
+                yield from page
+            else:
+                yield from page.get('values', [])
+
     '''
     functions for workspaces
     '''
@@ -161,10 +613,22 @@ class ArdoqClient(object):
             endpoint = 'workspace' + '/' + ws_id
             if aggregated:
                 endpoint += '/aggregated'
-            self.workspace = self._get(endpoint)
+            ws = self._get(endpoint)
         else:  # v2
-            self.workspace = self._get('workspaces/' + ws_id)
-        return self.workspace
+            ws = self._get('workspaces/' + ws_id)
+        self.workspace = ws  # the last workspace fetched by any thread. callers use the return value
+        return ws
+
+    def iter_workspaces(self, params=None, prefetch=False):
+        """
+        generator for all workspaces. v2 pages are fetched as they are needed
+        :param params: v2 param. query params for the list
+        :param prefetch: v2 param. get the next page on a background thread
+        """
+        if self.version == 'v1':
+            yield from self.get_workspaces()
+            return
+        yield from self._iter_values('workspaces', params=params, prefetch=prefetch)
 
     def create_workspace(self, ws=None):
         if ws is None:
@@ -206,12 +670,14 @@ class ArdoqClient(object):
         # if self.workspace['_id'] != ws_id:
         if self.version == 'v1':
             if model_id is None:
-                self.workspace = self._get('workspace' + '/' + ws_id)
-                model_id = self.workspace['componentModel']
-            self.model = self._get('model' + '/' + model_id)
+                ws = self._get('workspace' + '/' + ws_id)
+                self.workspace = ws
+                model_id = ws['componentModel']
+            model = self._get('model' + '/' + model_id)
         else: # v2
-            self.model = self._get(f"workspaces/{ws_id}/context")
-        return self.model
+            model = self._get(f"workspaces/{ws_id}/context")
+        self.model = model
+        return model
 
     # get all model for and organisation
     # TODO combine with get_model
@@ -223,6 +689,7 @@ class ArdoqClient(object):
         if model is None:
             raise ArdoqClientException('must provide a model')
         res = self._post('model', model)
+        self.invalidate_model()
 
     def print_model(self, ws_id=None, model_id=None):
         if ws_id is None:
@@ -238,6 +705,39 @@ class ArdoqClient(object):
         for r in self.model['referenceTypes'].values():
             print(f"name: {r['name']} - id: {r['id']}")
 
+    def get_workspace_model(self, ws_id=None, fields=False, refresh=False):
+        """
+        returns the indexed model of a workspace (see WorkspaceModel). it is built on the first call and kept
+        until the client changes a model or a field, or invalidate_model is called
+        :param ws_id: id of the workspace
+        :param fields: also index the field definitions of the model. fetches the fields in v1
+        :param refresh: fetch the model again, e.g. after it was changed by someone else. the index is only
+            rebuilt if the model changed
+        :return: WorkspaceModel
+        """
+        if ws_id is None:
+            raise ArdoqClientException('must provide a workspaceID')
+        wm = self._workspace_models.get(ws_id)
+        if wm is not None and not refresh and (wm.has_fields or not fields):
+            return wm
+        model = self.get_model(ws_id=ws_id)
+        fields = fields or (wm is not None and wm.has_fields)
+        if wm is not None and wm.is_current(model) and (wm.has_fields or not fields):
+            return wm
+        field_list = self.get_field() if fields and self.version == 'v1' else None
+        wm = WorkspaceModel(model, field_list)
+        self._workspace_models[ws_id] = wm
+        return wm
+
+    def invalidate_model(self, ws_id=None):
+        """
+        drops the indexed model of a workspace, or of all workspaces if ws_id is None
+        """
+        if ws_id is None:
+            self._workspace_models.clear()
+        else:
+            self._workspace_models.pop(ws_id, None)
+
     def find_reference_type(self, ws_id=None, reftype_name=None):
         """
         returns the reference type definition from the model for a specified workspace
@@ -247,40 +747,23 @@ class ArdoqClient(object):
         """
         if ws_id is None or reftype_name is None:
             raise ArdoqClientException('must provide a workspace id and name for the reference type to find')
-        ws_model = self.get_model(ws_id = ws_id)
-        rt = [v for k, v in ws_model['referenceTypes'].items() if reftype_name == v['name']]
-        if rt:
-            return rt[0]
-        return None
+        return self.get_workspace_model(ws_id=ws_id).reference_type(reftype_name)
 
     def find_component_type(self, ws_id=None, comptype_name=None):
         """
         returns the component type definition from the model for a specified workspace
-        recurses through the hierarchy of component types and returns the first with that name
+        returns the first type with that name in the hierarchy of component types
         :param ws_id: id of workspace to search for the comptype
         :param comptype_name: string of the comptype name to find
-        :return: None if a comp type with that name cannot be found, otherwise the dict of the type
+        :return: None if a comp type with that name cannot be found, otherwise the dict of the type.
+            in v1 the dict is {type id: type}
         """
         if ws_id is None or comptype_name is None:
             raise ArdoqClientException('must provide a workspace id and name for the component type to find')
-        ws_model = self.get_model(ws_id = ws_id)
-
-        def rec_dic_search(dic, val):
-            for k, v in dic.items():
-                if v['name'] == val:
-                    return {k: v}
-                if len(v['children']):
-                    found = rec_dic_search(v['children'], val)
-                    if found is not None:
-                        return found
-
-        if self.version == 'v1':
-            return rec_dic_search(ws_model['root'], comptype_name)
-        else:  # v2
-            ct = [v for v in ws_model['componentTypes'] if comptype_name == v['name']]
-            if ct:
-                return ct[0]
-        return None
+        ct = self.get_workspace_model(ws_id=ws_id).component_type(comptype_name)
+        if ct is not None and self.version == 'v1':
+            return {ct['id']: ct}
+        return ct
 
     def get_field(self, field_id=None):
         """
@@ -301,6 +784,7 @@ class ArdoqClient(object):
         if field is None:
             raise ArdoqClientException('must provide a field')
         res = self._post('field', field)
+        self.invalidate_model()
 
     def create_component(self, comp=None):
         """
@@ -349,6 +833,23 @@ class ArdoqClient(object):
                 comp = self._get(resc, **params)
         return comp
 
+    def iter_components(self, ws_id=None, params=None, prefetch=False):
+        """
+        generator for all components in a workspace, or that match params.
+        v2 pages are fetched as they are needed, so large listings run in constant memory
+        :param ws_id: get components within this workspace
+        :param params: v2 param. set of key value pairs to use for limiting the search results
+        :param prefetch: v2 param. get the next page on a background thread while the caller works on the current one
+        """
+        if ws_id is None and params is None:
+            raise ArdoqClientException('must provide a workspace id or search params')
+        if self.version == 'v1':
+            yield from self.get_component(ws_id=ws_id)
+            return
+        if not params:  # limit search to one workspace if no other search given
+            params = {'rootWorkspace': ws_id}
+        yield from self._iter_values('components', params=params, prefetch=prefetch)
+
     def update_component(self, comp_id=None, comp=None):
         if comp_id is None or comp is None:
             raise ArdoqClientException('must provide a component id, and component')
@@ -419,12 +920,32 @@ class ArdoqClient(object):
                 ref = self._get(resc, **params)
         return ref
 
+    def iter_references(self, ws_id=None, params=None, prefetch=False):
+        """
+        generator for all references in a workspace, or that match params. see iter_components
+        """
+        if ws_id is None and params is None:
+            raise ArdoqClientException('must provide a source workspace id or search params')
+        if self.version == 'v1':
+            yield from self.get_reference(ws_id=ws_id)
+            return
+        if not params:  # limit search to one workspace if no other search given
+            params = {'rootWorkspace': ws_id}
+        yield from self._iter_values('references', params=params, prefetch=prefetch)
+
     def del_reference(self, ref_id=None):
         if ref_id is None:
             raise ArdoqClientException('must provide a reference id')
         res = self._delete('reference/' + ref_id)
         return res
 
+    def patch_reference(self, ref_id=None, version='latest', payload=None):
+        if ref_id is None or payload is None:
+            raise ArdoqClientException('must provide a reference id, and reference fields to update')
+        params = {'ifVersionMatch': version}
+        res = self._patch('references/' + ref_id, payload, **params)
+        return res
+
     def update_reference(self, ref_id=None, ref=None):
         if ref_id is None or ref is None:
             raise ArdoqClientException('must provide a reference id, and reference')
@@ -462,6 +983,22 @@ class ArdoqClient(object):
         res = self._delete('tag/' + tag_id)
         return res
 
+    '''
+    functions for batch
+    '''
+
+    def batch(self, payload=None):
+        """
+        post a batch of component and reference creates, updates and deletes. see Batch in ardoqpy_v2
+        the batch endpoint only exists in the v2 API. it is used for both versions of the client
+        :param payload: the batch body, e.g. Batch().body
+        :return: the batch result with the created, updated and deleted components and references
+        """
+        if payload is None:
+            raise ArdoqClientException('must provide a batch payload')
+        url = self.hosturl + '/api/v2/batch'
+        return self._request('POST', url, json=payload)
+
     def get_current_user(self):
         '''
         :return: information about the current user
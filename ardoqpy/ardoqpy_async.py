@@ -0,0 +1,500 @@
+# coding: utf-8
+
+import asyncio
+import json
+import logging
+import time
+from ardoqpy import ArdoqClientException, RetryPolicy, TokenBucket, exception_for_status, \
+    RequestEvent, emit, resource_template, RAW_JSON_TYPES, get_codec, WorkspaceModel
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is optional. only needed for the async client
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+'''
+    asyncio version of ArdoqClient
+    same functions, url rules for v1/v2, and error handling as ArdoqClient, but each function is a coroutine
+    max_concurrency limits the number of requests in flight across all coroutines using the client
+
+    needs aiohttp - pip install aiohttp
+
+    async with AsyncArdoqClient(hosturl='https://myorg.ardoq.com', token='....', max_concurrency=20) as ardoq:
+        workspaces = await asyncio.gather(*[ardoq.get_workspace(ws_id=w, aggregated=True) for w in ws_ids])
+'''
+
+
+# headers of requests with a json body
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+class AsyncArdoqClient(object):
+
+    def __init__(self, hosturl=None, token=None, org=None, version='v1', max_concurrency=10,
+                 retry=RetryPolicy(), rate_limit=None, hooks=None, codec=None):
+        '''
+        Create an async Ardoq API client for a specific version of the ardoq rest API
+        :param hosturl: The Ardoq installation you wish to connect to
+        :param token: An authorization token
+        :param org: organization to use. This is now deprecated. But kept for backwards compatibility
+        :param version: API version number. 'v1' or 'v2'. defaults to 'v1'.
+        :param max_concurrency: max number of requests in flight at the same time. defaults to 10
+        :param retry: RetryPolicy for throttled and failed requests. None turns retries off
+        :param rate_limit: optional, max requests per second, or a TokenBucket to share between clients
+        :param hooks: optional, list of callables that get a RequestEvent after each request (see Metrics)
+        :param codec: json codec for bodies, a name or a JsonCodec. defaults to the fastest one that is installed
+        '''
+        if aiohttp is None:
+            raise ArdoqClientException('AsyncArdoqClient needs aiohttp. pip install aiohttp')
+        if hosturl[-1] == '/':
+            hosturl = hosturl[:-1]
+        self.hosturl = hosturl
+        self.version = version
+        logger.info("creating async Ardoq Client for API version %s", version)
+        if version == 'v2':
+            self.baseurl = hosturl + '/api/v2/'
+        else:
+            self.baseurl = hosturl + '/api/'
+        self.token = token
+        if org:
+            logger.warning("org parameter is now DEPRECATED. The org should be specified in the URL")
+        self.org = org
+        self.max_concurrency = max_concurrency
+        self.retry = retry
+        if rate_limit is not None and not isinstance(rate_limit, TokenBucket):
+            rate_limit = TokenBucket(rate_limit)
+        self.rate_limiter = rate_limit
+        self.hooks = list(hooks or [])
+        self.codec = get_codec(codec)
+        self.session = None  # aiohttp sessions have to be created inside the event loop. see _session
+        self._semaphore = None
+        self.workspaces = None
+        self.workspace = None
+        self.model = None
+        self._workspace_models = {}  # ws_id -> WorkspaceModel. see get_workspace_model
+
+    async def __aenter__(self):
+        self._session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            # DummyCookieJar for stopping cookies that mess up high-volume API calls to ardoq
+            self.session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                                 headers={'Authorization': 'Token token=' + self.token})
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @staticmethod
+    def _params(params):
+        # requests drops None params and str()s the rest. aiohttp rejects both
+        return {k: v if isinstance(v, str) else str(v) for k, v in params.items() if v is not None}
+
+    async def _unwrap_response(self, resp):
+        code = resp.status
+
+        if code == 200 or code == 201:
+            return self.codec.loads(await resp.read())
+        elif code == 204:
+            return {}
+        else:
+            raise exception_for_status(code)({'code': code, 'reason': resp.reason, 'text': await resp.text()})
+
+    def _encode(self, payload):
+        # the body is encoded once, not again on each retry. json bytes are sent as they are
+        if payload is None:
+            return None
+        if isinstance(payload, RAW_JSON_TYPES):
+            return bytes(payload)
+        return self.codec.dumps(payload)
+
+    async def _request(self, method, url, payload=None, **kwargs):
+        body = self._encode(payload)
+        if not self.hooks:
+            return await self._send(method, url, body, None, **kwargs)
+        event = RequestEvent(method, resource_template(url))
+        if body is not None:
+            event.bytes_out = len(body)
+        start = time.perf_counter()
+        try:
+            return await self._send(method, url, body, event, **kwargs)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.seconds = time.perf_counter() - start
+            emit(self.hooks, event)
+
+    async def _send(self, method, url, body, event, **kwargs):
+        # the retry loop of _request. fills in event if it isn't None
+        session = self._session()
+        params = self._params(kwargs)
+        attempt = 0
+        while True:
+            queued = time.perf_counter() if event is not None else None
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+            try:
+                async with self._semaphore:
+                    if event is not None:
+                        event.queue_seconds += time.perf_counter() - queued
+                    async with session.request(method, url, data=body, params=params,
+                                               headers=_JSON_HEADERS if body is not None else None) as resp:
+                        code = resp.status
+                        if event is not None:
+                            event.status = code
+                            event.retries = attempt
+                            event.bytes_in = len(await resp.read())  # aiohttp keeps the body for _unwrap_response
+                        if code < 400 or self.retry is None or not self.retry.should_retry(method, code, attempt):
+                            return await self._unwrap_response(resp)
+                        delay = self.retry.delay(attempt, resp.headers.get('Retry-After'))
+                logger.warning('%s %s returned %s. retry %s in %.2fs', method, url, code, attempt + 1, delay,
+                               extra={'method': method, 'url': url, 'status': code, 'retry': attempt + 1,
+                                      'delay': delay})
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if event is not None:
+                    event.status = None
+                    event.retries = attempt
+                if self.retry is None or not self.retry.should_retry(method, None, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning('%s %s failed: %s. retry %s in %.2fs', method, url, e, attempt + 1, delay,
+                               extra={'method': method, 'url': url, 'error': type(e).__name__,
+                                      'retry': attempt + 1, 'delay': delay})
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get(self, resrc, **kwargs):
+        url = self.baseurl + resrc
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GET %s with params %s", url, kwargs, extra={'method': 'GET', 'url': url})
+        if self.org:
+            kwargs['org'] = self.org
+        return await self._request('GET', url, **kwargs)
+
+    async def _patch(self, resrc, payload, **kwargs):
+        # PATCH only exists in the v2 API. it is used for both versions of the client
+        kwargs.update({
+            'org': self.org
+        })
+        return await self._request('PATCH', self.hosturl + '/api/v2/' + resrc, payload, **kwargs)
+
+    async def _post(self, resrc, payload, **kwargs):
+        kwargs.update({
+            'org': self.org
+        })
+        return await self._request('POST', self.baseurl + resrc, payload, **kwargs)
+
+    async def _put(self, resrc, payload, **kwargs):
+        kwargs.update({
+            'org': self.org
+        })
+        return await self._request('PUT', self.baseurl + resrc, payload, **kwargs)
+
+    async def _delete(self, resrc, **kwargs):
+        kwargs.update({
+            'org': self.org
+        })
+        return await self._request('DELETE', self.baseurl + resrc, **kwargs)
+
+    def pprint(self, obj):
+        print(json.dumps(obj, sort_keys=True, indent=4))
+
+    '''
+    functions for workspaces
+    '''
+
+    async def get_workspaces(self, summary=False):
+        if self.version == 'v1':
+            self.workspaces = await self._get('workspace' if not summary else 'workspace/summary')
+        else:  # v2
+            self.workspaces = await self._get('workspaces')
+        return self.workspaces
+
+    async def get_workspace(self, ws_id=None, aggregated=False):
+        if ws_id is None:
+            raise ArdoqClientException("need an id for get_workspace")
+        if self.version == 'v1':
+            endpoint = 'workspace' + '/' + ws_id
+            if aggregated:
+                endpoint += '/aggregated'
+            self.workspace = await self._get(endpoint)
+        else:  # v2
+            self.workspace = await self._get('workspaces/' + ws_id)
+        return self.workspace
+
+    async def create_workspace(self, ws=None):
+        if ws is None:
+            raise ArdoqClientException('must provide a workspace')
+        return await self._post('workspace', ws)
+
+    async def del_workspace(self, ws_id=None):
+        if ws_id is None:
+            raise ArdoqClientException('must provide a workspace id')
+        return await self._delete('workspace/' + ws_id)
+
+    async def create_folder(self, folder=None):
+        if folder is None:
+            raise ArdoqClientException('must provide a folder name and payload')
+        return await self._post('workspacefolder', folder)
+
+    async def get_folder(self, folder_id=None):
+        return await self._get('workspacefolder/' + folder_id)
+
+    async def move_workspace(self, folder_id=None, ws_list=None):
+        if ws_list is None and folder_id is None:
+            raise ArdoqClientException('must provide a folder id and list of workspaces to move')
+        return await self._put('workspacefolder/' + folder_id + '/add', {'workspaces': ws_list})
+
+    '''
+    functions for models
+    '''
+
+    async def get_model(self, ws_id=None, model_id=None):
+        if ws_id is None:
+            raise ArdoqClientException('must provide a workspaceID')
+        if self.version == 'v1':
+            if model_id is None:
+                self.workspace = await self._get('workspace' + '/' + ws_id)
+                model_id = self.workspace['componentModel']
+            self.model = await self._get('model' + '/' + model_id)
+        else:  # v2
+            self.model = await self._get(f"workspaces/{ws_id}/context")
+        return self.model
+
+    async def get_models(self):
+        self.models = await self._get('model' + '/')
+        return self.models
+
+    async def create_model(self, model=None):
+        if model is None:
+            raise ArdoqClientException('must provide a model')
+        res = await self._post('model', model)
+        self.invalidate_model()
+        return res
+
+    async def get_workspace_model(self, ws_id=None, fields=False, refresh=False):
+        """
+        returns the indexed model of a workspace. same as ArdoqClient.get_workspace_model
+        """
+        if ws_id is None:
+            raise ArdoqClientException('must provide a workspaceID')
+        wm = self._workspace_models.get(ws_id)
+        if wm is not None and not refresh and (wm.has_fields or not fields):
+            return wm
+        model = await self.get_model(ws_id=ws_id)
+        fields = fields or (wm is not None and wm.has_fields)
+        if wm is not None and wm.is_current(model) and (wm.has_fields or not fields):
+            return wm
+        field_list = await self.get_field() if fields and self.version == 'v1' else None
+        wm = WorkspaceModel(model, field_list)
+        self._workspace_models[ws_id] = wm
+        return wm
+
+    def invalidate_model(self, ws_id=None):
+        if ws_id is None:
+            self._workspace_models.clear()
+        else:
+            self._workspace_models.pop(ws_id, None)
+
+    async def find_reference_type(self, ws_id=None, reftype_name=None):
+        """
+        returns the reference type definition from the model for a specified workspace
+        :return: None if a reference type with that name cannot be found, otherwise the dict of the reftype
+        """
+        if ws_id is None or reftype_name is None:
+            raise ArdoqClientException('must provide a workspace id and name for the reference type to find')
+        return (await self.get_workspace_model(ws_id=ws_id)).reference_type(reftype_name)
+
+    async def find_component_type(self, ws_id=None, comptype_name=None):
+        """
+        returns the component type definition from the model for a specified workspace
+        :return: None if a comp type with that name cannot be found, otherwise the dict of the type.
+            in v1 the dict is {type id: type}
+        """
+        if ws_id is None or comptype_name is None:
+            raise ArdoqClientException('must provide a workspace id and name for the component type to find')
+        ct = (await self.get_workspace_model(ws_id=ws_id)).component_type(comptype_name)
+        if ct is not None and self.version == 'v1':
+            return {ct['id']: ct}
+        return ct
+
+    '''
+    functions for fields
+    '''
+
+    async def get_field(self, field_id=None):
+        resc = 'field'
+        if field_id:
+            resc = resc + '/' + field_id
+        return await self._get(resc)
+
+    async def create_field(self, field=None):
+        if field is None:
+            raise ArdoqClientException('must provide a field')
+        res = await self._post('field', field)
+        self.invalidate_model()
+        return res
+
+    '''
+    functions for components
+    '''
+
+    async def create_component(self, comp=None):
+        if comp is None:
+            raise ArdoqClientException('must provide a component')
+        return await self._post('component', comp)
+
+    async def get_component(self, ws_id=None, comp_id=None, incl_refs=False, params=None):
+        if ws_id is None and comp_id is None and params is None:
+            raise ArdoqClientException('must provide a workspace id, component id, or search params')
+        if self.version == 'v1':
+            params = {'includeReferences': str(incl_refs).lower()}
+            if comp_id is not None:
+                comp = await self._get('component/' + comp_id, **params)
+            else:
+                comp = await self._get('component/search', workspace=ws_id)
+        else:  # v2
+            if comp_id:
+                comp = await self._get('components/' + comp_id)
+            else:
+                if not params:  # limit search to one workspace if no other search given
+                    params = {'rootWorkspace': ws_id}
+                comp = await self._get('components', **params)
+        return comp
+
+    async def update_component(self, comp_id=None, comp=None):
+        if comp_id is None or comp is None:
+            raise ArdoqClientException('must provide a component id, and component')
+        return await self._put('component/' + comp_id, comp)
+
+    async def patch_component(self, comp_id=None, version='latest', payload=None):
+        if comp_id is None or payload is None:
+            raise ArdoqClientException('must provide a component id, and component fields to update')
+        return await self._patch('components/' + comp_id, payload, ifVersionMatch=version)
+
+    async def del_component(self, comp_id=None):
+        if comp_id is None:
+            raise ArdoqClientException('must provide a component id')
+        return await self._delete('component/' + comp_id)
+
+    async def find_component(self, ws_id=None, comp_name=None, field_name=None, field_value=None, exact=False):
+        if ws_id is None:
+            raise ArdoqClientException('must provide a workspace id')
+        if comp_name is not None:
+            res = await self._get('component/search', workspace=ws_id, name=comp_name, field=field_name,
+                                  value=field_value)
+            if exact is True:
+                for r in res:
+                    if r['name'] == comp_name:
+                        return [dict(r)]
+                return []
+            return res
+        if field_name is not None:
+            res = await self._get('component/fieldsearch', workspace=ws_id, **{field_name: field_value})
+            if exact is True:
+                for r in res:
+                    if r[field_name] == field_value:
+                        return [dict(r)]
+                return []
+            return res
+        raise ArdoqClientException('must provide a component name, or field name/value pair')
+
+    '''
+    functions for references
+    '''
+
+    async def create_reference(self, ref=None):
+        if ref is None:
+            raise ArdoqClientException('must provide a reference')
+        return await self._post('reference', ref)
+
+    async def get_reference(self, ws_id=None, ref_id=None, params=None):
+        if ws_id is None:
+            raise ArdoqClientException('must provide a source workspace id')
+        if self.version == 'v1':
+            if ref_id is None:
+                ref_id = ''
+            ref = await self._get('reference/' + ref_id, workspace=ws_id)
+        else:  # v2
+            if ref_id:
+                ref = await self._get('references/' + ref_id)
+            else:
+                if not params:  # limit search to one workspace if no other search given
+                    params = {'rootWorkspace': ws_id}
+                ref = await self._get('references', **params)
+        return ref
+
+    async def del_reference(self, ref_id=None):
+        if ref_id is None:
+            raise ArdoqClientException('must provide a reference id')
+        return await self._delete('reference/' + ref_id)
+
+    async def patch_reference(self, ref_id=None, version='latest', payload=None):
+        if ref_id is None or payload is None:
+            raise ArdoqClientException('must provide a reference id, and reference fields to update')
+        return await self._patch('references/' + ref_id, payload, ifVersionMatch=version)
+
+    async def update_reference(self, ref_id=None, ref=None):
+        if ref_id is None or ref is None:
+            raise ArdoqClientException('must provide a reference id, and reference')
+        return await self._put('reference/' + ref_id, ref)
+
+    '''
+    functions for tags
+    '''
+
+    async def create_tag(self, tag=None):
+        if tag is None:
+            raise ArdoqClientException('must provide a tag')
+        return await self._post('tag', tag)
+
+    async def get_tag(self, ws_id=None, tag_id=None):
+        if ws_id is None and tag_id is None:
+            raise ArdoqClientException('must provide a workspace id and/or tag id')
+        if tag_id is not None:
+            return await self._get('tag/' + tag_id)
+        return await self._get('tag/' + 'workspace/' + ws_id)
+
+    async def update_tag(self, tag_id=None, tag=None):
+        if tag_id is None or tag is None:
+            raise ArdoqClientException('must provide a tag id, and tag')
+        return await self._put('tag/' + tag_id, tag)
+
+    async def del_tag(self, tag_id=None):
+        if tag_id is None:
+            raise ArdoqClientException('must provide a tag id')
+        return await self._delete('tag/' + tag_id)
+
+    '''
+    functions for batch
+    '''
+
+    async def batch(self, payload=None):
+        if payload is None:
+            raise ArdoqClientException('must provide a batch payload')
+        return await self._request('POST', self.hosturl + '/api/v2/batch', payload)
+
+    async def get_current_user(self):
+        if self.version == 'v2':
+            return await self._get('me/')
+        return await self._get('user/current_user')
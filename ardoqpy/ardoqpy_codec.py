@@ -0,0 +1,154 @@
+import json
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:  # the json libraries below are optional. the json module is used without them
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+'''
+JSON codecs for request and response bodies
+
+A codec encodes objects to json bytes and decodes json bytes or str. The default codec is the fastest one that
+is installed: orjson, msgspec, ujson, and the json module if none of them are.
+Each Transport has a codec (Transport(codec='msgspec')), which ArdoqClient, ArdoqSyncClient and API use for their
+bodies. AsyncArdoqClient and WorkspaceStore use the default codec.
+
+Bodies that already are json bytes are sent as they are, without being decoded and encoded again,
+e.g. a batch that was serialized once and is sent to several workspaces or retried
+
+body = json_dumps(batch.body)
+ardoq.batch(body)
+'''
+
+# json types that are sent as they are
+RAW_JSON_TYPES = (bytes, bytearray, memoryview)
+
+
+def _default(obj):
+    # CompactRecords and other mappings are sent as objects
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JsonCodec(object):
+    """
+    the json module. subclass and override dumps and loads for other json libraries
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        """
+        :return: obj as compact json bytes
+        """
+        return json.dumps(obj, separators=(',', ':'), default=_default).encode('utf-8')
+
+    def loads(self, data):
+        """
+        :param data: json as bytes or str
+        """
+        return json.loads(data)
+
+    def __repr__(self):
+        return f'{type(self).__name__}()'
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JsonCodec):
+    name = 'msgspec'
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, default=_default).encode('utf-8')
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+# name -> codec class, in order of preference for the default codec
+CODECS = {'orjson': OrjsonCodec, 'msgspec': MsgspecCodec, 'ujson': UjsonCodec, 'json': JsonCodec}
+_MODULES = {'orjson': orjson, 'msgspec': msgspec, 'ujson': ujson, 'json': json}
+
+
+def available_codecs():
+    """
+    :return: names of the codecs that can be used here, in order of preference
+    """
+    return [name for name in CODECS if _MODULES[name] is not None]
+
+
+def get_codec(codec=None):
+    """
+    :param codec: a codec name from CODECS, a JsonCodec, or None for the default codec
+    :return: a JsonCodec
+    """
+    if codec is None:
+        return _default_codec
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec not in CODECS:
+        raise ValueError(f"unknown json codec '{codec}'. use one of {', '.join(CODECS)}")
+    if _MODULES[codec] is None:
+        raise ImportError(f"json codec '{codec}' is not installed. pip install {codec}")
+    return CODECS[codec]()
+
+
+_default_codec = get_codec(available_codecs()[0])
+
+
+def set_default_codec(codec):
+    """
+    sets the codec for transports created without one, AsyncArdoqClient and WorkspaceStore
+    :param codec: a codec name or a JsonCodec
+    """
+    global _default_codec
+    _default_codec = get_codec(codec)
+
+
+def json_dumps(obj):
+    """
+    :return: obj as json bytes with the default codec. bytes are returned as they are
+    """
+    if isinstance(obj, RAW_JSON_TYPES):
+        return bytes(obj)
+    return _default_codec.dumps(obj)
+
+
+def json_loads(data):
+    """
+    :param data: json as bytes or str. decoded with the default codec
+    """
+    return _default_codec.loads(data)
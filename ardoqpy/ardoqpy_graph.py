@@ -0,0 +1,283 @@
+import logging
+import threading
+from array import array
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+'''
+Graph index over cached references
+
+ReferenceGraph keeps the references of the cached workspaces as a directed graph for impact analysis.
+Components are numbered with integer ids, and each node has arrays of the integer ids of its outgoing
+and incoming edges, so traversals don't look at dicts of the references.
+Edges can cross workspaces: the source or target of a reference doesn't have to be in a cached workspace.
+
+ArdoqSyncClient.graph() builds it from the cache once. After that the cache keeps it up to date
+as references are created, updated and deleted, and as workspaces are loaded
+
+graph = ardoq.graph()
+impacted = graph.k_hop(comp_id, 3, direction='in')
+path = graph.shortest_path(comp_a, comp_b, direction='both')
+'''
+
+_DIRECTIONS = ('out', 'in', 'both')
+
+
+class ReferenceGraph(object):
+    """
+    directed multigraph of components (nodes) and references (edges), keyed by their ardoq _ids
+    deleted edges leave a free slot that the next edge reuses. components stay in the graph when their references
+    are removed
+    thread safe. updates and queries hold the lock of the graph
+    """
+
+    def __init__(self, references=()):
+        self._node = {}  # component _id -> node number
+        self._ids = []  # node number -> component _id
+        self._out = []  # node number -> array of edge numbers of the outgoing edges
+        self._in = []  # node number -> array of edge numbers of the incoming edges
+        self._src = array('l')  # edge number -> source node number
+        self._dst = array('l')  # edge number -> target node number
+        self._type = []  # edge number -> reference type
+        self._ref_ids = []  # edge number -> reference _id, None for a free slot
+        self._edge = {}  # reference _id -> edge number
+        self._free = []  # free edge numbers
+        self._lock = threading.RLock()
+        for r in references:
+            self.put_reference(r)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, comp_id):
+        return comp_id in self._node
+
+    @property
+    def edge_count(self):
+        return len(self._edge)
+
+    def _node_number(self, comp_id):
+        n = self._node.get(comp_id)
+        if n is None:
+            n = self._node[comp_id] = len(self._ids)
+            self._ids.append(comp_id)
+            self._out.append(array('l'))
+            self._in.append(array('l'))
+        return n
+
+    def put_reference(self, r):
+        """
+        adds a reference, or moves it if a reference with the same _id is in the graph
+        """
+        with self._lock:
+            ref_id = r['_id']
+            s = self._node_number(r['source'])
+            t = self._node_number(r['target'])
+            e = self._edge.get(ref_id)
+            if e is not None:
+                if self._src[e] == s and self._dst[e] == t:
+                    self._type[e] = r.get('type')
+                    return
+                self.remove_reference(ref_id)
+            if self._free:
+                e = self._free.pop()
+                self._src[e] = s
+                self._dst[e] = t
+                self._type[e] = r.get('type')
+                self._ref_ids[e] = ref_id
+            else:
+                e = len(self._ref_ids)
+                self._src.append(s)
+                self._dst.append(t)
+                self._type.append(r.get('type'))
+                self._ref_ids.append(ref_id)
+            self._edge[ref_id] = e
+            self._out[s].append(e)
+            self._in[t].append(e)
+
+    def remove_reference(self, ref_id):
+        """
+        :return: True if the reference was in the graph
+        """
+        with self._lock:
+            e = self._edge.pop(ref_id, None)
+            if e is None:
+                return False
+            self._out[self._src[e]].remove(e)
+            self._in[self._dst[e]].remove(e)
+            self._ref_ids[e] = None
+            self._type[e] = None
+            self._free.append(e)
+            return True
+
+    def rename_component(self, old_id, new_id):
+        """
+        gives a component a new _id, like the _id ardoq gave a component that was queued with a batchId
+        if new_id is in the graph already, the edges of old_id are moved to it
+        """
+        with self._lock:
+            n = self._node.pop(old_id, None)
+            if n is None:
+                return
+            m = self._node.get(new_id)
+            if m is None:
+                self._node[new_id] = n
+                self._ids[n] = new_id
+                return
+            for e in self._out[n]:
+                self._src[e] = m
+                self._out[m].append(e)
+            for e in self._in[n]:
+                self._dst[e] = m
+                self._in[m].append(e)
+            # the last node takes the number of the removed one, so node numbers stay dense
+            last = len(self._ids) - 1
+            if n != last:
+                self._ids[n] = self._ids[last]
+                self._node[self._ids[n]] = n
+                self._out[n] = self._out[last]
+                self._in[n] = self._in[last]
+                for e in self._out[n]:
+                    self._src[e] = n
+                for e in self._in[n]:
+                    self._dst[e] = n
+            del self._ids[last], self._out[last], self._in[last]
+
+    def _steps(self, n, direction, types):
+        # (edge number, neighbour node number) for the edges of node n
+        if direction != 'in':
+            for e in self._out[n]:
+                if types is None or self._type[e] in types:
+                    yield e, self._dst[e]
+        if direction != 'out':
+            for e in self._in[n]:
+                if types is None or self._type[e] in types:
+                    yield e, self._src[e]
+
+    @staticmethod
+    def _types(ref_types):
+        if ref_types is None:
+            return None
+        return frozenset(ref_types)
+
+    def _check(self, direction):
+        if direction not in _DIRECTIONS:
+            raise ValueError("direction must be 'out', 'in' or 'both'")
+
+    def neighbors(self, comp_id, direction='out', ref_types=None):
+        """
+        :param comp_id: component _id
+        :param direction: 'out' for targets of its references, 'in' for sources of references to it, or 'both'
+        :param ref_types: optional, only follow references of these types
+        :return: list of component _ids, without duplicates
+        """
+        with self._lock:
+            self._check(direction)
+            n = self._node.get(comp_id)
+            if n is None:
+                return []
+            seen = {}
+            for e, m in self._steps(n, direction, self._types(ref_types)):
+                seen.setdefault(m, None)
+            return [self._ids[m] for m in seen]
+
+    def references(self, comp_id, direction='out', ref_types=None):
+        """
+        :return: list of the _ids of the references of a component
+        """
+        with self._lock:
+            self._check(direction)
+            n = self._node.get(comp_id)
+            if n is None:
+                return []
+            return [self._ref_ids[e] for e, m in self._steps(n, direction, self._types(ref_types))]
+
+    def k_hop(self, comp_id, k, direction='out', ref_types=None):
+        """
+        components reachable in at most k steps
+        :return: dict of component _id -> number of steps, without comp_id itself
+        """
+        with self._lock:
+            self._check(direction)
+            start = self._node.get(comp_id)
+            if start is None:
+                return {}
+            types = self._types(ref_types)
+            dist = {start: 0}
+            frontier = [start]
+            for step in range(1, k + 1):
+                nxt = []
+                for n in frontier:
+                    for e, m in self._steps(n, direction, types):
+                        if m not in dist:
+                            dist[m] = step
+                            nxt.append(m)
+                if not nxt:
+                    break
+                frontier = nxt
+            del dist[start]
+            return {self._ids[n]: d for n, d in dist.items()}
+
+    def shortest_path(self, source, target, direction='out', ref_types=None, max_depth=None):
+        """
+        fewest references from source to target
+        :param max_depth: optional, give up after this many steps
+        :return: list of component _ids from source to target, None if there is no path
+        """
+        with self._lock:
+            self._check(direction)
+            s = self._node.get(source)
+            t = self._node.get(target)
+            if s is None or t is None:
+                return None
+            if s == t:
+                return [source]
+            types = self._types(ref_types)
+            prev = {s: None}
+            queue = deque([(s, 0)])
+            while queue:
+                n, depth = queue.popleft()
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for e, m in self._steps(n, direction, types):
+                    if m in prev:
+                        continue
+                    prev[m] = n
+                    if m == t:
+                        path = [m]
+                        while prev[path[-1]] is not None:
+                            path.append(prev[path[-1]])
+                        return [self._ids[x] for x in reversed(path)]
+                    queue.append((m, depth + 1))
+            return None
+
+    def subgraph(self, comp_ids, ref_types=None):
+        """
+        :param comp_ids: component _ids
+        :return: dict with the 'components' in the graph and the _ids of the 'references' between them
+        """
+        with self._lock:
+            types = self._types(ref_types)
+            nodes = {self._node[c] for c in comp_ids if c in self._node}
+            refs = [self._ref_ids[e] for n in nodes for e, m in self._steps(n, 'out', types) if m in nodes]
+            return {'components': [self._ids[n] for n in nodes], 'references': refs}
+
+    def to_csr(self, direction='out'):
+        """
+        adjacency in compressed sparse row form, e.g. for scipy.sparse.csr_matrix((data, indices, indptr))
+        :return: (component _ids by node number, indptr array, indices array of neighbour node numbers)
+        """
+        with self._lock:
+            if direction not in ('out', 'in'):
+                raise ValueError("direction must be 'out' or 'in'")
+            adjacency, other = (self._out, self._dst) if direction == 'out' else (self._in, self._src)
+            indptr = array('l', [0])
+            indices = array('l')
+            for edges in adjacency:
+                indices.extend(other[e] for e in edges)
+                indptr.append(len(indices))
+            return list(self._ids), indptr, indices
+
+    def __repr__(self):
+        return 'ReferenceGraph(components=%d, references=%d)' % (len(self._ids), len(self._edge))
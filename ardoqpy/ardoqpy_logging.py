@@ -0,0 +1,64 @@
+import json
+import logging
+import sys
+
+'''
+Logging for ardoqpy
+
+The library doesn't configure logging. Its loggers are all under the 'ardoqpy' logger, which only has a NullHandler,
+so messages go wherever the application's logging configuration sends them.
+Debug messages on the request and cache paths are only built when DEBUG is enabled for the ardoqpy loggers
+
+configure_logging is an opt-in shortcut for scripts that don't configure logging themselves.
+With structured=True each message is written as one json object per line, with the fields the library
+adds to its messages (method, url, status, workspace, ...)
+
+configure_logging(logging.DEBUG, structured=True)
+'''
+
+LOGGER_NAME = 'ardoqpy'
+
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+# attributes every LogRecord has. anything else on a record came from extra=
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    formats a record as a json object with time, level, logger, message and the extra fields of the record
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        for k, v in record.__dict__.items():
+            if k not in _RECORD_ATTRS:
+                entry[k] = v
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=logging.INFO, structured=False, stream=None):
+    """
+    sends the ardoqpy log messages to a stream. calling it again replaces the handler from the earlier call
+    only the ardoqpy loggers are changed, not the root logger
+    :param level: level for the ardoqpy loggers
+    :param structured: write json lines instead of text
+    :param stream: defaults to stderr
+    :return: the handler that was added
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    for h in list(logger.handlers):
+        if getattr(h, '_ardoqpy', False):
+            logger.removeHandler(h)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler._ardoqpy = True
+    if structured:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
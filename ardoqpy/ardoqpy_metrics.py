@@ -0,0 +1,308 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+'''
+Instrumentation for the ardoq clients
+
+ArdoqClient, AsyncArdoqClient and API call their hooks with a RequestEvent after each request,
+including its retries. ArdoqSyncClient also sends a SpanEvent for each cache load, cache lookup and write.
+A hook is any callable that takes the event. Hooks are called on the thread that sent the request
+and must be quick. Exceptions from hooks are logged and ignored.
+No events are created when a client has no hooks
+
+Metrics is a hook that keeps counters and histograms that can be read with snapshot() or exported
+in the Prometheus text format with to_prometheus()
+
+metrics = Metrics()
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', hooks=[metrics])
+...
+print(metrics.to_prometheus())
+'''
+
+# upper bounds in seconds, as in the Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# path segments that are ids: 24 hex chars (ardoq ids), uuids, and numbers
+_ID_SEGMENT = re.compile(r'^([0-9a-fA-F]{24}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def resource_template(url):
+    """
+    :param url: request url
+    :return: the url path with ids replaced by {id}, e.g. /api/component/{id}. used to group requests
+    """
+    path = urlsplit(url).path
+    return '/'.join('{id}' if _ID_SEGMENT.match(s) else s for s in path.split('/'))
+
+
+class RequestEvent(object):
+    """
+    one request to ardoq, including its retries
+    method, resource: HTTP method and resource template of the url
+    status: HTTP status of the last attempt, None if it failed without a response
+    bytes_out, bytes_in: size of the request and response bodies
+    seconds: wall time from the first attempt to the response, including retry waits
+    queue_seconds: time spent waiting for the rate limiter, or for a free slot in the async client
+    retries: number of retries
+    error: class name of the exception raised to the caller, None if the request succeeded
+    """
+    kind = 'request'
+    __slots__ = ('method', 'resource', 'status', 'bytes_out', 'bytes_in', 'seconds', 'queue_seconds',
+                 'retries', 'error')
+
+    def __init__(self, method, resource):
+        self.method = method
+        self.resource = resource
+        self.status = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.seconds = 0.0
+        self.queue_seconds = 0.0
+        self.retries = 0
+        self.error = None
+
+    def __repr__(self):
+        return 'RequestEvent(%s)' % ', '.join('%s=%r' % (k, getattr(self, k)) for k in self.__slots__)
+
+
+class SpanEvent(object):
+    """
+    a timed step of a sync run
+    name: 'cache_load', 'lookup' or 'write'
+    attrs: details of the step, e.g. workspace and op
+    """
+    kind = 'span'
+    __slots__ = ('name', 'seconds', 'error', 'attrs')
+
+    def __init__(self, name, seconds, error=None, attrs=None):
+        self.name = name
+        self.seconds = seconds
+        self.error = error
+        self.attrs = attrs or {}
+
+    def __repr__(self):
+        return 'SpanEvent(name=%r, seconds=%r, error=%r, attrs=%r)' % (self.name, self.seconds, self.error, self.attrs)
+
+
+def emit(hooks, event):
+    """
+    calls each hook with the event. a failing hook doesn't stop the others or the request
+    """
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception('hook %r failed', hook)
+
+
+class Span(object):
+    """
+    context manager that times a block and sends a SpanEvent to the hooks when the block ends
+    """
+    __slots__ = ('hooks', 'name', 'attrs', 'start')
+
+    def __init__(self, hooks, name, attrs):
+        self.hooks = hooks
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        emit(self.hooks, SpanEvent(self.name, seconds, exc_type.__name__ if exc_type else None, self.attrs))
+        return False
+
+
+class _NoSpan(object):
+    # used instead of a Span when there are no hooks
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Histogram(object):
+    """
+    counts of observed values per bucket, with the sum and count of all values. not thread safe on its own
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last count is for values above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        :param q: 0 to 1, e.g. 0.99
+        :return: estimate of the q quantile, interpolated within its bucket. None if there are no values
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.buckets):  # above the largest bucket
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+            if i < len(self.buckets):
+                lower = self.buckets[i]
+        return lower
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for le, n in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += n
+            buckets[le] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+def _labels(**labels):
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                          for k, v in labels.items()) + '}'
+
+
+def _format_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metrics(object):
+    """
+    hook that keeps cumulative counters and histograms of the request and span events it gets
+    thread safe, so one Metrics can be shared by several clients and the preload threads
+    requests are grouped by method and resource template, spans by name and op
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # (method, resource, status) -> count
+            self.retries = {}  # (method, resource) -> count
+            self.bytes_out = {}  # (method, resource) -> bytes
+            self.bytes_in = {}  # (method, resource) -> bytes
+            self.request_seconds = {}  # (method, resource) -> Histogram
+            self.queue_seconds = {}  # (method, resource) -> Histogram
+            self.spans = {}  # (name, op) -> Histogram
+            self.span_errors = {}  # (name, op) -> count
+
+    def __call__(self, event):
+        if event.kind == 'request':
+            self.observe_request(event)
+        elif event.kind == 'span':
+            self.observe_span(event)
+
+    def _histogram(self, table, key):
+        h = table.get(key)
+        if h is None:
+            h = table[key] = Histogram(self.buckets)
+        return h
+
+    def observe_request(self, event):
+        key = (event.method, event.resource)
+        status = event.status if event.status is not None else event.error
+        with self._lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            self.retries[key] = self.retries.get(key, 0) + event.retries
+            self.bytes_out[key] = self.bytes_out.get(key, 0) + event.bytes_out
+            self.bytes_in[key] = self.bytes_in.get(key, 0) + event.bytes_in
+            self._histogram(self.request_seconds, key).observe(event.seconds)
+            self._histogram(self.queue_seconds, key).observe(event.queue_seconds)
+
+    def observe_span(self, event):
+        key = (event.name, event.attrs.get('op', ''))
+        with self._lock:
+            self._histogram(self.spans, key).observe(event.seconds)
+            if event.error:
+                self.span_errors[key] = self.span_errors.get(key, 0) + 1
+
+    def snapshot(self):
+        """
+        :return: dict with a list of rows for each metric. histograms have count, sum, cumulative buckets,
+            and p50/p99 estimates
+        """
+        with self._lock:
+            return {
+                'requests': [{'method': m, 'resource': r, 'status': s, 'count': n}
+                             for (m, r, s), n in self.requests.items()],
+                'retries': [{'method': m, 'resource': r, 'count': n} for (m, r), n in self.retries.items()],
+                'bytes_out': [{'method': m, 'resource': r, 'bytes': n} for (m, r), n in self.bytes_out.items()],
+                'bytes_in': [{'method': m, 'resource': r, 'bytes': n} for (m, r), n in self.bytes_in.items()],
+                'request_seconds': [dict(h.as_dict(), method=m, resource=r)
+                                    for (m, r), h in self.request_seconds.items()],
+                'queue_seconds': [dict(h.as_dict(), method=m, resource=r)
+                                  for (m, r), h in self.queue_seconds.items()],
+                'spans': [dict(h.as_dict(), name=name, op=op, errors=self.span_errors.get((name, op), 0))
+                          for (name, op), h in self.spans.items()],
+            }
+
+    def to_prometheus(self, prefix='ardoqpy'):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        def counter(name, help_text, table, label_names):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s counter' % (prefix, name))
+            for key, n in sorted(table.items(), key=lambda kv: str(kv[0])):
+                lines.append('%s_%s%s %s' % (prefix, name, _labels(**dict(zip(label_names, key))), n))
+
+        def histogram(name, help_text, table, label_names):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help_text))
+            lines.append('# TYPE %s_%s histogram' % (prefix, name))
+            for key, h in sorted(table.items(), key=lambda kv: str(kv[0])):
+                labels = dict(zip(label_names, key))
+                cumulative = 0
+                for le, n in zip(h.buckets + (float('inf'),), h.counts):
+                    cumulative += n
+                    lines.append('%s_%s_bucket%s %s' % (prefix, name, _labels(le=_format_value(le), **labels),
+                                                        cumulative))
+                lines.append('%s_%s_sum%s %s' % (prefix, name, _labels(**labels), _format_value(h.sum)))
+                lines.append('%s_%s_count%s %s' % (prefix, name, _labels(**labels), h.count))
+
+        with self._lock:
+            counter('requests_total', 'Requests sent to ardoq.', self.requests, ('method', 'resource', 'status'))
+            counter('retries_total', 'Retries of requests to ardoq.', self.retries, ('method', 'resource'))
+            counter('request_bytes_total', 'Bytes sent in request bodies.', self.bytes_out, ('method', 'resource'))
+            counter('response_bytes_total', 'Bytes received in response bodies.', self.bytes_in,
+                    ('method', 'resource'))
+            histogram('request_seconds', 'Wall time of requests including retries.', self.request_seconds,
+                      ('method', 'resource'))
+            histogram('request_queue_seconds', 'Time requests waited for the rate limiter or a free slot.',
+                      self.queue_seconds, ('method', 'resource'))
+            histogram('sync_span_seconds', 'Time of sync client steps.', self.spans, ('span', 'op'))
+            counter('sync_span_errors_total', 'Sync client steps that raised an exception.', self.span_errors,
+                    ('span', 'op'))
+        return '\n'.join(lines) + '\n'
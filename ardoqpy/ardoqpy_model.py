@@ -0,0 +1,161 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+'''
+Indexed workspace models
+
+A WorkspaceModel is built once from the model of a workspace (v1 model or v2 workspace context) and answers
+type lookups from dicts: type name -> type, id -> type, the parent/child hierarchy of component types,
+and the fields of each type. ArdoqClient keeps one per workspace (get_workspace_model) and uses it for
+find_component_type and find_reference_type, so resolving types per row doesn't fetch or walk the model again.
+The cached models are dropped when the client changes a model or a field, or with invalidate_model()
+
+model = ardoq.get_workspace_model(ws_id)
+type_id = model.component_type_id('Application')
+'''
+
+
+def _items(types):
+    # types as a dict keyed by id (v1) or a list (v2)
+    if not types:
+        return []
+    if isinstance(types, dict):
+        return types.values()
+    return types
+
+
+class WorkspaceModel(object):
+    """
+    indexes of a workspace model, for both the v1 model and the v2 workspace context shapes
+    names are looked up as find_component_type did: the first type with the name, depth first through the
+    hierarchy in model order
+    """
+
+    def __init__(self, model, fields=None):
+        '''
+        :param model: the model from ArdoqClient.get_model
+        :param fields: optional, field definitions. fields of other models are left out.
+            defaults to the fields in the model, if it has any
+        '''
+        self.model = model
+        self.id = model.get('_id')
+        self.stamp = (model.get('_version'), model.get('lastUpdated'))  # compared to tell if the model changed
+        self.component_types = {}  # id -> component type
+        self.component_types_by_name = {}  # name -> first component type with that name
+        self.parents = {}  # component type id -> parent type id, None for top level types
+        self.children = {}  # component type id -> ids of the child types
+        self.reference_types = {}  # id -> reference type
+        self.reference_types_by_name = {}  # name -> first reference type with that name
+        self.fields = {}  # field name -> field
+        self.fields_by_label = {}  # field label -> field
+        self.global_fields = []  # fields of all component types
+        self.fields_by_type = {}  # component or reference type id -> fields of that type
+        self.has_fields = False
+
+        if 'root' in model:  # v1
+            self._index_component_types(model['root'], None)
+        else:  # v2
+            self._index_component_types(model.get('componentTypes'), None)
+        for rt in _items(model.get('referenceTypes')):
+            self.reference_types[rt['id']] = rt
+            self.reference_types_by_name.setdefault(rt['name'], rt)
+        if fields is None:
+            fields = model.get('fields')
+        if fields is not None:
+            self._index_fields(fields)
+
+    def _index_component_types(self, types, parent_id):
+        for ct in _items(types):
+            type_id = ct['id']
+            self.component_types[type_id] = ct
+            self.component_types_by_name.setdefault(ct['name'], ct)
+            # a flat v2 list has the parent on each type instead of nested children
+            parent = parent_id if parent_id is not None else ct.get('parentId', ct.get('parent'))
+            self.parents[type_id] = parent
+            self.children.setdefault(type_id, [])
+            if parent is not None:
+                self.children.setdefault(parent, []).append(type_id)
+            self._index_component_types(ct.get('children'), type_id)
+
+    def _index_fields(self, fields):
+        self.has_fields = True
+        for f in fields:
+            if self.id is not None and f.get('model') not in (None, self.id):
+                continue
+            self.fields[f['name']] = f
+            if f.get('label'):
+                self.fields_by_label[f['label']] = f
+            if f.get('global'):
+                self.global_fields.append(f)
+            for type_id in (f.get('componentType') or []) + (f.get('referenceType') or []):
+                self.fields_by_type.setdefault(type_id, []).append(f)
+
+    def is_current(self, model):
+        """
+        :return: True if model is the same version as the model this was built from. False if it can't be told
+        """
+        return self.stamp[0] is not None and self.stamp == (model.get('_version'), model.get('lastUpdated'))
+
+    def component_type(self, name):
+        """
+        :return: the component type with that name, None if there is none
+        """
+        return self.component_types_by_name.get(name)
+
+    def component_type_id(self, name):
+        ct = self.component_types_by_name.get(name)
+        return ct['id'] if ct is not None else None
+
+    def reference_type(self, name):
+        """
+        :return: the reference type with that name, None if there is none
+        """
+        return self.reference_types_by_name.get(name)
+
+    def reference_type_id(self, name):
+        rt = self.reference_types_by_name.get(name)
+        return rt['id'] if rt is not None else None
+
+    def ancestors(self, type_id):
+        """
+        :return: ids of the parent types of a component type, nearest first
+        """
+        res = []
+        parent = self.parents.get(type_id)
+        while parent is not None:
+            res.append(parent)
+            parent = self.parents.get(parent)
+        return res
+
+    def descendants(self, type_id):
+        """
+        :return: ids of all the types below a component type, depth first
+        """
+        res = []
+        stack = list(reversed(self.children.get(type_id, [])))
+        while stack:
+            t = stack.pop()
+            res.append(t)
+            stack.extend(reversed(self.children.get(t, [])))
+        return res
+
+    def fields_of(self, type_id):
+        """
+        :return: the fields of a component or reference type, including the global fields of component types
+        """
+        fields = self.fields_by_type.get(type_id, [])
+        if type_id in self.component_types and self.global_fields:
+            return self.global_fields + [f for f in fields if not f.get('global')]
+        return list(fields)
+
+    def field(self, name):
+        """
+        :return: the field with that name or label, None if there is none
+        """
+        f = self.fields.get(name)
+        return f if f is not None else self.fields_by_label.get(name)
+
+    def __repr__(self):
+        return 'WorkspaceModel(id=%r, component_types=%d, reference_types=%d, fields=%d)' % (
+            self.id, len(self.component_types), len(self.reference_types), len(self.fields))
@@ -0,0 +1,100 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+'''
+Concurrent writes with dependency ordering
+
+A WritePipeline runs write operations on a thread pool. each operation can depend on other operations,
+e.g. a reference on the creates of its source and target, or a component on the create of its parent.
+an operation starts as soon as the operations it depends on are done, not when everything before it is done,
+so independent operations run at the same time and a slow request only holds up its own dependents.
+if an operation fails, the operations that depend on it are not run
+
+ArdoqSyncClient uses it when write_workers is set: queued creates, updates and deletes are sent as single
+v2 requests by flush(). it can also be used on its own:
+
+ids = {}
+pipeline = WritePipeline(max_workers=16)
+pipeline.add('app', lambda: ardoq.create_component(comp=app))
+pipeline.add('db', lambda: ardoq.create_component(comp=db))
+pipeline.add('uses', lambda: ardoq.create_reference(ref=dict(ref, source=ids['app'], target=ids['db'])),
+             deps=['app', 'db'])
+pipeline.run(on_done=lambda key, res: ids.update({key: res['_id']}))
+'''
+
+
+class WritePipeline(object):
+    """
+    a DAG of operations, run on a thread pool in dependency order
+    operations without dependencies between them start in the order they were added
+    """
+
+    def __init__(self, max_workers=8):
+        '''
+        :param max_workers: number of operations that run at the same time
+        '''
+        self.max_workers = max_workers
+        self._fns = {}  # key -> function that runs the operation
+        self._deps = {}  # key -> keys of the operations it waits for
+        self._dependents = {}  # key -> keys of the operations that wait for it
+
+    def add(self, key, fn, deps=()):
+        """
+        :param key: unique key of the operation
+        :param fn: function without arguments that runs the operation on a worker thread. returns the result
+        :param deps: keys of the operations that must be done first. keys that haven't been added are ignored
+        """
+        if key in self._fns:
+            raise ValueError(f'operation {key!r} is already in the pipeline')
+        self._fns[key] = fn
+        self._deps[key] = {d for d in deps if d in self._fns and d != key}
+        for d in self._deps[key]:
+            self._dependents.setdefault(d, []).append(key)
+
+    def __len__(self):
+        return len(self._fns)
+
+    def run(self, on_done=None):
+        """
+        runs the operations. returns when all the operations that can run are done
+        :param on_done: optional, called in the calling thread with (key, result) when an operation is done,
+            before its dependents start. an exception from it fails the operation
+        :return: dict with the 'results' of the done operations by key, the 'errors' of the failed ones by key,
+            and the keys of the operations that were 'skipped' because an operation they depend on failed
+        """
+        waiting = {k: set(d) for k, d in self._deps.items()}
+        ready = deque(k for k, d in waiting.items() if not d)
+        for k in ready:
+            del waiting[k]
+        running = {}  # future -> key
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while ready or running:
+                while ready and len(running) < self.max_workers * 2:  # wait() looks at every running future
+                    k = ready.popleft()
+                    running[pool.submit(self._fns[k])] = k
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in finished:
+                    k = running.pop(f)
+                    try:
+                        res = f.result()
+                        if on_done is not None:
+                            on_done(k, res)
+                    except Exception as e:
+                        errors[k] = e
+                        logger.debug('pipeline - %s failed: %s', k, e)
+                        continue
+                    results[k] = res
+                    for d in self._dependents.get(k, ()):
+                        deps = waiting[d]
+                        deps.discard(k)
+                        if not deps:
+                            del waiting[d]
+                            ready.append(d)
+        logger.debug('pipeline - %s done, %s failed, %s skipped', len(results), len(errors), len(waiting),
+                     extra={'done': len(results), 'failed': len(errors), 'skipped': len(waiting)})
+        return {'results': results, 'errors': errors, 'skipped': [k for k in self._fns if k in waiting]}
@@ -0,0 +1,341 @@
+import logging
+from bisect import bisect_left, bisect_right, insort
+
+logger = logging.getLogger(__name__)
+
+'''
+Local queries over cached components
+
+A query is a set of conditions on the fields of components. each condition is field=value for equality
+or field__op=value, and a component matches when all of them are true:
+
+    eq         the field is equal to the value (same as field=value). True and False are not equal to 1 and 0
+    ne         the field is missing or not equal to the value
+    in         the field is equal to one of the values in a list
+    prefix     the field is a string that starts with the value
+    contains   the field is a string with the value in it, or a list (multi-select field) with the value in it
+    icontains  the same as contains for strings, ignoring case
+    lt, lte, gt, gte   the field is less than / greater than the value. numbers compare with numbers and
+               strings with strings (ardoq dates are ISO strings, so they compare as dates)
+    exists     the field is set (True) or not (False)
+
+Fields are the attributes of the cached v1 components: name, type, typeId, parent, custom field names ...
+
+Each cached workspace has a QueryIndex. a field that has been queried index_after times gets a FieldIndex,
+a hash table of field value -> component _ids, plus a sorted list of its values for range and prefix conditions
+once one of those is used. indexes are kept up to date as the cache changes. a query uses the index of the
+condition that selects the fewest components and checks the other conditions on those components only
+
+ardoq.query(ws_id, type='Application', name__prefix='Pay', cost__gte=1000)
+'''
+
+OPS = ('eq', 'ne', 'in', 'prefix', 'contains', 'icontains', 'lt', 'lte', 'gt', 'gte', 'exists')
+# ops that a FieldIndex can answer
+_INDEXED_OPS = {'eq', 'in', 'prefix', 'contains', 'icontains', 'lt', 'lte', 'gt', 'gte'}
+_MISSING = object()
+
+
+class _BoolKey(object):
+    # index key of a bool. True == 1 and hash(True) == hash(1), so True itself would share the bucket of 1
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+_BOOL_KEYS = {True: _BoolKey(True), False: _BoolKey(False)}
+
+
+def _hashable(v):
+    # lists (multi-select fields) are kept as tuples. _MISSING for values that can't be a key
+    if isinstance(v, bool):
+        return _BOOL_KEYS[v]
+    if isinstance(v, list):
+        v = tuple(v)
+    try:
+        hash(v)
+    except TypeError:
+        return _MISSING
+    return v
+
+
+def _equal(v, value):
+    # a yes/no field that is True doesn't equal the number 1
+    return v == value and isinstance(v, bool) == isinstance(value, bool)
+
+
+def _kind(v):
+    # the values that can be sorted together. bools are not numbers here
+    if isinstance(v, str):
+        return 'str'
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return 'num'
+    return None
+
+
+class Condition(object):
+    """
+    one condition of a query
+    """
+
+    def __init__(self, field, op, value):
+        if op not in OPS:
+            raise ValueError(f"unknown query op '{op}'. use one of {', '.join(OPS)}")
+        if op in ('lt', 'lte', 'gt', 'gte') and _kind(value) is None:
+            raise ValueError(f"{field}__{op} needs a number or a string")
+        if op in ('prefix', 'icontains') and not isinstance(value, str):
+            raise ValueError(f"{field}__{op} needs a string")
+        if isinstance(value, tuple) and op in ('eq', 'ne'):
+            value = list(value)  # multi-select fields are lists in the components
+        self.field = field
+        self.op = op
+        self.value = value
+        if op == 'in':
+            self._values = set(_hashable(v) for v in value)
+            self._values.discard(_MISSING)
+        elif op == 'icontains':
+            self._lower = value.lower()
+
+    def match(self, c):
+        v = c.get(self.field, _MISSING)
+        op = self.op
+        if op == 'exists':
+            return (v is not _MISSING) == bool(self.value)
+        if op == 'ne':
+            return v is _MISSING or not _equal(v, self.value)
+        if v is _MISSING:
+            return False
+        if op == 'eq':
+            return _equal(v, self.value)
+        if op == 'in':
+            return _hashable(v) in self._values
+        if op == 'prefix':
+            return isinstance(v, str) and v.startswith(self.value)
+        if op == 'contains':
+            return isinstance(v, (str, list, tuple)) and _contains(v, self.value)
+        if op == 'icontains':
+            return isinstance(v, str) and self._lower in v.lower()
+        if _kind(v) != _kind(self.value):
+            return False
+        if op == 'lt':
+            return v < self.value
+        if op == 'lte':
+            return v <= self.value
+        if op == 'gt':
+            return v > self.value
+        return v >= self.value
+
+    def __repr__(self):
+        return f'Condition({self.field!r}, {self.op!r}, {self.value!r})'
+
+
+def _contains(v, value):
+    try:
+        return value in v
+    except TypeError:  # e.g. a number in a string
+        return False
+
+
+def parse_conditions(conditions):
+    """
+    :param conditions: dict of field or field__op -> value
+    :return: list of Conditions
+    """
+    res = []
+    for key, value in conditions.items():
+        field, sep, op = key.rpartition('__')
+        if not sep or op not in OPS:
+            field, op = key, 'eq'
+        res.append(Condition(field, op, value))
+    return res
+
+
+class FieldIndex(object):
+    """
+    field value -> _ids of the components with that value, for one field of one workspace
+    components without the field, or with a value that can't be a key (e.g. a dict), are not in the index
+    """
+
+    def __init__(self, field, components=()):
+        self.field = field
+        self.buckets = {}  # field value -> set of _ids
+        self._sorted = None  # kind -> sorted distinct values, built on first range or prefix lookup
+        for c in components:
+            self.add(c)
+
+    def _key(self, c):
+        v = c.get(self.field, _MISSING)
+        if v is _MISSING:
+            return v
+        return _hashable(v)
+
+    def add(self, c):
+        v = self._key(c)
+        if v is _MISSING:
+            return
+        ids = self.buckets.get(v)
+        if ids is None:
+            self.buckets[v] = {c['_id']}
+            kind = _kind(v)
+            if self._sorted is not None and kind is not None:
+                insort(self._sorted[kind], v)
+        else:
+            ids.add(c['_id'])
+
+    def remove(self, c):
+        v = self._key(c)
+        ids = self.buckets.get(v)
+        if ids is None:
+            return
+        ids.discard(c['_id'])
+        if not ids:
+            del self.buckets[v]
+            kind = _kind(v)
+            if self._sorted is not None and kind is not None:
+                values = self._sorted[kind]
+                pos = bisect_left(values, v)
+                if pos < len(values) and values[pos] == v:
+                    del values[pos]
+
+    def _sorted_values(self, kind):
+        if self._sorted is None:
+            self._sorted = {'str': [], 'num': []}
+            for v in self.buckets:
+                k = _kind(v)
+                if k is not None:
+                    self._sorted[k].append(v)
+            for values in self._sorted.values():
+                values.sort()
+        return self._sorted[kind]
+
+    def values(self, cond):
+        """
+        :return: the index values that match a condition, or None if the index can't answer it
+        """
+        op = cond.op
+        if op == 'eq':
+            v = _hashable(cond.value)
+            if v is _MISSING:
+                return None
+            return [v] if v in self.buckets else []
+        if op == 'in':
+            return [v for v in cond._values if v in self.buckets]
+        if op in ('contains', 'icontains'):  # checks each distinct value instead of each component
+            return [v for v in self.buckets if cond.match({self.field: v})]
+        if op == 'prefix':
+            values = self._sorted_values('str')
+            res = []
+            for pos in range(bisect_left(values, cond.value), len(values)):
+                if not values[pos].startswith(cond.value):
+                    break
+                res.append(values[pos])
+            return res
+        values = self._sorted_values(_kind(cond.value))
+        if op == 'lt':
+            return values[:bisect_left(values, cond.value)]
+        if op == 'lte':
+            return values[:bisect_right(values, cond.value)]
+        if op == 'gt':
+            return values[bisect_right(values, cond.value):]
+        return values[bisect_left(values, cond.value):]
+
+    def count(self, values):
+        return sum(len(self.buckets[v]) for v in values)
+
+    def ids(self, values):
+        if len(values) == 1:
+            return self.buckets[values[0]]
+        res = set()
+        for v in values:
+            res.update(self.buckets[v])
+        return res
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def __repr__(self):
+        return f'FieldIndex({self.field!r}, values={len(self.buckets)})'
+
+
+class QueryIndex(object):
+    """
+    the FieldIndexes of one cached workspace and the query planner over them
+    a field gets an index when it has been queried index_after times, or with create_index
+    """
+
+    def __init__(self, components, index_after=2):
+        '''
+        :param components: the list of cached components. it is read when an index is built
+        :param index_after: number of queries on a field before it is indexed. 1 indexes on first use
+        '''
+        self.components = components
+        self.index_after = index_after
+        self.indexes = {}  # field -> FieldIndex
+        self._uses = {}  # field -> number of queries that could have used an index
+
+    def create_index(self, field):
+        index = self.indexes.get(field)
+        if index is None:
+            index = self.indexes[field] = FieldIndex(field, self.components)
+            logger.debug('query - indexed field %s: %d values', field, len(index))
+        return index
+
+    def drop_index(self, field):
+        self.indexes.pop(field, None)
+        self._uses.pop(field, None)
+
+    def add(self, c):
+        for index in self.indexes.values():
+            index.add(c)
+
+    def remove(self, c):
+        for index in self.indexes.values():
+            index.remove(c)
+
+    def _index_for(self, field):
+        index = self.indexes.get(field)
+        if index is None:
+            uses = self._uses[field] = self._uses.get(field, 0) + 1
+            if uses >= self.index_after:
+                index = self.create_index(field)
+        return index
+
+    def run(self, conditions, get_by_id, limit=None):
+        """
+        :param conditions: list of Conditions
+        :param get_by_id: function from component _id to the cached component
+        :param limit: optional max number of components
+        :return: list of the matching components
+        """
+        best = None  # (number of components, condition, index, values)
+        for cond in conditions:
+            if cond.op not in _INDEXED_OPS:
+                continue
+            index = self._index_for(cond.field)
+            if index is None:
+                continue
+            values = index.values(cond)
+            if values is None:
+                continue
+            n = index.count(values)
+            if best is None or n < best[0]:
+                best = (n, cond, index, values)
+        if best is None:
+            candidates = self.components
+            rest = conditions
+        else:
+            n, cond, index, values = best
+            if n == 0:
+                return []
+            candidates = (get_by_id(_id) for _id in index.ids(values))
+            rest = [c for c in conditions if c is not cond]
+        res = []
+        for c in candidates:
+            if c is not None and all(cond.match(c) for cond in rest):
+                res.append(c)
+                if limit is not None and len(res) >= limit:
+                    break
+        return res
@@ -0,0 +1,115 @@
+import sys
+from collections.abc import MutableMapping
+
+'''
+Compact records for the ArdoqSyncClient cache (compact=True)
+
+An aggregated component or reference is a dict with 20-40 attributes. Most of the memory for a cached entity
+is the dict itself, not the values. CompactRecord keeps the attribute names once per distinct set of names
+(a shape shared by all entities with the same attributes) and the values in a tuple per entity.
+Attribute names and values that repeat across entities (typeId, type, workspace and user ids) are interned.
+
+A CompactRecord behaves like a dict for reading. The first write turns it into a normal dict internally,
+so it works with the existing cache logic. as_dict() gives a plain dict copy.
+'''
+
+# attributes with values that repeat across many entities
+INTERNED_VALUES = frozenset(['typeId', 'type', 'rootWorkspace', 'targetWorkspace', 'model',
+                             'createdBy', 'createdByName', 'createdByEmail',
+                             'lastModifiedBy', 'lastModifiedByName', 'lastModifiedByEmail'])
+
+_shapes = {}  # keys tuple -> _Shape
+
+
+class _Shape(object):
+    __slots__ = ('keys', 'index', 'interned')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = {k: i for i, k in enumerate(keys)}
+        self.interned = tuple(k in INTERNED_VALUES for k in keys)
+
+
+def _shape(keys):
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes[keys] = _Shape(tuple(sys.intern(k) if isinstance(k, str) else k for k in keys))
+    return shape
+
+
+class CompactRecord(MutableMapping):
+    __slots__ = ('_shape', '_values', '_dict')
+
+    def __init__(self, entity):
+        shape = _shape(tuple(entity))
+        self._shape = shape
+        self._values = tuple(sys.intern(v) if i and isinstance(v, str) else v
+                             for i, v in zip(shape.interned, entity.values()))
+        self._dict = None
+
+    def _materialize(self):
+        if self._dict is None:
+            self._dict = dict(zip(self._shape.keys, self._values))
+            self._shape = self._values = None
+        return self._dict
+
+    def __getitem__(self, key):
+        if self._dict is not None:
+            return self._dict[key]
+        return self._values[self._shape.index[key]]
+
+    def get(self, key, default=None):
+        if self._dict is not None:
+            return self._dict.get(key, default)
+        pos = self._shape.index.get(key)
+        return default if pos is None else self._values[pos]
+
+    def __contains__(self, key):
+        if self._dict is not None:
+            return key in self._dict
+        return key in self._shape.index
+
+    def __setitem__(self, key, value):
+        self._materialize()[key] = value
+
+    def __delitem__(self, key):
+        del self._materialize()[key]
+
+    def __iter__(self):
+        if self._dict is not None:
+            return iter(self._dict)
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        if self._dict is not None:
+            return len(self._dict)
+        return len(self._values)
+
+    def as_dict(self):
+        if self._dict is not None:
+            return dict(self._dict)
+        return dict(zip(self._shape.keys, self._values))
+
+    def __repr__(self):
+        return 'CompactRecord(%r)' % self.as_dict()
+
+    def __reduce__(self):
+        return CompactRecord, (self.as_dict(),)
+
+
+def compact(entity):
+    """
+    :return: the entity as a CompactRecord. entities that already are records are returned as they are
+    """
+    if isinstance(entity, CompactRecord):
+        return entity
+    return CompactRecord(entity)
+
+
+def plain(entity):
+    """
+    :return: a dict for entities that are CompactRecords, e.g. before they are sent as json
+    """
+    if isinstance(entity, CompactRecord):
+        return entity.as_dict()
+    return entity
@@ -0,0 +1,87 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+from ardoqpy import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+'''
+WorkspaceStore is a persistent cache of aggregated workspaces in a sqlite file
+Used by ArdoqSyncClient (cache_file param) so that a new process doesn't download every workspace again
+
+Each workspace is stored as compressed json, keyed by host url and workspace id,
+together with a stamp from the workspace metadata (_version and lastUpdated)
+A stored workspace is only used if its stamp matches the stamp ardoq has now
+and, if max_age is set, it is younger than max_age seconds
+'''
+
+
+def workspace_stamp(meta):
+    """
+    :param meta: the workspace metadata, e.g. from get_workspace without aggregated
+    :return: string identifying the version of the workspace, None if the metadata has no version information
+    """
+    version, updated = meta.get('_version'), meta.get('lastUpdated')
+    if version is None and updated is None:
+        return None
+    return json.dumps([version, updated])
+
+
+class WorkspaceStore(object):
+
+    def __init__(self, path, max_age=None):
+        '''
+        :param path: sqlite file to use. created if it doesn't exist
+        :param max_age: optional, max age in seconds of a stored workspace. older workspaces are fetched again
+        '''
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()  # the connection is shared with the preload threads
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS workspace '
+                         '(host TEXT, ws_id TEXT, stamp TEXT, saved REAL, data BLOB, PRIMARY KEY (host, ws_id))')
+        self._db.commit()
+
+    def get(self, host, ws_id, stamp):
+        """
+        :return: the stored aggregated workspace if it is still valid for stamp, otherwise None
+        """
+        if stamp is None:
+            return None
+        with self._lock:
+            row = self._db.execute('SELECT stamp, saved, data FROM workspace WHERE host = ? AND ws_id = ?',
+                                   (host, ws_id)).fetchone()
+        if row is None:
+            logger.debug('workspace store - miss: %s', ws_id, extra={'workspace': ws_id, 'store': 'miss'})
+            return None
+        if row[0] != stamp or (self.max_age is not None and time.time() - row[1] > self.max_age):
+            logger.debug('workspace store - stale: %s', ws_id, extra={'workspace': ws_id, 'store': 'stale'})
+            return None
+        logger.debug('workspace store - hit: %s', ws_id, extra={'workspace': ws_id, 'store': 'hit'})
+        return json_loads(zlib.decompress(row[2]))
+
+    def put(self, host, ws_id, stamp, ws):
+        if stamp is None:
+            return
+        data = zlib.compress(json_dumps(ws))
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO workspace VALUES (?, ?, ?, ?, ?)',
+                             (host, ws_id, stamp, time.time(), data))
+            self._db.commit()
+
+    def delete(self, host, ws_id):
+        with self._lock:
+            self._db.execute('DELETE FROM workspace WHERE host = ? AND ws_id = ?', (host, ws_id))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM workspace')
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,169 @@
+import codecs
+import json
+import logging
+
+try:
+    import ijson
+except ImportError:  # ijson is optional. the pure python parser below is used without it
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+'''
+Incremental parser for aggregated workspace responses
+iter_aggregated yields the components, references, and tags one at a time while the response is read,
+so the full response body and the full dict tree are never in memory at the same time
+
+uses ijson if it is installed, otherwise a pure python parser that decodes one item at a time with json
+
+for kind, item in iter_aggregated(resp.iter_content(65536)):
+    kind is 'components', 'references', or 'tags' for each item,
+    and 'workspace' for the last one, which has the other workspace attributes
+'''
+
+STREAM_FIELDS = ('components', 'references', 'tags')
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = ',:]}' + _WHITESPACE
+
+
+class _ChunkFile(object):
+    # file-like wrapper around an iterable of byte chunks, for ijson
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buf = b''
+
+    def read(self, n=-1):
+        while n < 0 or len(self.buf) < n:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buf += chunk
+        if n < 0:
+            n = len(self.buf)
+        data, self.buf = self.buf[:n], self.buf[n:]
+        return data
+
+
+def _iter_ijson(chunks, fields):
+    meta = ijson.ObjectBuilder()
+    item = None  # ObjectBuilder for the item being parsed
+    streaming = None  # the field whose array is being streamed
+    for prefix, event, value in ijson.parse(_ChunkFile(chunks), use_float=True):
+        if streaming is None:
+            if event == 'start_array' and prefix in fields:
+                streaming = prefix
+            meta.event(event, value)
+            continue
+        if prefix == streaming and event == 'end_array':
+            streaming = None
+            meta.event(event, value)
+            continue
+        if item is None:
+            if event in ('start_map', 'start_array'):
+                item = ijson.ObjectBuilder()
+                item.event(event, value)
+            else:  # scalar item
+                yield streaming, value
+            continue
+        item.event(event, value)
+        if prefix == streaming + '.item' and event in ('end_map', 'end_array'):
+            yield streaming, item.value
+            item = None
+    yield 'workspace', meta.value
+
+
+class _Reader(object):
+    # buffered reader that decodes one complete json value at a time from a stream of byte chunks
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self.decoder.decode(b'', final=True)
+        else:
+            text = self.decoder.decode(chunk)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                raise ValueError('unexpected end of json stream')
+
+    def expect(self, c):
+        if self.peek() != c:
+            raise ValueError(f"expected '{c}' at '{self.buf[self.pos:self.pos + 20]}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer might continue in the next chunk ('1.' of '1.25').
+                # a complete value is always followed by a delimiter
+                if self.eof or (end < len(self.buf) and self.buf[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._more()
+
+
+def _iter_python(chunks, fields):
+    reader = _Reader(chunks)
+    meta = {}
+    reader.expect('{')
+    while True:
+        c = reader.peek()
+        if c == '}':
+            break
+        if c == ',':
+            reader.pos += 1
+            continue
+        key = reader.value()
+        reader.expect(':')
+        if key in fields and reader.peek() == '[':
+            reader.pos += 1
+            meta[key] = []
+            while True:
+                c = reader.peek()
+                if c == ']':
+                    reader.pos += 1
+                    break
+                if c == ',':
+                    reader.pos += 1
+                    continue
+                yield key, reader.value()
+        else:
+            meta[key] = reader.value()
+    yield 'workspace', meta
+
+
+def iter_aggregated(chunks, fields=STREAM_FIELDS):
+    """
+    generator that parses an aggregated workspace from a stream of bytes
+    :param chunks: iterable of byte chunks, e.g. resp.iter_content(65536) of a request with stream=True
+    :param fields: the top level lists to stream item by item
+    :return: yields (field, item) for each item in the streamed lists,
+        then ('workspace', dict) with the other attributes. the streamed lists in that dict are empty
+    """
+    if ijson is not None:
+        return _iter_ijson(chunks, fields)
+    return _iter_python(chunks, fields)
@@ -1,8 +1,15 @@
+import functools
 import logging
 import secrets
-from ardoqpy import ArdoqClient
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itertools import islice
+from ardoqpy import ArdoqClient, ArdoqClientException, Batch, WorkspaceStore, workspace_stamp, iter_aggregated, CompactRecord, plain
+from ardoqpy import Span, ReferenceGraph, QueryIndex, parse_conditions, WritePipeline, NotFoundError
+from ardoqpy.ardoqpy_query import _hashable, _BoolKey, _MISSING
 
-logging.basicConfig(format='%(asctime)s %(message)s', level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 '''
@@ -16,22 +23,957 @@ If simulate is True then write operations update the report but are not performe
 return value from these operations will be the same as the input param
 
 ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', simulate=True)
+
+Has a batch mode - batch_size
+If batch_size is set then creates, updates, and deletes are queued and sent through the v2 batch endpoint
+batch_size is the max number of operations in each batch request. flush_threshold is the number of queued
+operations that triggers a flush, it defaults to batch_size. call flush() at the end of a run to send the rest
+create operations return a placeholder with a batchId as _id. the placeholder can be used as parent, source or target
+and gets the real _id and attributes from ardoq when the batch is flushed
+
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', batch_size=500)
+
+Has a concurrent write mode - write_workers
+If write_workers is set then writes are queued as in batch mode, and flush() sends them as single v2 requests,
+write_workers at a time (see WritePipeline). each operation waits only for the operations it needs:
+a reference for the creates of its source and target, a component for the create of its parent,
+a component delete for the operations on its references and child components. batch_size, if it is set too,
+is the number of queued operations that triggers a flush
+
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', write_workers=16)
+
+Has a persistent cache - cache_file
+If cache_file is set then aggregated workspaces are kept in that sqlite file between runs (see WorkspaceStore)
+loading a workspace first gets the workspace metadata and only downloads the aggregated workspace
+if the _version/lastUpdated of the workspace has changed since it was stored.
+cache_max_age (seconds) forces a download of stored workspaces older than that
+
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', cache_file='ardoq_cache.db')
+
+Has a streaming mode - stream
+If stream is True then aggregated workspaces are parsed while they are downloaded (see iter_aggregated)
+and each component and reference goes straight into the cache. this keeps peak memory close to the size of the cache
+stream_workspace(ws_id, on_item) streams a workspace to a callback instead of the cache
+
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', stream=True)
+
+Has a compact mode - compact
+If compact is True then cached components and references are kept as CompactRecords instead of dicts
+which uses a fraction of the memory for large workspaces. records read like dicts
+
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', compact=True)
+
+Has a bulk ingest - ingest_components
+It takes rows (dicts, csv.DictReader, pandas DataFrame, pyarrow Table or ParquetFile) and a column -> attribute
+mapping, resolves type names through the WorkspaceModel, diffs each chunk of rows against the cache,
+and sends only the creates, updates (and deletes with delete_missing) through the batch endpoint
+
+ardoq.ingest_components(ws_id, csv.DictReader(f), {'App': 'name', 'Kind': 'type', 'Owner': 'owner'})
+
+For very large workspaces processes=n moves the row mapping and diffing to n worker processes (see IngestShards).
+rows and cached components are partitioned by a hash of their name, or key_field value, so each worker only
+holds and diffs its own part. the parent queues and sends the changes and merges the stats
+
+ardoq.ingest_components(ws_id, rows, mapping, processes=8)
+
+Has a mark-and-sweep mode for mirroring a source system - start_sync and sweep
+After start_sync every component and reference that the run creates, updates or finds unchanged is marked.
+sweep deletes the cached components and references of the same workspaces and types that were not marked,
+in concurrent batch requests. with simulate=True sweep only reports what it would delete
+
+ardoq.start_sync([ws_id])
+... create_component / create_reference / ingest_components for each source item ...
+ardoq.sweep()
+
+Updates found by create_component and create_reference only send the attributes that changed,
+as a v2 PATCH (patch_component/patch_reference). patch=False sends the full entity with a v1 PUT instead
+
+Can be used from several threads, e.g. an importer that runs create_component and create_reference on a thread pool
+each cached workspace has its own lock (see WorkspaceIndex), report counters are updated under a client lock,
+and creates of the same component (rootWorkspace, name and typeId, or the match field) or the same reference
+(source, target and type) run one at a time, so two threads creating the same component make one create
+and the other finds it in the cache. ingest_components, start_sync and sweep are for one thread at a time
+
+Hooks (see Metrics) also get a SpanEvent for each step of a sync run:
+cache_load for each workspace loaded into the cache, lookup for each cache lookup of a component or reference,
+and write for each create, update, delete and flush call. op is the name of the function
 '''
 
+# v1 attributes that are set by ardoq, they are not sent in v2 batch bodies
+_V1_SYSTEM_KEYS = {'_id', '_version', 'created', 'createdBy', 'createdByName', 'createdByEmail',
+                   'lastUpdated', 'lastModifiedBy', 'lastModifiedByName', 'lastModifiedByEmail',
+                   'component-key', 'ordering', 'children', 'incomingReferenceCount', 'outgoingReferenceCount',
+                   'model', 'version', 'origin', '_meta'}
+# v1 attributes that the v2 API has as top level attributes. everything else is a customField in v2
+_V2_KEYS = {'components': {'rootWorkspace', 'name', 'typeId', 'parent', 'description'},
+            'references': {'source', 'target', 'type', 'displayText', 'description'}}
+# v1 attributes that v2 derives itself (comp type name, ref workspaces) or has dropped
+_V1_ONLY_KEYS = {'components': {'type'},
+                 'references': {'rootWorkspace', 'targetWorkspace', 'order', 'returnValue'}}
+# component deletes go last: ardoq deletes the references of a deleted component, so a reference delete
+# sent after it would fail
+_BATCH_ORDER = {('components', 'create'): 0, ('components', 'update'): 1, ('references', 'create'): 2,
+                ('references', 'update'): 3, ('references', 'delete'): 4, ('components', 'delete'): 5}
+
+
+def _to_v2(resource, item):
+    body = {}
+    custom = {}
+    for k, v in item.items():
+        if k in _V1_SYSTEM_KEYS or k in _V1_ONLY_KEYS[resource]:
+            continue
+        if k in _V2_KEYS[resource]:
+            body[k] = v
+        else:
+            custom[k] = v
+    if custom:
+        body['customFields'] = custom
+    return body
+
+
+def _diff(old, new):
+    # the attributes in new that are missing or different in old
+    return {k: v for k, v in new.items() if k not in old or old[k] != v}
+
+
+def _from_v2(entity):
+    # v2 entities have customFields in a separate dict, the v1 cache has them as attributes
+    e = dict(entity)
+    e.update(e.pop('customFields', None) or {})
+    return e
+
+
+def _batch_entity(item):
+    # respondWithEntities gives the entity with each result. fall back to the id if it isn't there
+    for k in ('entity', 'body'):
+        if isinstance(item.get(k), dict):
+            e = _from_v2(item[k])
+            break
+    else:
+        e = {}
+    if '_id' not in e and 'id' in item:
+        e['_id'] = item['id']
+    return e
+
+
+def _write_span(fn):
+    # times a write operation as a 'write' span for the hooks, with the function name as op
+    op = fn.__name__
+
+    @functools.wraps(fn)
+    def write(self, *args, **kwargs):
+        if not self.hooks:
+            return fn(self, *args, **kwargs)
+        with Span(self.hooks, 'write', {'op': op}):
+            return fn(self, *args, **kwargs)
+    return write
+
+
+def _touches(fn):
+    # marks the _id of the entity a write returns as touched in a sync run (see start_sync)
+    @functools.wraps(fn)
+    def touch(self, *args, **kwargs):
+        res = fn(self, *args, **kwargs)
+        if self._touched is not None:
+            _id = res.get('_id') if isinstance(res, Mapping) else None
+            if not _id:  # simulated updates return the input, which might not have the _id
+                _id = kwargs.get('comp_id') or kwargs.get('ref_id')
+                if _id is None and args and isinstance(args[0], str):
+                    _id = args[0]
+            if _id:
+                self._touched.add(_id)
+        return res
+    return touch
+
+
+def _entity_lock(key):
+    # runs a create under the lock of the entity it matches, so threads creating the same entity take turns.
+    # key is called with the arguments of the create and returns the match key
+    def decorate(fn):
+        @functools.wraps(fn)
+        def locked(self, *args, **kwargs):
+            k = key(self, *args, **kwargs)
+            with self._key_locks[hash(k) % len(self._key_locks)]:
+                return fn(self, *args, **kwargs)
+        return locked
+    return decorate
+
+
+def _comp_lock_key(self, comp=None, field_name=None, field_value=None):
+    # a component can be matched by name in one thread and by a field in another, so the key is the _id of
+    # the cached match. a create of a new component takes the key of its workspace and type, which both share
+    c = self._cached_index(comp['rootWorkspace']).find_component(name=comp.get('name'), type_id=comp['typeId'],
+                                                                 field_name=field_name, field_value=field_value)
+    if c:
+        return c['_id']
+    return comp['rootWorkspace'], comp['typeId']
+
+
+def _ref_lock_key(self, ref=None):
+    return ref['rootWorkspace'], self._resolve_id(ref['source']), self._resolve_id(ref['target']), ref['type']
+
+
+def _row_chunks(rows, size):
+    # lists of row dicts from an iterable of dicts, a pyarrow Table or ParquetFile, or a pandas DataFrame
+    if hasattr(rows, 'iter_batches'):  # pyarrow.parquet.ParquetFile, read a batch at a time
+        for b in rows.iter_batches(batch_size=size):
+            yield b.to_pylist()
+    elif hasattr(rows, 'to_batches'):  # pyarrow Table
+        for b in rows.to_batches(max_chunksize=size):
+            yield b.to_pylist()
+    elif hasattr(rows, 'iloc') and hasattr(rows, 'to_dict'):  # pandas DataFrame
+        for start in range(0, len(rows), size):
+            yield rows.iloc[start:start + size].to_dict('records')
+    else:
+        it = iter(rows)
+        while True:
+            chunk = list(islice(it, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _ingest_row(row, mapping, ws_id, type_id, type_name, key_field=None):
+    # the component for a row, or None if its type can't be resolved or it has nothing to match on
+    # (no name, and no key_field value). empty cells are left out. names are strings, e.g. from a number column
+    # type_id is a function from type name to typeId
+    comp = {'rootWorkspace': ws_id}
+    for col, attr in mapping.items():
+        v = row.get(col)
+        if v is None or v != v:  # None, or NaN from pandas and pyarrow
+            continue
+        comp[attr] = v
+    if 'name' in comp:
+        if not isinstance(comp['name'], str):
+            comp['name'] = str(comp['name'])
+    elif key_field is None or comp.get(key_field) is None:
+        return None
+    name = comp.pop('type', type_name)
+    if 'typeId' not in comp:
+        tid = type_id(name) if name is not None else None
+        if tid is None:
+            return None
+        comp['typeId'] = tid
+    return comp
+
+
+def _match_row(idx, comp, key_field):
+    # (match key, cached component or None) for the component of a row
+    # rows are matched on key_field if they have it, else on name and type
+    if key_field is not None and comp.get(key_field) is not None:
+        return ((comp[key_field], comp['typeId']),
+                idx.find_component(type_id=comp['typeId'], field_name=key_field, field_value=comp[key_field]))
+    return (comp['name'].lower(), comp['typeId']), idx.find_component(name=comp['name'], type_id=comp['typeId'])
+
+
+class WorkspaceIndex(object):
+    '''
+    lookup tables over one cached aggregated workspace so that cache hits are O(1)
+    components and references stay in the workspace lists, the tables map keys to _ids and _ids to list positions
+    keys that match several cache entries keep all their _ids. the first one wins, same as the old linear scan
+    if compact is True, the entities in the workspace lists are replaced with CompactRecords
+    if graph is set to a ReferenceGraph, reference changes are applied to it too
+    queries (see QueryIndex) use field indexes that are kept up to date the same way
+    lookups and updates hold the lock of the index, so one workspace can be used from several threads.
+    hold it too for several steps that must not be interleaved, e.g. unindex_component, change, put_component
+    '''
+
+    def __init__(self, ws, compact=False, index_after=2):
+        self.ws = ws
+        self.lock = threading.RLock()
+        if not ws.get('components'):
+            ws['components'] = []
+        if not ws.get('references'):
+            ws['references'] = []
+        if compact:
+            for entities in (ws['components'], ws['references']):
+                for pos, e in enumerate(entities):  # in place so each dict can be freed as soon as it is replaced
+                    entities[pos] = CompactRecord(e)
+        self.comp_pos = {}  # _id -> position in ws['components']
+        self.comp_name = {}  # (lowercased name, typeId) -> [_id]
+        self.comp_field = {}  # field_name -> {(field_value, typeId): [_id]}, built on first use of a field
+        self.ref_pos = {}  # _id -> position in ws['references']
+        self.ref_key = {}  # (source, target, type) -> [_id]
+        self.comp_refs = None  # component _id -> {_ids of its references}, built on first use, see references_of
+        self.graph = None  # ReferenceGraph shared by the indexes of a client. see ArdoqSyncClient.graph
+        self.query_index = QueryIndex(ws['components'], index_after=index_after)
+        for pos, c in enumerate(ws['components']):
+            self.comp_pos[c['_id']] = pos
+            self._add_key(self.comp_name, self._name_key(c), c['_id'])
+        for pos, r in enumerate(ws['references']):
+            self.ref_pos[r['_id']] = pos
+            self._add_key(self.ref_key, self._ref_key(r), r['_id'])
+
+    @staticmethod
+    def _name_key(c):
+        # None for a component without a name, e.g. created by a field match. it is only found by its fields
+        name = c.get('name')
+        if name is None:
+            return None
+        return name.lower(), c['typeId']
+
+    @staticmethod
+    def _field_key(c, field_name):
+        if field_name not in c:
+            return None
+        v = _hashable(c[field_name])
+        if v is None or v is _MISSING:
+            return None
+        return v, c['typeId']
+
+    @staticmethod
+    def _ref_key(r):
+        return r['source'], r['target'], r['type']
+
+    @staticmethod
+    def _add_key(table, key, _id):
+        if key is None:
+            return
+        ids = table.get(key)
+        if ids is None:
+            table[key] = [_id]
+        elif _id not in ids:
+            ids.append(_id)
+
+    @staticmethod
+    def _remove_key(table, key, _id):
+        ids = table.get(key)
+        if not ids or _id not in ids:
+            return
+        ids.remove(_id)
+        if not ids:
+            del table[key]
+
+    def _index_field(self, field_name):
+        table = {}
+        for c in self.ws['components']:
+            self._add_key(table, self._field_key(c, field_name), c['_id'])
+        self.comp_field[field_name] = table
+        return table
+
+    def get_component_by_id(self, comp_id):
+        with self.lock:
+            pos = self.comp_pos.get(comp_id)
+            if pos is None:
+                return None
+            return self.ws['components'][pos]
+
+    def find_component(self, name=None, type_id=None, field_name=None, field_value=None):
+        with self.lock:
+            if field_name is not None:
+                table = self.comp_field.get(field_name)
+                if table is None:
+                    table = self._index_field(field_name)
+                v = _hashable(field_value)
+                if v is None or v is _MISSING:  # None and unhashable values are not indexed, fall back to a scan
+                    for c in self.ws['components']:
+                        if c.get(field_name) == field_value and c['typeId'] == type_id:
+                            return c
+                    return None
+                ids = table.get((v, type_id))
+            else:
+                ids = self.comp_name.get((name.lower(), type_id))
+            if not ids:
+                return None
+            return self.get_component_by_id(ids[0])
+
+    def _index_component(self, c):
+        self._add_key(self.comp_name, self._name_key(c), c['_id'])
+        for field_name, table in self.comp_field.items():
+            self._add_key(table, self._field_key(c, field_name), c['_id'])
+        self.query_index.add(c)
+
+    def _unindex_component(self, c):
+        self._remove_key(self.comp_name, self._name_key(c), c['_id'])
+        for field_name, table in self.comp_field.items():
+            self._remove_key(table, self._field_key(c, field_name), c['_id'])
+        self.query_index.remove(c)
+
+    def unindex_component(self, c):
+        '''
+        drop the keys for a cached component before it is modified in place. put_component adds them back
+        '''
+        with self.lock:
+            self._unindex_component(c)
+
+    def put_component(self, c):
+        '''
+        add a component to the cache, or replace the cached component with the same _id
+        '''
+        with self.lock:
+            comps = self.ws['components']
+            pos = self.comp_pos.get(c['_id'])
+            if pos is None:
+                self.comp_pos[c['_id']] = len(comps)
+                comps.append(c)
+            else:
+                self._unindex_component(comps[pos])
+                comps[pos] = c
+            self._index_component(c)
+            return c
+
+    def remove_component(self, comp_id):
+        '''
+        removes the component from the cache. the last component is moved into its slot to keep this O(1)
+        :return: the removed component or None if it wasn't cached
+        '''
+        with self.lock:
+            pos = self.comp_pos.pop(comp_id, None)
+            if pos is None:
+                return None
+            comps = self.ws['components']
+            c = comps[pos]
+            self._unindex_component(c)
+            last = comps.pop()
+            if last is not c:
+                comps[pos] = last
+                self.comp_pos[last['_id']] = pos
+            return c
+
+    def query(self, conditions, limit=None):
+        '''
+        :param conditions: list of Conditions
+        :return: list of the cached components that match all of them
+        '''
+        with self.lock:
+            return self.query_index.run(conditions, self.get_component_by_id, limit=limit)
+
+    def get_reference_by_id(self, ref_id):
+        with self.lock:
+            pos = self.ref_pos.get(ref_id)
+            if pos is None:
+                return None
+            return self.ws['references'][pos]
+
+    def find_reference(self, source=None, target=None, ref_type=None):
+        with self.lock:
+            ids = self.ref_key.get((source, target, ref_type))
+            if not ids:
+                return None
+            return self.get_reference_by_id(ids[0])
+
+    def unindex_reference(self, r):
+        with self.lock:
+            self._remove_key(self.ref_key, self._ref_key(r), r['_id'])
+            if self.comp_refs is not None:
+                for end in (r.get('source'), r.get('target')):
+                    ids = self.comp_refs.get(end)
+                    if ids is not None:
+                        ids.discard(r['_id'])
+                        if not ids:
+                            del self.comp_refs[end]
+
+    def _index_comp_refs(self, r):
+        for end in (r.get('source'), r.get('target')):
+            self.comp_refs.setdefault(end, set()).add(r['_id'])
+
+    def references_of(self, comp_ids):
+        '''
+        :param comp_ids: component _ids
+        :return: the cached references with one of the components as source or target
+        '''
+        with self.lock:
+            if self.comp_refs is None:
+                self.comp_refs = {}
+                for r in self.ws['references']:
+                    self._index_comp_refs(r)
+            ref_ids = set()
+            for comp_id in comp_ids:
+                ref_ids.update(self.comp_refs.get(comp_id, ()))
+            refs = self.ws['references']
+            return [refs[self.ref_pos[_id]] for _id in ref_ids if _id in self.ref_pos]
+
+    def put_reference(self, r):
+        with self.lock:
+            refs = self.ws['references']
+            pos = self.ref_pos.get(r['_id'])
+            if pos is None:
+                self.ref_pos[r['_id']] = len(refs)
+                refs.append(r)
+            else:
+                self.unindex_reference(refs[pos])
+                refs[pos] = r
+            self._add_key(self.ref_key, self._ref_key(r), r['_id'])
+            if self.comp_refs is not None:
+                self._index_comp_refs(r)
+            if self.graph is not None:
+                self.graph.put_reference(r)
+            return r
+
+    def remove_reference(self, ref_id):
+        with self.lock:
+            pos = self.ref_pos.pop(ref_id, None)
+            if pos is None:
+                return None
+            refs = self.ws['references']
+            r = refs[pos]
+            self.unindex_reference(r)
+            if self.graph is not None:
+                self.graph.remove_reference(ref_id)
+            last = refs.pop()
+            if last is not r:
+                refs[pos] = last
+                self.ref_pos[last['_id']] = pos
+            return r
+
+
+_shard = {}  # state of the shard in a worker process of IngestShards, set by _shard_init
+
+
+def _shard_init(ws_id, components, mapping, type_ids, type_name, key_field, simulate):
+    # the first task of each worker process. components is the cache partition of the shard
+    _shard.clear()
+    _shard.update(idx=WorkspaceIndex({'_id': ws_id, 'components': components, 'references': []}),
+                  ws_id=ws_id, mapping=mapping, type_ids=type_ids, type_name=type_name, key_field=key_field,
+                  simulate=simulate, seen=set(), types=set(), next_id=0)
+
+
+def _shard_diff(put, remove, rows):
+    # applies the components the parent sent back after the last flush, then diffs rows against the partition
+    # returns the ops for the parent to queue: ('create', worker id, comp) and ('update', _id, comp)
+    # creates get an int worker id until the parent sends the component ardoq created
+    idx = _shard['idx']
+    for _id in remove:
+        idx.remove_component(_id)
+    for c in put:
+        idx.put_component(c)
+    ops = []
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    for row in rows:
+        comp = _ingest_row(row, _shard['mapping'], _shard['ws_id'], _shard['type_ids'].get, _shard['type_name'],
+                           _shard['key_field'])
+        if comp is None:
+            counts['skipped'] += 1
+            continue
+        _shard['types'].add(comp['typeId'])
+        c = _match_row(idx, comp, _shard['key_field'])[1]
+        if c is None:
+            _shard['next_id'] += 1
+            idx.put_component(dict(comp, _id=_shard['next_id']))
+            ops.append(('create', _shard['next_id'], comp))
+            counts['created'] += 1
+            continue
+        created = isinstance(c['_id'], int)
+        if created and _shard['simulate']:  # counted as a create already, as in the parent
+            counts['updated'] += 1
+            continue
+        if not created:
+            _shard['seen'].add(c['_id'])
+        if not _diff(c, comp):
+            counts['unchanged'] += 1
+            continue
+        idx.put_component(dict(c, **comp))
+        ops.append(('update', c['_id'], comp))
+        counts['updated'] += 1
+    return ops, counts
+
+
+def _shard_done():
+    return _shard['seen'], _shard['types']
+
+
+class IngestShards(object):
+    '''
+    worker processes that diff rows for ingest_components(processes=n)
+    rows are partitioned by a hash of their match key, the name or the key_field value, and each partition
+    has its own worker process. at the start each worker gets the cached components of its partition,
+    with only the attributes the rows can set. the workers turn rows into components and diff them against
+    their partition, and return the creates and updates. the parent queues and flushes them, and sends
+    the components ardoq returned back to the workers, so the next chunk is diffed against the same cache
+    with a key_field, rows without a key value are matched in the parent by name, as without processes
+    the rows of a chunk are matched partition by partition, not in row order
+    on platforms that spawn worker processes (Windows, macOS) the calling script needs a __main__ guard
+    '''
+
+    def __init__(self, client, idx, wm, mapping, type_name, key_field, processes):
+        self.client = client
+        self.idx = idx
+        self.key_field = key_field
+        self.changed = []  # cached components the chunk created or changed, sent to the workers after the flush
+        self._creates = []  # (placeholder, shard, worker id) of the creates from the workers
+        self._put = [[] for _ in range(processes)]  # shard -> components to send with the next chunk
+        self._remove = [[] for _ in range(processes)]  # shard -> _ids or worker ids to remove
+        self._key_attr = key_field if key_field is not None else 'name'
+        # a later column wins in _ingest_row, so the key of a row is in the last column that has a value
+        self._key_cols = [col for col, attr in reversed(list(mapping.items())) if attr == self._key_attr]
+        self._attrs = {'_id', 'name', 'typeId', 'rootWorkspace', self._key_attr} | set(mapping.values())
+        self._attrs.discard('type')
+        parts = [[] for _ in range(processes)]
+        with idx.lock:
+            for c in idx.ws['components']:
+                shard = self._shard_of(c)
+                if shard is not None:
+                    parts[shard].append(self._project(c))
+        type_ids = {name: ct['id'] for name, ct in wm.component_types_by_name.items()}
+        self._pools = []
+        try:
+            started = []
+            for part in parts:
+                pool = ProcessPoolExecutor(max_workers=1)  # one process, so it keeps its partition between chunks
+                self._pools.append(pool)
+                started.append(pool.submit(_shard_init, idx.ws['_id'], part, mapping, type_ids, type_name,
+                                           key_field, client.simulate))
+            del parts
+            for f in started:
+                f.result()
+        except BaseException:
+            self.close()
+            raise
+        logger.debug('ingest - %s shards started', processes, extra={'shards': processes})
+
+    def _key_shard(self, v):
+        if self.key_field is None:
+            v = str(v).lower()  # names are strings and match without case, see _ingest_row
+        k = _hashable(v)
+        # the value itself, so str keys land where diff puts them. True and 1 share a shard,
+        # the match in the shard still tells them apart
+        if k is _MISSING:
+            k = None
+        elif isinstance(k, _BoolKey):
+            k = k.value
+        return hash(k) % len(self._put)
+
+    def _shard_of(self, c):
+        # the shard that holds a cached component, None if no row can reach it through a shard
+        v = c.get(self._key_attr)
+        return None if v is None else self._key_shard(v)
+
+    def _project(self, c):
+        return {k: c[k] for k in self._attrs if k in c}
+
+    def diff(self, rows, stats, created):
+        """
+        diffs a chunk of rows on the workers and queues their creates and updates
+        :param stats: the ingest stats, the counts of the workers are added
+        :param created: list of the batchIds of the queued creates
+        :return: the rows without a match key, for the parent to match
+        """
+        parts = [[] for _ in self._pools]
+        rest = []
+        n = len(parts)
+        lower = self.key_field is None
+        for row in rows:
+            for col in self._key_cols:
+                v = row.get(col)
+                if v is not None and v == v:  # not None or NaN
+                    if type(v) is str:  # the usual key, same shard as _key_shard without the calls
+                        parts[hash(v.lower() if lower else v) % n].append(row)
+                    else:
+                        parts[self._key_shard(v)].append(row)
+                    break
+            else:
+                rest.append(row)
+        futures = [pool.submit(_shard_diff, self._put[shard], self._remove[shard], parts[shard])
+                   for shard, pool in enumerate(self._pools)]
+        self._put = [[] for _ in self._pools]
+        self._remove = [[] for _ in self._pools]
+        client = self.client
+        for shard, f in enumerate(futures):
+            ops, counts = f.result()
+            for k, count in counts.items():
+                stats[k] += count
+            creates = {}  # worker id -> placeholder
+            for action, _id, comp in ops:
+                if action == 'create':
+                    if client.simulate:
+                        client._count('new_comps', {'_id': None, 'name': comp.get('name'), 'type': comp['typeId']})
+                        continue
+                    c = client._queue_create('components', comp)
+                    created.append(c['_id'])
+                    creates[_id] = c
+                    self._creates.append((c, shard, _id))
+                    continue
+                c = creates[_id] if isinstance(_id, int) else self.idx.get_component_by_id(_id)
+                if client.simulate:
+                    client._count('updated_comps', {'_id': c['_id'], 'name': c.get('name'), 'type': c.get('type')})
+                    continue
+                self.changed.append(client._queue_update('components', c, comp))
+        return rest
+
+    def update(self):
+        """
+        after a flush, queues the components ardoq created or changed for the workers that hold them
+        """
+        for c, shard, worker_id in self._creates:
+            self._remove[shard].append(worker_id)
+            self.changed.append(c)
+        for c in {id(c): c for c in self.changed}.values():
+            shard = self._shard_of(c)
+            if shard is not None:
+                self._put[shard].append(self._project(c))
+        self._creates = []
+        self.changed = []
+
+    def collect(self, seen, types):
+        """
+        adds the _ids of the cached components the rows of the workers matched to seen, and their typeIds to types
+        """
+        for f in [pool.submit(_shard_done) for pool in self._pools]:
+            shard_seen, shard_types = f.result()
+            seen.update(shard_seen)
+            types.update(shard_types)
+
+    def close(self):
+        for pool in self._pools:
+            pool.shutdown(cancel_futures=True)
+        self._pools = []
+
 
 class ArdoqSyncClient(ArdoqClient):
 
-    def __init__(self, *args, simulate=False, **kwargs):
+    def __init__(self, *args, simulate=False, batch_size=None, flush_threshold=None,
+                 cache_file=None, cache_max_age=None, stream=False, compact=False, patch=True, index_after=2,
+                 write_workers=None, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.version == 'v2' and (stream or cache_file):
+            # both read the v1 aggregated workspace, which has no v2 endpoint
+            raise ValueError('stream and cache_file need the v1 API')
         self.ws = {} # cache is a dictionary of workspaces. wsID is the key for each
+        self.ws_index = {}  # WorkspaceIndex for each cached workspace. wsID is the key for each
         self.init_report()
         self.simulate = simulate
+        self.batch_size = batch_size
+        self.flush_threshold = flush_threshold or batch_size
+        self.write_workers = write_workers
+        self._pending = []  # queued batch operations
+        self._pending_creates = {}  # batchId -> queued create operation
+        self._batch_ids = {}  # batchId -> _id for flushed creates
+        self._cascaded = set()  # _ids of the references ardoq deleted with their source or target component
+        self.store = WorkspaceStore(cache_file, max_age=cache_max_age) if cache_file else None
+        self.stream = stream
+        self.compact = compact
+        self.patch = patch
+        self.index_after = index_after
+        self._touched = None  # _ids marked in a sync run. None if there is no run. see start_sync
+        self._graph = None  # ReferenceGraph of the cached workspaces, once graph() is called
+        self._sync_ws = []  # workspaces of the sync run
+        self._lock = threading.RLock()  # for the workspace dicts, the report and the graph
+        self._load_locks = {}  # ws_id -> lock held while the workspace is loaded into the cache
+        self._key_locks = [threading.RLock() for _ in range(64)]  # see _entity_lock
+        self._queue_lock = threading.RLock()  # for the batch queue. taken before the lock of a WorkspaceIndex
 
     def get_workspace(self, *args, **kwargs):
-        res = super().get_workspace(*args, **kwargs, aggregated=True)
-        self.ws[res['_id']] = res
+        ws_id = kwargs.get('ws_id', args[0] if args else None)
+        with self._span('cache_load', workspace=ws_id):
+            if self.store is None and not self.stream:
+                res = super().get_workspace(*args, **kwargs, aggregated=True)
+                self._cache_workspace(res)
+                return res
+            if ws_id is None:
+                raise ArdoqClientException("need an id for get_workspace")
+            res, idx = self._load_workspace(self.transport, ws_id)
+            self.workspace = res
+            self._cache_workspace(res, idx)
+            return res
+
+    def _load_workspace(self, transport, ws_id):
+        # gets the aggregated workspace, from the persistent store if it hasn't changed since it was stored
+        # returns the workspace and its WorkspaceIndex if it was built while streaming, otherwise None
+        params = {'org': self.org} if self.org else {}
+        url = self.baseurl + 'workspace/' + ws_id
+        stamp = None
+        idx = None
+        if self.store is not None:
+            stamp = workspace_stamp(self._request('GET', url, transport=transport, params=params))
+            ws = self.store.get(self.hosturl, ws_id, stamp)
+            if ws is not None:
+                return ws, None
+        if self.stream:
+            ws = {'tags': []}
+            idx = WorkspaceIndex(ws, index_after=self.index_after)
+            add = {'components': idx.put_component, 'references': idx.put_reference, 'tags': ws['tags'].append}
+            meta = self._stream_aggregated(transport, url + '/aggregated', params,
+                                           lambda kind, item: add[kind](self._record(item)))
+            for k, v in meta.items():
+                if k not in add:
+                    ws[k] = v
+        elif self.version == 'v1':
+            ws = self._request('GET', url + '/aggregated', transport=transport, params=params)
+        else:  # v2, from preload. same endpoint as get_workspace
+            ws = self._request('GET', self.baseurl + 'workspaces/' + ws_id, transport=transport)
+        if self.store is not None:
+            self.store.put(self.hosturl, ws_id, stamp, ws)
+        return ws, idx
+
+    def _stream_aggregated(self, transport, url, params, on_item):
+        resp = self._request('GET', url, transport=transport, raw=True, params=params, stream=True)
+        try:
+            meta = {}
+            for kind, item in iter_aggregated(resp.iter_content(chunk_size=65536)):
+                if kind == 'workspace':
+                    meta = item
+                else:
+                    on_item(kind, item)
+            return meta
+        finally:
+            resp.close()
+
+    def stream_workspace(self, ws_id=None, on_item=None):
+        """
+        streams the aggregated workspace to a callback. the workspace is not added to the cache
+        :param ws_id: id of the workspace
+        :param on_item: called with (kind, item) for each item. kind is 'components', 'references', or 'tags'
+        :return: the workspace attributes, without the components, references, and tags
+        """
+        if ws_id is None or on_item is None:
+            raise ArdoqClientException('must provide a workspace id and a callback')
+        if self.version == 'v2':
+            raise ValueError('stream_workspace needs the v1 API')
+        params = {'org': self.org} if self.org else {}
+        return self._stream_aggregated(self.transport, self.baseurl + 'workspace/' + ws_id + '/aggregated',
+                                       params, on_item)
+
+    def _cache_workspace(self, ws, idx=None):
+        idx = idx or WorkspaceIndex(ws, compact=self.compact, index_after=self.index_after)
+        with self._lock:
+            if self._graph is not None:
+                old = self.ws_index.get(ws['_id'])
+                if old is not None:
+                    for r in old.ws['references']:
+                        self._graph.remove_reference(r['_id'])
+                self._add_to_graph(idx)
+            self.ws[ws['_id']] = ws
+            self.ws_index[ws['_id']] = idx
+
+    def _add_to_graph(self, idx):
+        with idx.lock:
+            idx.graph = self._graph
+            for r in idx.ws['references']:
+                self._graph.put_reference(r)
+
+    def graph(self, ws_ids=None):
+        """
+        returns the ReferenceGraph of the references in the cache. it is built on the first call and then kept
+        up to date as references are created, updated and deleted and as workspaces are loaded
+        :param ws_ids: optional, workspaces to load into the cache first
+        :return: ReferenceGraph
+        """
+        for ws_id in ws_ids or []:
+            self._cached_index(ws_id)
+        with self._lock:
+            if self._graph is None:
+                self._graph = ReferenceGraph()
+                for idx in self.ws_index.values():
+                    self._add_to_graph(idx)
+            return self._graph
+
+    def _query_indexes(self, ws_id):
+        if ws_id is None:
+            return list(self.ws_index.values())
+        if isinstance(ws_id, str):
+            ws_id = [ws_id]
+        return [self._cached_index(w) for w in ws_id]
+
+    def query(self, ws_id=None, where=None, limit=None, **conditions):
+        """
+        finds cached components that match all the conditions, without requests to ardoq
+        conditions are field=value or field__op=value, see QueryIndex for the ops
+        fields that are queried often get an index, so repeated queries don't scan the workspace
+        ardoq.query(ws_id, type='Application', name__prefix='Pay', cost__gte=1000)
+        :param ws_id: optional, a workspace id or a list of them. they are loaded into the cache if they aren't.
+            defaults to all the cached workspaces
+        :param where: optional, dict of more conditions, e.g. for field names that aren't python names
+        :param limit: optional, max number of components
+        :return: list of the cached components
+        """
+        if where:
+            conditions.update(where)
+        conds = parse_conditions(conditions)
+        res = []
+        with self._span('lookup', op='query'):
+            for idx in self._query_indexes(ws_id):
+                res.extend(idx.query(conds, limit=None if limit is None else limit - len(res)))
+                if limit is not None and len(res) >= limit:
+                    break
         return res
 
+    def create_index(self, field, ws_id=None):
+        """
+        indexes a component field for query now, instead of after index_after queries on it
+        :param ws_id: optional, a workspace id or a list of them. defaults to all the cached workspaces
+        """
+        for idx in self._query_indexes(ws_id):
+            idx.query_index.create_index(field)
+
+    def _record(self, entity):
+        # entity as it is kept in the cache
+        if self.compact and isinstance(entity, dict):
+            return CompactRecord(entity)
+        return entity
+
+    def preload(self, ws_ids=None, max_workers=8):
+        """
+        loads aggregated workspaces into the cache concurrently
+        the fetches run on a thread pool with its own connection pool. each workspace is cached and indexed
+        as soon as it arrives, while the other fetches are still running
+        workspaces already in the cache are not fetched again. with cache_file, unchanged workspaces come from the file
+        :param ws_ids: list of workspace ids to load
+        :param max_workers: number of concurrent fetches
+        :return: dict of ws_id -> {'fetch': seconds, 'index': seconds}. also added to report['preload_times']
+        """
+        if ws_ids is None:
+            raise ArdoqClientException('must provide a list of workspace ids')
+        todo = [w for w in dict.fromkeys(ws_ids) if w not in self.ws]
+        if not todo:
+            return {}
+        transport = self._new_transport(pool_size=max_workers)
+
+        def fetch(ws_id):
+            with self._load_lock(ws_id):  # a workspace loaded by another thread meanwhile is not loaded again
+                if ws_id in self.ws_index:
+                    return ws_id, None
+                start = time.perf_counter()
+                with self._span('cache_load', workspace=ws_id):
+                    ws, idx = self._load_workspace(transport, ws_id)
+                fetch_time = time.perf_counter() - start
+                start = time.perf_counter()
+                self._cache_workspace(ws, idx)
+            return ws_id, {'fetch': fetch_time, 'index': time.perf_counter() - start}
+
+        times = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(fetch, ws_id) for ws_id in todo]
+                for f in as_completed(futures):
+                    ws_id, t = f.result()
+                    if t is None:
+                        continue
+                    times[ws_id] = t
+                    logger.debug('preload - %s fetch: %.3fs index: %.3fs', ws_id, t['fetch'], t['index'],
+                                 extra={'workspace': ws_id, 'fetch': t['fetch'], 'index': t['index']})
+        finally:
+            transport.close()
+        with self._lock:
+            self.report['preload_times'].update(times)
+        return times
+
+    def _cached_index(self, ws_id):
+        # loads aggregated workspace to cache if its not present
+        idx = self.ws_index.get(ws_id)
+        if idx is not None:
+            return idx
+        with self._load_lock(ws_id):  # other threads that need the workspace wait for this load
+            if ws_id not in self.ws_index:
+                self.get_workspace(ws_id=ws_id)
+        return self.ws_index[ws_id]
+
+    def _load_lock(self, ws_id):
+        # lock held while a workspace is loaded into the cache, by _cached_index and preload
+        with self._lock:
+            return self._load_locks.setdefault(ws_id, threading.Lock())
+
+    def _count(self, key, entry=None):
+        # report counters and lists are updated under the client lock so threads don't lose counts
+        with self._lock:
+            self.report[key] += 1
+            if entry is not None:
+                self.report[key + '_l'].append(entry)
+
+    def _count_all(self, key, entries):
+        with self._lock:
+            self.report[key] += len(entries)
+            self.report[key + '_l'].extend(entries)
+
     def _is_different(self, old, new):
         for k, v in new.items():
             if k not in old.keys(): # might be a new attribute
@@ -41,15 +983,10 @@ class ArdoqSyncClient(ArdoqClient):
         return False
 
     def _find_component(self, comp=None, field_name=None, field_value=None):
-        for ind, c in enumerate(self.ws[comp['rootWorkspace']]['components']):
-            if field_name is not None:
-                # can't use .lower() when I can't tell if its a string....
-                if c[field_name] == field_value and c['typeId'] == comp['typeId']:
-                    return ind, c
-            else:
-                if c['name'].lower() == comp['name'].lower() and c['typeId'] == comp['typeId']:
-                    return ind, c
-        return 0, {}
+        with self._span('lookup', op='find_component'):
+            c = self.ws_index[comp['rootWorkspace']].find_component(name=comp.get('name'), type_id=comp['typeId'],
+                                                                    field_name=field_name, field_value=field_value)
+        return c or {}
 
     # find component in cache
     # find is based on component name in ws.
@@ -57,23 +994,24 @@ class ArdoqSyncClient(ArdoqClient):
     def find_component(self, ws_id=None, comp_name=None,
                        field_name=None, field_value=None, exact=False):
         if ws_id is not None:
-            if ws_id not in self.ws.keys():
-                self.ws[ws_id] = self.get_workspace(ws_id=ws_id)
+            self._cached_index(ws_id)
         if comp_name is not None and not field_name:
             comps = list()
-            for ind, c in enumerate(self.ws[ws_id]['components']):
+            with self.ws_index[ws_id].lock:  # a copy, so other threads can change the cache during the scan
+                components = list(self.ws[ws_id]['components'])
+            for ind, c in enumerate(components):
                 if field_name is not None:
                     if c[field_name] == field_value:
                         comps.append(c)
                         break
                 if exact:
-                    if comp_name == c['name']:
-                        logging.debug('find_component - cache_hit: %s', comp_name)
+                    if comp_name == c.get('name'):
+                        logger.debug('find_component - cache_hit: %s', comp_name)
                         comps.append(c)
                         break
                 else:
-                    if comp_name in c['name']:
-                        logging.debug('find_component - cache_hit: %s', comp_name)
+                    if comp_name in c.get('name', ''):
+                        logger.debug('find_component - cache_hit: %s', comp_name)
                         comps.append(c)
             return comps
         else: # why am I calling suprt instead of _find.... because that returns result of enumerate...
@@ -81,6 +1019,9 @@ class ArdoqSyncClient(ArdoqClient):
                                          field_value=field_value, exact=exact)
             return res
 
+    @_write_span
+    @_touches
+    @_entity_lock(_comp_lock_key)
     def create_component(self, comp=None, field_name=None, field_value=None):
         """
         will create a new component
@@ -93,143 +1034,738 @@ class ArdoqSyncClient(ArdoqClient):
         """
         # search in cache based on name
         # if its different, then update cache and ardoq
-        if comp['rootWorkspace'] not in self.ws.keys():
-            self.ws[comp['rootWorkspace']] = self.get_workspace(ws_id=comp['rootWorkspace'])
+        idx = self._cached_index(comp['rootWorkspace'])
+        if self._batching():
+            comp = self._resolve_ids(comp)
 
         # update the find to include field name, but that means create needs that field name
         # find only works on component name. comps with same name but different attributes will update rather
         # then creating a 2nd component.
-        ind, c = self._find_component(comp=comp, field_name=field_name, field_value=field_value)
+        c = self._find_component(comp=comp, field_name=field_name, field_value=field_value)
         if c:
             if self._is_different(c, comp):
-                for k, v in comp.items():
-                    c[k] = comp[k]
+                if self._batching():
+                    return self._queue_update('components', c, comp)
+                if self.patch and not self.simulate:
+                    return self._patch_cached('components', idx, c, comp)
+                with idx.lock:
+                    idx.unindex_component(c)
+                    for k, v in comp.items():
+                        c[k] = comp[k]
+                    idx.put_component(c)
                 if not self.simulate:
-                    res = super().update_component(comp_id=c['_id'], comp=c)
-                    self.ws[comp['rootWorkspace']]['components'][ind] = res
-                    self.report['updated_comps'] += 1
-                    self.report['updated_comps_l'].append({'_id': res['_id'], 'name': res['name'], 'type': res['type']})
+                    res = super().update_component(comp_id=c['_id'], comp=plain(c))
+                    idx.put_component(self._record(res))
+                    self._count('updated_comps', {'_id': res['_id'], 'name': res.get('name'), 'type': res['type']})
                     return(res)
                 else:
-                    self.report['updated_comps'] += 1
+                    self._count('updated_comps')
                     return (c)
             else:
-                logging.debug('create_component - cache_hit: %s', comp['name'])
-                self.report['cache_hit_comps'] += 1
-                self.report['cache_hit_comps_l'].append({'_id': c['_id'], 'name': c['name'], 'type': c['type']})
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('create_component - cache_hit: %s', c.get('name'),
+                                 extra={'workspace': comp['rootWorkspace'], '_id': c['_id'], 'cache': 'hit'})
+                self._count('cache_hit_comps', {'_id': c['_id'], 'name': c.get('name'),
+                                                'type': c.get('type', c['typeId'])})  # queued creates have no type
                 return c
+        if self._batching():
+            return self._queue_create('components', comp)
         if not self.simulate:
             res = super().create_component(comp=comp)
-            self.ws[comp['rootWorkspace']]['components'].append(res)
-            self.report['new_comps'] += 1
-            self.report['new_comps_l'].append({'_id': res['_id'], 'name': res['name'], 'type': res['type']})
+            idx.put_component(self._record(res))
+            self._count('new_comps', {'_id': res['_id'], 'name': res.get('name'), 'type': res['type']})
             return res
         else:
-            self.report['new_comps'] += 1
             comp['_id'] = secrets.token_hex(15) # make a fake _id if when simulating
-            self.report['new_comps_l'].append({'_id': comp['_id'], 'name': comp['name'], 'type': comp['typeId']})
+            self._count('new_comps', {'_id': comp['_id'], 'name': comp.get('name'), 'type': comp['typeId']})
             return(comp)
 
+    def _patch_cached(self, resource, idx, cached, item):
+        """
+        sends the attributes of item that are different from the cached entity as a v2 PATCH
+        and replaces the cached entity with the result
+        """
+        body = _to_v2(resource, _diff(cached, item))
+        body.pop('rootWorkspace', None)
+        res = {}
+        if body:  # nothing to send if only attributes that ardoq sets itself are different
+            if resource == 'components':
+                res = self.patch_component(comp_id=cached['_id'], payload=body)
+            else:
+                res = self.patch_reference(ref_id=cached['_id'], payload=body)
+        merged = dict(cached)
+        merged.update(item)
+        merged.update(_from_v2(res))
+        if resource == 'components':
+            idx.put_component(self._record(merged))
+            self._count('updated_comps', {'_id': merged['_id'], 'name': merged.get('name'),
+                                          'type': merged.get('type')})
+        else:
+            idx.put_reference(self._record(merged))
+            self._count('updated_refs')
+        return merged
+
+    @_write_span
+    @_touches
     def update_component(self, comp_id=None, comp=None):
-        if comp['rootWorkspace'] not in self.ws.keys():
-            self.ws[comp['rootWorkspace']] = self.get_workspace(ws_id=comp['rootWorkspace'])
+        idx = self._cached_index(comp['rootWorkspace'])
+        if self._batching():
+            cached = idx.get_component_by_id(self._resolve_id(comp_id))
+            if cached is None:
+                cached = idx.put_component(dict(comp, _id=self._resolve_id(comp_id)))
+            return self._queue_update('components', cached, comp)
         if not self.simulate:
             res = super().update_component(comp_id=comp_id, comp=comp)
-            ind = next(index for index, c in
-                       enumerate(self.ws[comp['rootWorkspace']]['components'])
-                       if c['_id'] == comp['_id'])
-            self.ws[comp['rootWorkspace']]['components'][ind] = res
-            self.report['updated_comps'] += 1
-            self.report['updated_comps_l'].append({'_id': res['_id'], 'name': res['name'], 'type': res['type']})
+            idx.put_component(self._record(res))
+            self._count('updated_comps', {'_id': res['_id'], 'name': res.get('name'), 'type': res['type']})
             return res
         else:
-            self.report['updated_comps'] += 1
+            self._count('updated_comps')
             return comp
 
+    def _uncache_component(self, comp_id):
+        for idx in list(self.ws_index.values()):
+            c = idx.remove_component(comp_id)
+            if c is not None:
+                return c
+        return None
+
+    def _uncache_attached(self, comp_ids):
+        # ardoq deletes the references of deleted components. drops them from all the cached workspaces
+        # :return: the references that were dropped
+        res = []
+        for idx in list(self.ws_index.values()):
+            with idx.lock:
+                for r in idx.references_of(comp_ids):
+                    idx.remove_reference(r['_id'])
+                    res.append(r)
+        self._cascaded.update(r['_id'] for r in res)
+        return res
+
+    @_write_span
     def del_component(self, comp_id=None):
+        if self._batching():
+            return self._queue_delete('components', comp_id)
         if not self.simulate:
             res = super().del_component(comp_id=comp_id)
-            self.report['del_comps'] += 1
-            self.report['del_comps_l'].append({'_id': res['_id'], 'name': res['name'], 'type': res['type']})
+            c = self._uncache_component(comp_id) or res
+            self._uncache_attached([comp_id])
+            self._count('del_comps', {'_id': comp_id, 'name': c.get('name'), 'type': c.get('type')})
             return res
         else:
-            self.report['del_comps'] += 1
+            self._count('del_comps')
             return comp_id
 
     def _find_reference(self, ref=None):
-        if not self.ws[ref['rootWorkspace']]['references']:
-            return 0, {}
-        for ind, r in enumerate(self.ws[ref['rootWorkspace']]['references']):
-            if r['type'] == ref['type'] and r['target'] == ref['target'] and r['source'] == ref['source']:
-                return ind, r
-        return 0, {}
+        with self._span('lookup', op='find_reference'):
+            r = self.ws_index[ref['rootWorkspace']].find_reference(source=ref['source'], target=ref['target'],
+                                                                   ref_type=ref['type'])
+        return r or {}
 
+    @_write_span
+    @_touches
+    @_entity_lock(_ref_lock_key)
     def create_reference(self, ref=None):
         # search in cache
         # if its different or new then update cache and ardoq
-        if ref['rootWorkspace'] not in self.ws.keys():
-            self.ws[ref['rootWorkspace']] = self.get_workspace(ws_id=ref['rootWorkspace'])
+        idx = self._cached_index(ref['rootWorkspace'])
+        if self._batching():
+            ref = self._resolve_ids(ref)
 
-        ind, r = self._find_reference(ref=ref)
+        r = self._find_reference(ref=ref)
         if r:
             if self._is_different(r, ref):
+                if self._batching():
+                    return self._queue_update('references', r, ref)
+                if self.patch and not self.simulate:
+                    return self._patch_cached('references', idx, r, ref)
                 for k, v in ref.items():
                     r[k] = ref[k]
                 if not self.simulate:
-                    res = super().update_reference(ref_id=r['_id'], ref=r)
-                    self.ws[ref['rootWorkspace']]['references'][ind] = res
-                    self.report['updated_refs'] += 1
+                    res = super().update_reference(ref_id=r['_id'], ref=plain(r))
+                    idx.put_reference(self._record(res))
+                    self._count('updated_refs')
                     return(res)
                 else:
-                    self.report['updated_refs'] += 1
+                    self._count('updated_refs')
                     return ref
             else:
-                if 'displayText' in ref.keys():
-                    logging.debug(f"create_ref - cache_hit: {ref['displayText']}")
-                else:
-                    logging.debug(f"create_ref - cache_hit: {ref['type']}")
-                self.report['cache_hit_refs'] += 1
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('create_ref - cache_hit: %s', ref.get('displayText', ref['type']),
+                                 extra={'workspace': ref['rootWorkspace'], '_id': r['_id'], 'cache': 'hit'})
+                self._count('cache_hit_refs')
                 return r
+        if self._batching():
+            return self._queue_create('references', ref)
         if not self.simulate:
             res = super().create_reference(ref=ref)
-            if not self.ws[ref['rootWorkspace']]['references']:
-                self.ws[ref['rootWorkspace']]['references'] = []
-            self.ws[ref['rootWorkspace']]['references'].append(res)
-            self.report['new_refs'] += 1
+            idx.put_reference(self._record(res))
+            self._count('new_refs')
             return res
         else:
-            self.report['new_refs'] += 1
+            self._count('new_refs')
             ref['_id'] = secrets.token_hex(15)  # make a fake _id if when simulating
             return ref
 
+    @_write_span
+    @_touches
     def update_reference(self, ref_id=None, ref=None):
-        if ref['rootWorkspace'] not in self.ws.keys():
-            self.ws[ref['rootWorkspace']] = self.get_workspace(ws_id=ref['rootWorkspace'])
+        idx = self._cached_index(ref['rootWorkspace'])
+        if self._batching():
+            cached = idx.get_reference_by_id(self._resolve_id(ref_id))
+            if cached is None:
+                cached = idx.put_reference(dict(ref, _id=self._resolve_id(ref_id)))
+            return self._queue_update('references', cached, ref)
         if not self.simulate:
             res = super().update_reference(ref_id=ref_id, ref=ref)
-            ind = next(index for index, r in
-                       enumerate(self.ws[ref['rootWorkspace']]['references'])
-                       if r['_id'] == ref['_id'])
-            self.ws[ref['rootWorkspace']]['references'][ind] = res
-            self.report['updated_refs'] += 1
+            idx.put_reference(self._record(res))
+            self._count('updated_refs')
             return res
         else:
-            self.report['updated_refs'] += 1
+            self._count('updated_refs')
             return ref
 
+    def _uncache_reference(self, ref_id):
+        for idx in list(self.ws_index.values()):
+            r = idx.remove_reference(ref_id)
+            if r is not None:
+                return r
+        return None
+
+    @_write_span
     def del_reference(self, ref_id=None):
+        if ref_id in self._cascaded:  # already deleted by ardoq with its component
+            return ref_id
+        if self._batching():
+            return self._queue_delete('references', ref_id)
         if not self.simulate:
             res = super().del_reference(ref_id=ref_id)
-            self.report['del_refs'] += 1
+            self._uncache_reference(ref_id)
+            self._count('del_refs')
             return res
         else:
-            self.report['del_refs'] += 1
+            self._count('del_refs')
             return ref_id
 
+    '''
+    functions for batch mode
+    '''
+
+    def _batching(self):
+        return (self.batch_size or self.write_workers) and not self.simulate
+
+    def _resolve_id(self, _id):
+        return self._batch_ids.get(_id, _id)
+
+    def _resolve_ids(self, item):
+        # swap batchIds of flushed creates for their _id so the cache lookups match
+        if not self._batch_ids:
+            return item
+        item = dict(item)
+        for k in ('parent', 'source', 'target'):
+            if item.get(k):
+                item[k] = self._resolve_id(item[k])
+        return item
+
+    def _queue(self, op):
+        with self._queue_lock:
+            self._pending.append(op)
+            if self.flush_threshold and len(self._pending) >= self.flush_threshold:
+                self.flush()
+
+    def _queue_create(self, resource, item):
+        with self._queue_lock:
+            idx = self._cached_index(item['rootWorkspace'])
+            cached = dict(self._resolve_ids(item))
+            cached['_id'] = 'batch-' + secrets.token_hex(12)
+            if resource == 'components':
+                idx.put_component(cached)
+            else:
+                idx.put_reference(cached)
+            # registered once it is in the cache, so a create that fails to index is never sent
+            op = {'resource': resource, 'action': 'create', 'id': cached['_id'], 'cached': cached, 'idx': idx}
+            self._pending_creates[cached['_id']] = op
+            self._queue(op)
+            return cached
+
+    def _queue_update(self, resource, cached, item):
+        with self._queue_lock:
+            idx = self._cached_index(cached['rootWorkspace'])
+            body = _diff(cached, item)
+            with idx.lock:
+                if resource == 'components':
+                    idx.unindex_component(cached)
+                    cached.update(item)
+                    idx.put_component(cached)
+                else:
+                    idx.unindex_reference(cached)
+                    cached.update(item)
+                    idx.put_reference(cached)
+            if cached['_id'] in self._pending_creates:  # the create isn't sent yet. it picks up the new values
+                return cached
+            op = {'resource': resource, 'action': 'update', 'id': cached['_id'], 'cached': cached, 'idx': idx,
+                  'body': body}
+            self._queue(op)
+            return cached
+
+    def _queue_delete(self, resource, _id):
+        with self._queue_lock:
+            _id = self._resolve_id(_id)
+            if resource == 'components':
+                cached = self._uncache_component(_id)
+            else:
+                cached = self._uncache_reference(_id)
+            create = self._pending_creates.pop(_id, None)
+            if create is not None:  # never sent, so nothing to delete in ardoq
+                self._pending = [o for o in self._pending if o is not create]
+                return _id
+            self._queue({'resource': resource, 'action': 'delete', 'id': _id, 'cached': cached or {}})
+            return _id
+
+    def _batch_body(self, op):
+        if op['action'] == 'delete':
+            return None
+        if op['action'] == 'create':
+            body = _to_v2(op['resource'], op['cached'])
+        else:
+            body = _to_v2(op['resource'], op['body'])
+            body.pop('rootWorkspace', None)
+        for k in ('parent', 'source', 'target'):
+            if body.get(k):
+                body[k] = self._resolve_id(body[k])
+        return body
+
+    def _apply_batch_result(self, chunk, res):
+        results = {}
+        for resource in ('components', 'references'):
+            for action, key in (('create', 'created'), ('update', 'updated')):
+                results[(resource, action)] = list((res.get(resource) or {}).get(key) or [])
+        by_batch_id = {item['batchId']: item for items in results.values() for item in items if 'batchId' in item}
+        for op in chunk:
+            e = {}
+            if op['action'] == 'create':
+                item = by_batch_id.get(op['id'])
+                if item is None and results[(op['resource'], 'create')]:
+                    item = results[(op['resource'], 'create')].pop(0)
+                e = _batch_entity(item or {})
+            elif op['action'] == 'update':
+                items = results[(op['resource'], 'update')]
+                e = _batch_entity(items.pop(0)) if items else {}
+            self._apply_op_result(op, e)
+
+    def _apply_op_result(self, op, e):
+        # puts the entity ardoq returned for a queued operation into the cache
+        resource, action, cached, idx = op['resource'], op['action'], op['cached'], op.get('idx')
+        if action == 'create':
+            del self._pending_creates[op['id']]
+            with idx.lock:
+                if resource == 'components':
+                    idx.remove_component(op['id'])
+                    cached.update(e)
+                    idx.put_component(cached)
+                    if idx.graph is not None:  # edges added with the batchId move to the _id
+                        idx.graph.rename_component(op['id'], cached['_id'])
+                else:
+                    idx.remove_reference(op['id'])
+                    cached.update(e)
+                    idx.put_reference(cached)
+            self._batch_ids[op['id']] = cached['_id']
+        elif action == 'update':
+            with idx.lock:
+                if resource == 'components':
+                    if idx.get_component_by_id(op['id']) is None:  # deleted after the update was queued
+                        cached.update(e)
+                    else:
+                        idx.unindex_component(cached)
+                        cached.update(e)
+                        idx.put_component(cached)
+                elif idx.get_reference_by_id(op['id']) is None:
+                    cached.update(e)
+                else:
+                    idx.unindex_reference(cached)
+                    cached.update(e)
+                    idx.put_reference(cached)
+        elif resource == 'components':  # a delete. ardoq deleted the references of the component too
+            self._uncache_attached([op['id']])
+        self._report_batch_op(op)
+
+    def _report_batch_op(self, op):
+        c = op['cached']
+        if op['resource'] == 'components':
+            entry = {'_id': c.get('_id', op['id']), 'name': c.get('name'), 'type': c.get('type', c.get('typeId'))}
+            key = {'create': 'new_comps', 'update': 'updated_comps', 'delete': 'del_comps'}[op['action']]
+            self._count(key, entry)
+        else:
+            key = {'create': 'new_refs', 'update': 'updated_refs', 'delete': 'del_refs'}[op['action']]
+            self._count(key)
+
+    @_write_span
+    def flush(self, batch_size=None):
+        """
+        sends the queued operations to the v2 batch endpoint, batch_size operations per request
+        components are sent before references so that references can use the batchId of components in the same batch.
+        component deletes are sent last, in requests of their own, as ardoq deletes the references of a component.
+        batchIds from earlier requests are replaced with the _id ardoq gave the component
+        the cache is updated with the entities returned from ardoq
+        with write_workers the operations are sent as single requests instead, see _flush_concurrently
+        :param batch_size: optional, operations per request. defaults to the batch_size of the client
+        :return: list of batch results, or the WritePipeline result with write_workers
+        """
+        with self._queue_lock:
+            if self.write_workers:
+                return self._flush_concurrently(self.write_workers)
+            batch_size = batch_size or self.batch_size
+            ops = sorted(self._pending, key=lambda o: _BATCH_ORDER[(o['resource'], o['action'])])
+            results = []
+            while ops:
+                # ardoq runs the component operations of a batch before its reference operations,
+                # so component deletes go in requests of their own
+                n = next((i for i, op in enumerate(ops[:batch_size])
+                          if (op['resource'], op['action']) == ('components', 'delete')), batch_size) or batch_size
+                chunk, ops = ops[:n], ops[n:]
+                batch = Batch(respondWithEntities=True)
+                for op in chunk:
+                    body = self._batch_body(op)
+                    if op['action'] == 'create':
+                        getattr(batch, 'create_' + op['resource'][:-1])(body, batchId=op['id'])
+                    elif op['action'] == 'update':
+                        getattr(batch, 'update_' + op['resource'][:-1])(op['id'], body)
+                    else:
+                        getattr(batch, 'delete_' + op['resource'][:-1])(op['id'])
+                try:
+                    res = self.batch(batch.body)
+                except Exception:
+                    self._pending = chunk + ops  # keep what hasn't been sent so the caller can retry
+                    raise
+                self._apply_batch_result(chunk, res)
+                self._pending = ops
+                results.append(res)
+            logger.debug('flush - sent %s batches', len(results), extra={'batches': len(results)})
+            return results
+
+    def _op_deps(self, ops):
+        """
+        :return: for each queued operation, the positions of the queued operations it has to wait for
+        """
+        creates = {op['id']: i for i, op in enumerate(ops) if op['action'] == 'create'}
+        linked = {}  # component _id -> operations on its references and child components
+        for i, op in enumerate(ops):
+            for k in ('parent', 'source', 'target'):
+                if op['cached'].get(k):
+                    linked.setdefault(op['cached'][k], []).append(i)
+        last = {}  # (resource, _id) -> position of the last operation on that entity
+        res = []
+        for i, op in enumerate(ops):
+            deps = set()
+            prev = last.get((op['resource'], op['id']))
+            if prev is not None:  # operations on the same entity run in the order they were queued
+                deps.add(prev)
+            last[(op['resource'], op['id'])] = i
+            item = op['cached'] if op['action'] == 'create' else op.get('body') or {}
+            for k in ('parent', 'source', 'target'):
+                if item.get(k) in creates:
+                    deps.add(creates[item[k]])
+            if op['action'] == 'delete' and op['resource'] == 'components':
+                deps.update(linked.get(op['id'], ()))  # ardoq deletes them with the component
+            deps.discard(i)
+            res.append(deps)
+        return res
+
+    def _send_op(self, transport, op):
+        # sends one queued operation as a v2 request. runs on a pipeline worker
+        url = self.hosturl + '/api/v2/' + op['resource']
+        if op['action'] == 'create':
+            return self._request('POST', url, transport=transport, json=self._batch_body(op), params={'org': self.org})
+        url += '/' + op['id']
+        if op['action'] == 'update':
+            return self._request('PATCH', url, transport=transport, json=self._batch_body(op),
+                                 params={'org': self.org, 'ifVersionMatch': 'latest'})
+        try:
+            return self._request('DELETE', url, transport=transport, params={'org': self.org})
+        except NotFoundError:  # already gone, e.g. with the component it belonged to
+            return {}
+
+    def _flush_concurrently(self, max_workers):
+        """
+        sends the queued operations as single v2 requests on a WritePipeline, max_workers at a time
+        the cache and report are updated in this thread as each request is done. operations that failed, and the
+        operations that depend on them, stay queued so the caller can retry. the first error is raised at the end
+        """
+        ops = self._pending
+        if not ops:
+            return {'results': {}, 'errors': {}, 'skipped': []}
+        transport = self._new_transport(pool_size=max_workers)
+        pipeline = WritePipeline(max_workers=max_workers)
+        for i, deps in enumerate(self._op_deps(ops)):
+            pipeline.add(i, functools.partial(self._send_op, transport, ops[i]), deps=deps)
+        try:
+            res = pipeline.run(on_done=lambda i, r: self._apply_op_result(ops[i], _from_v2(r or {})))
+        finally:
+            transport.close()
+        self._pending = [op for i, op in enumerate(ops) if i not in res['results']]
+        logger.debug('flush - sent %s requests', len(res['results']), extra={'requests': len(res['results'])})
+        if res['errors']:
+            raise next(iter(res['errors'].values()))
+        return res
+
+    '''
+    functions for bulk ingest
+    '''
+
+    def _ingest_comp(self, idx, comp, key_field, stats, seen, created, simulated):
+        # diffs the component of one row against the cache and queues its create or update
+        # :return: the cached component that was created or changed, None if nothing was queued
+        key, c = _match_row(idx, comp, key_field)
+        if c is None:
+            if self.simulate:
+                if key in simulated:
+                    stats['updated'] += 1
+                    return None
+                simulated.add(key)
+                self._count('new_comps', {'_id': None, 'name': comp.get('name'), 'type': comp['typeId']})
+                stats['created'] += 1
+                return None
+            c = self._queue_create('components', comp)
+            created.append(c['_id'])
+            stats['created'] += 1
+            return c
+        if c['_id'] in self._pending_creates:  # a row earlier in the chunk created it
+            created.append(c['_id'])
+        else:
+            seen.add(c['_id'])
+        if not _diff(c, comp):
+            stats['unchanged'] += 1
+            return None
+        stats['updated'] += 1
+        if self.simulate:
+            self._count('updated_comps', {'_id': c['_id'], 'name': c.get('name'), 'type': c.get('type')})
+            return None
+        return self._queue_update('components', c, comp)
+
+    @_write_span
+    def ingest_components(self, ws_id=None, rows=None, mapping=None, type_name=None, key_field=None,
+                          delete_missing=False, chunk_size=5000, batch_size=None, progress=None, processes=None):
+        """
+        creates and updates the components of a workspace from tabular rows
+        rows are read chunk_size at a time. each chunk is diffed against the cache and the creates and updates
+        are sent through the batch endpoint, batch_size operations per request. rows that match a cached
+        component without differences send nothing
+        :param ws_id: id of the workspace
+        :param rows: iterable of dicts (e.g. csv.DictReader), pandas DataFrame, pyarrow Table or ParquetFile
+        :param mapping: dict of column -> component attribute or field name. map a column to 'type' for component
+            type names, which are resolved through the workspace model, or to 'typeId' for type ids
+        :param type_name: component type name for rows without a type column
+        :param key_field: field used to match rows to cached components. defaults to name and type
+        :param delete_missing: delete the cached components of the ingested types that no row matched
+        :param chunk_size: rows diffed and sent per step
+        :param batch_size: operations per batch request. defaults to the batch_size of the client, or 1000
+        :param progress: optional, called with the stats dict after each chunk
+        :param processes: optional, number of worker processes that diff the rows (see IngestShards).
+            for very large workspaces where the diffing is the bottleneck
+        :return: dict with rows, created, updated, unchanged, deleted, skipped, seconds and rows_per_second
+            skipped rows had a type that isn't in the model, or no name (and no key_field value) to match on
+        """
+        if ws_id is None or rows is None or not mapping:
+            raise ArdoqClientException('must provide a workspace id, rows and a column mapping')
+        batch_size = batch_size or self.batch_size or 1000
+        idx = self._cached_index(ws_id)
+        wm = self.get_workspace_model(ws_id=ws_id)
+        stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'skipped': 0,
+                 'seconds': 0.0, 'rows_per_second': 0.0}
+        seen = set()  # _ids of the cached components that rows matched
+        types = set()  # typeIds of the rows
+        simulated = set()  # keys of the rows counted as creates when simulating, which aren't cached
+        start = time.perf_counter()
+        shards = None
+        if processes and processes > 1:
+            shards = IngestShards(self, idx, wm, mapping, type_name, key_field, processes)
+
+        try:
+            for chunk in _row_chunks(rows, chunk_size):
+                created = []  # batchIds of the queued creates. they get their _id when the chunk is flushed
+                rest = chunk if shards is None else shards.diff(chunk, stats, created)  # rows the shards don't match
+                for row in rest:
+                    comp = _ingest_row(row, mapping, ws_id, wm.component_type_id, type_name, key_field)
+                    if comp is None:
+                        stats['skipped'] += 1
+                        continue
+                    types.add(comp['typeId'])
+                    c = self._ingest_comp(idx, comp, key_field, stats, seen, created, simulated)
+                    if c is not None and shards is not None:
+                        shards.changed.append(c)
+                if not self.simulate:
+                    self.flush(batch_size=batch_size)
+                    seen.update(self._resolve_id(_id) for _id in created)
+                    if shards is not None:
+                        shards.update()
+                if self._touched is not None:
+                    self._touched.update(seen)
+                stats['rows'] += len(chunk)
+                stats['seconds'] = time.perf_counter() - start
+                stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+                logger.info('ingest %s - %s rows, %s created, %s updated, %.0f rows/s', ws_id, stats['rows'],
+                            stats['created'], stats['updated'], stats['rows_per_second'],
+                            extra=dict(stats, workspace=ws_id))
+                if progress is not None:
+                    progress(dict(stats))
+            if shards is not None:
+                shards.collect(seen, types)
+                if self._touched is not None:
+                    self._touched.update(seen)
+        finally:
+            if shards is not None:
+                shards.close()
+
+        if delete_missing:
+            stale = [c['_id'] for c in idx.ws['components'] if c['typeId'] in types and c['_id'] not in seen]
+            for _id in stale:
+                if self.simulate:
+                    c = idx.get_component_by_id(_id)
+                    self._count('del_comps', {'_id': _id, 'name': c.get('name'), 'type': c.get('type')})
+                else:
+                    self._queue_delete('components', _id)
+            if not self.simulate:
+                self.flush(batch_size=batch_size)
+            stats['deleted'] = len(stale)
+            stats['seconds'] = time.perf_counter() - start
+        return stats
+
+    '''
+    functions for mark-and-sweep
+    '''
+
+    def start_sync(self, ws_ids=None):
+        """
+        starts a sync run. the components and references that create_component, update_component,
+        create_reference, update_reference and ingest_components return are marked until sweep is called
+        :param ws_ids: optional, workspaces the run mirrors. they are loaded into the cache.
+            defaults to the workspaces that are cached when sweep is called
+        """
+        self._touched = set()
+        self._sync_ws = list(ws_ids or [])
+        for ws_id in self._sync_ws:
+            self._cached_index(ws_id)
+
+    @staticmethod
+    def _untouched(entities, type_key, touched, all_types):
+        # entities that weren't touched, of the types that had at least one touched entity
+        types = None if all_types else {e[type_key] for e in entities if e['_id'] in touched}
+        return [e for e in entities if e['_id'] not in touched and (types is None or e.get(type_key) in types)]
+
+    @_write_span
+    def sweep(self, ws_ids=None, all_types=False, components=True, references=True, batch_size=None,
+              max_workers=4):
+        """
+        ends the sync run and deletes the cached components and references that it didn't mark
+        only types with at least one marked entity in a workspace are swept, so a run that only syncs some types
+        doesn't delete the others. references are deleted before components. ardoq deletes the references of
+        deleted components itself, in any workspace, so those are only removed from the cache and listed as 'cascaded'
+        with simulate=True nothing is deleted and the result lists what would be
+        :param ws_ids: optional, workspaces to sweep. defaults to those given to start_sync, or all cached workspaces
+        :param all_types: sweep every type in the workspaces, including types the run didn't touch
+        :param components: sweep components
+        :param references: sweep references
+        :param batch_size: deletes per batch request. defaults to the batch_size of the client, or 1000
+        :param max_workers: number of batch requests sent at the same time
+        :return: dict with lists of the deleted 'components', 'references' and 'cascaded' references
+        """
+        if self._touched is None:
+            raise ArdoqClientException('no sync run. call start_sync first')
+        if self._batching():
+            self.flush()  # queued creates get their _id
+        touched = {self._resolve_id(_id) for _id in self._touched}
+        ws_ids = ws_ids or self._sync_ws or list(self.ws_index)
+        stale_comps = []
+        stale_refs = []
+        cascaded = []
+        for ws_id in ws_ids:
+            idx = self._cached_index(ws_id)
+            comps = self._untouched(idx.ws['components'], 'typeId', touched, all_types) if components else []
+            refs = self._untouched(idx.ws['references'], 'type', touched, all_types) if references else []
+            stale_comps.extend(comps)
+            stale_refs.extend(refs)
+            logger.info('sweep %s - %s components, %s references', ws_id, len(comps), len(refs),
+                        extra={'workspace': ws_id, 'components': len(comps), 'references': len(refs)})
+        if stale_comps:
+            # references of deleted components go with them, in any workspace. no need to send their deletes
+            stale_ids = [c['_id'] for c in stale_comps]
+            for idx in list(self.ws_index.values()):
+                cascaded.extend(idx.references_of(stale_ids))
+            cascaded_ids = {r['_id'] for r in cascaded}
+            stale_refs = [r for r in stale_refs if r['_id'] not in cascaded_ids]
+        res = {'components': [self._sweep_entry('components', c) for c in stale_comps],
+               'references': [self._sweep_entry('references', r) for r in stale_refs],
+               'cascaded': [self._sweep_entry('references', r) for r in cascaded]}
+        self._touched = None
+        self._sync_ws = []
+        if self.simulate:
+            self._count_all('del_comps', res['components'])
+            self._count_all('del_refs', res['references'] + res['cascaded'])
+            return res
+        batch_size = batch_size or self.batch_size or 1000
+        self._delete_concurrently('references', res['references'], batch_size, max_workers)
+        deleted = {c['_id'] for c in self._delete_concurrently('components', res['components'], batch_size,
+                                                                max_workers)}
+        for r in self._uncache_attached(deleted):
+            self._count('del_refs', self._sweep_entry('references', r))
+        return res
+
+    @staticmethod
+    def _sweep_entry(resource, e):
+        if resource == 'components':
+            return {'_id': e['_id'], 'name': e.get('name'), 'type': e.get('type', e.get('typeId')),
+                    'rootWorkspace': e.get('rootWorkspace')}
+        return {'_id': e['_id'], 'source': e.get('source'), 'target': e.get('target'), 'type': e.get('type'),
+                'rootWorkspace': e.get('rootWorkspace')}
+
+    def _delete_concurrently(self, resource, entries, batch_size, max_workers):
+        """
+        deletes entities in batch requests of batch_size deletes, max_workers requests at the same time
+        the cache and report are updated for each batch that succeeds. the first error is raised at the end
+        :return: the deleted entries
+        """
+        if not entries:
+            return []
+        chunks = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+        url = self.hosturl + '/api/v2/batch'
+        delete = 'delete_' + resource[:-1]
+        transport = self._new_transport(pool_size=max_workers)
+
+        def send(chunk):
+            batch = Batch()
+            for e in chunk:
+                getattr(batch, delete)(e['_id'])
+            self._request('POST', url, transport=transport, json=batch.body)
+            return chunk
+
+        done = []
+        error = None
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for f in as_completed([pool.submit(send, chunk) for chunk in chunks]):
+                    try:
+                        chunk = f.result()
+                    except Exception as e:
+                        error = error or e
+                        continue
+                    for e in chunk:
+                        if resource == 'components':
+                            self._uncache_component(e['_id'])
+                        else:
+                            self._uncache_reference(e['_id'])
+                    key = 'del_comps' if resource == 'components' else 'del_refs'
+                    self._count_all(key, chunk)
+                    done.extend(chunk)
+        finally:
+            transport.close()
+        if error is not None:
+            raise error
+        return done
+
     def get_report(self):
-        logging.info('Ardoq Sync')
+        logger.info('Ardoq Sync')
         for k, v in self.report.items():
-            logging.info(f'{k} : {v}')
+            logger.info('%s : %s', k, v)
         return self.report
 
     def init_report(self):
@@ -237,9 +1773,10 @@ class ArdoqSyncClient(ArdoqClient):
         self.report = {'new_comps': 0, 'new_comps_l': [],
                        'updated_comps': 0, 'updated_comps_l': [],
                        'del_comps': 0, 'del_comps_l': [],
-                       'new_refs': 0, 'updated_refs': 0, 'del_refs': 0,
+                       'new_refs': 0, 'updated_refs': 0, 'del_refs': 0, 'del_refs_l': [],
                        'cache_hit_comps': 0, 'cache_hit_comps_l': [],
                        'cache_hit_refs': 0,
                        'cache_miss_comps': [],  # list of components
                        'cache_miss_refs': [],  # list of refs
+                       'preload_times': {},  # ws_id -> fetch and index time in seconds
                        'status': 'success', 'description': None}
@@ -0,0 +1,202 @@
+import gzip
+import logging
+from http import cookiejar
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+try:
+    import httpx
+except ImportError:  # httpx is optional. only needed for http2
+    httpx = None
+
+try:
+    import brotli
+except ImportError:  # brotli is optional. only needed for compress_requests='br'
+    brotli = None
+
+from ardoqpy import RAW_JSON_TYPES, get_codec
+
+logger = logging.getLogger(__name__)
+
+'''
+Transport is the connection layer of ArdoqClient, ArdoqSyncClient and API
+
+It keeps a pool of open connections, so requests reuse connections instead of doing a new TCP and TLS handshake,
+including the requests for each page of a paginated list. A Transport is thread safe and can be shared
+by several clients and threads, e.g. the preload threads or an application's worker threads.
+Give it a pool_size of at least the number of threads that use it, so they don't wait for a connection
+
+Responses are compressed by ardoq when the client accepts it (gzip and deflate, and br if brotli is installed)
+Request bodies can be compressed with compress_requests. only use it if your ardoq accepts compressed bodies
+
+Bodies are encoded and responses decoded with the codec of the transport (see JsonCodec).
+json bodies that already are bytes are sent as they are
+
+HTTP/2 needs httpx with h2 - pip install httpx[http2]
+
+transport = Transport(pool_size=32, timeout=(5, 120))
+ardoq = ArdoqSyncClient(hosturl='https://myorg.ardoq.com', token='....', transport=transport)
+api = API(ardoq_api_host='https://myorg.ardoq.com', ardoq_api_token='....', transport=transport)
+'''
+
+
+class BlockAll(cookiejar.CookiePolicy):
+    return_ok = set_ok = domain_return_ok = path_return_ok = lambda self, *args, **kwargs: False
+    netscape = True
+    rfc2965 = hide_cookie2 = False
+
+
+class _HttpxRequest(object):
+    __slots__ = ('body',)
+
+    def __init__(self, body):
+        self.body = body
+
+
+class _HttpxResponse(object):
+    # the parts of requests.Response that the clients use, for an httpx response
+
+    def __init__(self, resp):
+        self._resp = resp
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self.reason = resp.reason_phrase
+        self.request = _HttpxRequest(resp.request.content)
+
+    @property
+    def content(self):
+        return self._resp.read()  # reads a streamed response. returns the body if it has been read
+
+    @property
+    def text(self):
+        self._resp.read()
+        return self._resp.text
+
+    def json(self, **kwargs):
+        self._resp.read()
+        return self._resp.json(**kwargs)
+
+    def iter_content(self, chunk_size=None):
+        return self._resp.iter_bytes(chunk_size)
+
+    def close(self):
+        self._resp.close()
+
+
+class Transport(object):
+
+    def __init__(self, pool_size=10, keep_alive=True, timeout=None, http2=False,
+                 compress_requests=None, compress_min_size=1024, accept_encoding=None, codec=None):
+        '''
+        :param pool_size: max number of open connections per host. defaults to 10
+        :param keep_alive: keep connections open between requests. False closes the connection after each request
+        :param timeout: seconds, or a (connect, read) tuple of seconds. None waits as long as it takes
+        :param http2: use HTTP/2. needs httpx with h2
+        :param compress_requests: optional, 'gzip' or 'br' to compress request bodies. ardoq must accept the encoding
+        :param compress_min_size: smallest body in bytes that is compressed
+        :param accept_encoding: Accept-Encoding header. defaults to the encodings that can be decoded.
+            'identity' asks for uncompressed responses
+        :param codec: json codec for bodies, a name ('orjson', 'msgspec', 'ujson', 'json') or a JsonCodec.
+            defaults to the fastest one that is installed
+        '''
+        if http2 and httpx is None:
+            raise ImportError('http2 needs httpx with h2. pip install httpx[http2]')
+        if compress_requests not in (None, 'gzip', 'br'):
+            raise ValueError("compress_requests must be None, 'gzip' or 'br'")
+        if compress_requests == 'br' and brotli is None:
+            raise ImportError("compress_requests='br' needs brotli. pip install brotli")
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.http2 = http2
+        self.compress_requests = compress_requests
+        self.compress_min_size = compress_min_size
+        self.accept_encoding = accept_encoding or DEFAULT_ACCEPT_ENCODING
+        self.codec = get_codec(codec)
+        headers = {'Accept-Encoding': self.accept_encoding}
+        if not keep_alive:
+            headers['Connection'] = 'close'
+        if http2:
+            self.session = self._httpx_client(headers)
+            self.errors = (httpx.TransportError,)
+        else:
+            self.session = self._requests_session(headers)
+            self.errors = (requests.ConnectionError, requests.Timeout)
+
+    def _requests_session(self, headers):
+        session = requests.Session()
+        session.cookies.set_policy(BlockAll())  # for stopping cookies that mess up high-volume API calls to ardoq
+        session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _httpx_client(self, headers):
+        if isinstance(self.timeout, tuple):
+            timeout = httpx.Timeout(self.timeout[1], connect=self.timeout[0])
+        else:
+            timeout = httpx.Timeout(self.timeout)
+        limits = httpx.Limits(max_connections=self.pool_size,
+                              max_keepalive_connections=self.pool_size if self.keep_alive else 0)
+        # a cookie jar that never keeps cookies, as BlockAll does for requests
+        return httpx.Client(http2=True, headers=headers, timeout=timeout, limits=limits,
+                            cookies=cookiejar.CookieJar(policy=BlockAll()))
+
+    def copy(self, **changes):
+        """
+        :return: a new Transport with the same options, except the ones in changes, and its own connections
+        """
+        options = {'pool_size': self.pool_size, 'keep_alive': self.keep_alive, 'timeout': self.timeout,
+                   'http2': self.http2, 'compress_requests': self.compress_requests,
+                   'compress_min_size': self.compress_min_size, 'accept_encoding': self.accept_encoding,
+                   'codec': self.codec}
+        options.update(changes)
+        return Transport(**options)
+
+    def _compress(self, data):
+        if self.compress_requests == 'br':
+            return brotli.compress(data)
+        return gzip.compress(data, compresslevel=5)
+
+    def request(self, method, url, params=None, json=None, data=None, headers=None, stream=False):
+        """
+        sends a request on a pooled connection
+        :param json: object to send as the json body, or json that is already encoded as bytes
+        :param data: body as bytes or str
+        :param headers: headers for this request, e.g. authorization
+        :param stream: don't read the body before returning. use iter_content and close the response
+        :return: requests.Response, or a response with the same attributes for http2
+        """
+        if json is not None:
+            if isinstance(json, RAW_JSON_TYPES):
+                data = json if isinstance(json, bytes) else bytes(json)
+            else:
+                data = self.codec.dumps(json)
+            headers = dict(headers or {})
+            headers.setdefault('Content-Type', 'application/json')
+        if self.compress_requests and data is not None:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            if len(data) >= self.compress_min_size:
+                data = self._compress(data)
+                headers = dict(headers or {})
+                headers['Content-Encoding'] = self.compress_requests
+        if not self.http2:
+            return self.session.request(method, url, params=params, data=data, headers=headers,
+                                        stream=stream, timeout=self.timeout)
+        # httpx sends None params as empty values. requests leaves them out
+        params = {k: v for k, v in params.items() if v is not None} if params else None
+        req = self.session.build_request(method, url, params=params, content=data, headers=headers)
+        return _HttpxResponse(self.session.send(req, stream=stream))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,9 +1,10 @@
-import json
 import sys
 import os
-import urllib.request
 import urllib.parse
 import logging
+from ardoqpy import RestClient, RetryPolicy
+
+logger = logging.getLogger(__name__)
 
 # This Client is a copy of the v2 sample client provided on the ardoq developer portal.
 # For more information see https://developer.ardoq.com/getting-started/example_client/
@@ -69,8 +70,9 @@ class Batch:
 default_host = "https://app.ardoq.com"
 
 
-class API:
-    def __init__(self, ardoq_api_host=None, ardoq_api_token=None, ardoq_org_label=None):
+class API(RestClient):
+    def __init__(self, ardoq_api_host=None, ardoq_api_token=None, ardoq_org_label=None, hooks=None,
+                 transport=None, retry=RetryPolicy(), rate_limit=None, cache=None):
         self.ardoq_api_host = ardoq_api_host or os.getenv(
             "ARDOQ_API_HOST", default_host
         )
@@ -78,10 +80,10 @@ class API:
         self.ardoq_org_label = ardoq_org_label or os.getenv("ARDOQ_ORG_LABEL")
 
         if self.ardoq_api_token is None:
-            logging.fatal("API Token expected")
+            logger.fatal("API Token expected")
             sys.exit(1)
         if self.ardoq_api_host == default_host and self.ardoq_org_label is None:
-            logging.fatal(
+            logger.fatal(
                 "Org label required when using host: '{}'".format(default_host)
             )
             sys.exit(1)
@@ -95,31 +97,28 @@ class API:
 #        )
 #        print("----------------------------------------------------")
 
-    def _init_request(self, url, method, data=None):
-        req = urllib.request.Request(url, method=method)
-        req.add_header("Authorization", "Bearer " + self.ardoq_api_token)
+        # same transport, retries, rate limiting, hooks, response cache, and errors as ArdoqClient (see RestClient)
+        headers = {"Authorization": "Bearer " + self.ardoq_api_token}
         if self.ardoq_org_label is not None:
-            req.add_header("X-org", self.ardoq_org_label)
-        if data is not None:
-            req.add_header("Content-Type", "application/json; charset=utf-8")
-            data = json.dumps(data).encode("utf-8")
-        return [req, data]
+            headers["X-org"] = self.ardoq_org_label
+        super().__init__(headers, retry=retry, rate_limit=rate_limit, hooks=hooks, transport=transport,
+                         cache=cache)
 
-    def _request(self, resource, method="GET", query_params=None, data=None):
+    def _url(self, resource, query_params=None):
         url = self.ardoq_api_host + "/api/v2" + resource
         if query_params:
             url = url + "?" + urllib.parse.urlencode(query_params)
-        [req, data] = self._init_request(url, method, data)
-        with urllib.request.urlopen(req, data=data) as resp:
-            return json.loads(resp.read().decode("utf-8"))
+        return url
+
+    def _request(self, resource, method="GET", query_params=None, data=None):
+        url = self._url(resource, query_params)
+        if method == "GET" and self.cache is not None:
+            return self._cached_get(url)
+        return self._http_request(method, url, json=data)
 
     def _raw_request(self, resource, method="GET", query_params=None, data=None):
-        url = self.ardoq_api_host + "/api/v2" + resource
-        if query_params:
-            url = url + "?" + urllib.parse.urlencode(query_params)
-        [req, data] = self._init_request(url, method, data)
-        with urllib.request.urlopen(req, data=data) as resp:
-            return resp.read().decode("utf-8")
+        resp = self._http_request(method, self._url(resource, query_params), raw=True, json=data)
+        return resp.text
 
     def _paginated_request(self, resource, method="GET", query_params=None, data=None):
         result_data = self._request(
@@ -131,9 +130,9 @@ class API:
             next_url = result_data.get("_links", {}).get("next", {}).get("href")
             if next_url is None:
                 return
-            [req, _] = self._init_request(next_url, "GET")
-            with urllib.request.urlopen(req) as resp:
-                result_data = json.loads(resp.read().decode("utf-8"))
+            if next_url.startswith("/"):
+                next_url = self.ardoq_api_host + next_url
+            result_data = self._http_request("GET", next_url)
 
     def me(self):
         return self._request("/me", method="GET")
@@ -0,0 +1,227 @@
+"""
+offline throughput benchmarks for ArdoqClient, ArdoqSyncClient, and the v2 API client
+runs against the in-process fake ardoq in fake_ardoq.py, so no tenant or config file is needed
+
+each scenario runs in a fresh process, so peak RSS is the memory of the client in that scenario only.
+requests/sec is the number of requests the fake served in the timed part divided by its wall time.
+latency percentiles are the time the fake spent on each request, including the configured latency
+
+python benchmark.py                                  # all scenarios, 50k components
+python benchmark.py --components 5000 --latency 0.002 --throttle 0.01 cold_sync warm_resync
+python benchmark.py --json results.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# the checkout this file is in, so ardoqpy imports without being installed. spawned scenario processes
+# start with the sys.path of this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fake_ardoq import FakeArdoq
+
+
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # bytes on macOS, KB on linux
+
+
+def source_rows(ws_id, n, type_count, changed=0.0, description_size=100):
+    """
+    rows as an importer would create them, matching the components generated by the fake
+    :param changed: fraction of rows with a changed attribute
+    """
+    step = int(1 / changed) if changed else 0
+    for i in range(n):
+        row = {'name': 'component %d' % i, 'typeId': 'p%d' % (i % type_count), 'rootWorkspace': ws_id,
+               'description': ('d%d ' % i).ljust(description_size, 'x')}
+        if step and i % step == 0:
+            row['owner'] = 'new owner'
+        yield row
+
+
+def transport(opts):
+    from ardoqpy import Transport
+    return Transport(keep_alive=opts['keep_alive'], compress_requests=opts['compress_requests'])
+
+
+'''
+scenarios. each runs in its own process and returns the time window of the timed part
+'''
+
+
+def cold_sync(url, ws_id, opts):
+    # the first sync of a source. the workspace is empty (see EMPTY_WORKSPACE) and the client is new,
+    # so the workspace load and a create for every row are timed
+    from ardoqpy import ArdoqSyncClient
+    start = time.time()
+    ardoq = ArdoqSyncClient(hosturl=url, token='bench', transport=transport(opts))
+    for row in source_rows(ws_id, opts['components'], opts['types'], description_size=opts['description_size']):
+        ardoq.create_component(row)
+    return start, time.time(), {'new_comps': ardoq.report['new_comps'],
+                                'cache_hit_comps': ardoq.report['cache_hit_comps']}
+
+
+def _warm_resync(url, ws_id, opts, **kwargs):
+    from ardoqpy import ArdoqSyncClient
+    ardoq = ArdoqSyncClient(hosturl=url, token='bench', transport=transport(opts), **kwargs)
+    ardoq.get_workspace(ws_id=ws_id)
+    start = time.time()
+    for row in source_rows(ws_id, opts['components'], opts['types'], changed=0.01,
+                           description_size=opts['description_size']):
+        ardoq.create_component(row)
+    if ardoq.batch_size:
+        ardoq.flush()
+    return start, time.time(), {'updated_comps': ardoq.report['updated_comps']}
+
+
+def warm_resync(url, ws_id, opts):
+    return _warm_resync(url, ws_id, opts)
+
+
+def warm_resync_batch(url, ws_id, opts):
+    return _warm_resync(url, ws_id, opts, batch_size=500)
+
+
+def _bulk_references(url, ws_id, opts, **kwargs):
+    from ardoqpy import ArdoqSyncClient
+    ardoq = ArdoqSyncClient(hosturl=url, token='bench', transport=transport(opts), **kwargs)
+    comps = ardoq.get_workspace(ws_id=ws_id)['components']
+    n = opts['references']
+    start = time.time()
+    for i in range(n):
+        ardoq.create_reference({'source': comps[i % len(comps)]['_id'], 'target': comps[(i * 13 + 5) % len(comps)]['_id'],
+                                'type': 1, 'rootWorkspace': ws_id, 'targetWorkspace': ws_id})
+    if ardoq.batch_size:
+        ardoq.flush()
+    return start, time.time(), {'new_refs': ardoq.report['new_refs']}
+
+
+def bulk_references(url, ws_id, opts):
+    return _bulk_references(url, ws_id, opts)
+
+
+def bulk_references_batch(url, ws_id, opts):
+    return _bulk_references(url, ws_id, opts, batch_size=500)
+
+
+def listing_client(url, ws_id, opts):
+    from ardoqpy import ArdoqClient
+    ardoq = ArdoqClient(hosturl=url, token='bench', version='v2', transport=transport(opts))
+    start = time.time()
+    n = sum(1 for _ in ardoq.iter_components(ws_id=ws_id, prefetch=True))
+    return start, time.time(), {'components': n}
+
+
+def listing_api(url, ws_id, opts):
+    from ardoqpy import API
+    api = API(ardoq_api_host=url, ardoq_api_token='bench', ardoq_org_label='bench', transport=transport(opts))
+    start = time.time()
+    n = sum(1 for _ in api.list_components(query_params={'rootWorkspace': ws_id}, paginated=True))
+    return start, time.time(), {'components': n}
+
+
+# name -> scenario function
+SCENARIOS = {
+    'cold_sync': cold_sync,
+    'warm_resync': warm_resync,
+    'warm_resync_batch': warm_resync_batch,
+    'bulk_references': bulk_references,
+    'bulk_references_batch': bulk_references_batch,
+    'listing_client': listing_client,
+    'listing_api': listing_api,
+}
+
+
+# scenarios that run against an empty workspace instead of one with the components of source_rows
+EMPTY_WORKSPACE = {'cold_sync'}
+
+
+def _run_child(name, url, ws_id, opts):
+    logging.disable(logging.CRITICAL)
+    start, end, info = SCENARIOS[name](url, ws_id, opts)
+    return start, end, info, peak_rss()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def run(names, opts):
+    fake = FakeArdoq(latency=opts['latency'], jitter=opts['jitter'], throttle=opts['throttle'],
+                     page_size=opts['page_size'], seed=opts['seed'], gzip_responses=opts['gzip'])
+    url = fake.start()
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        for name in names:
+            components = 0 if name in EMPTY_WORKSPACE else opts['components']
+            ws_id = fake.add_workspace(components=components, description_size=opts['description_size'],
+                                       type_count=opts['types'])
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                start, end, info, rss = pool.submit(_run_child, name, url, ws_id, opts).result()
+            stats = fake.stats(start, end)
+            seconds = end - start
+            results.append({'scenario': name, 'seconds': seconds, 'requests': stats['requests'],
+                            'requests_per_sec': stats['requests'] / seconds if seconds else 0.0,
+                            'p50_ms': percentile(stats['durations'], 50) * 1000,
+                            'p99_ms': percentile(stats['durations'], 99) * 1000,
+                            'throttled': stats['status'].get(429, 0),
+                            'bytes_in': stats['bytes_in'], 'bytes_out': stats['bytes_out'],
+                            'peak_rss_mb': rss / 2 ** 20, 'info': info})
+            print_result(results[-1])
+    finally:
+        fake.stop()
+    return results
+
+
+def print_result(r):
+    print(f"{r['scenario']:<22} {r['seconds']:8.2f}s {r['requests']:7d} req {r['requests_per_sec']:9.1f} req/s "
+          f"p50 {r['p50_ms']:7.2f}ms p99 {r['p99_ms']:7.2f}ms 429s {r['throttled']:5d} "
+          f"rss {r['peak_rss_mb']:7.1f}MB {r['info']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline ardoqpy benchmarks against a fake ardoq')
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run. default all: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--components', type=int, default=50000, help='components in each workspace')
+    parser.add_argument('--references', type=int, default=5000, help='references created in bulk_references')
+    parser.add_argument('--types', type=int, default=10, help='component types in each workspace')
+    parser.add_argument('--description-size', type=int, default=200, help='characters in each description')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='max random seconds added to each request')
+    parser.add_argument('--throttle', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--page-size', type=int, default=1000, help='page size of v2 listings')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--gzip', action='store_true', help='the fake gzips responses')
+    parser.add_argument('--compress-requests', choices=['gzip', 'br'], help='clients compress request bodies')
+    parser.add_argument('--no-keep-alive', dest='keep_alive', action='store_false',
+                        help='clients open a new connection for each request')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(unknown))
+    opts = {'components': args.components, 'references': args.references, 'types': args.types,
+            'description_size': args.description_size, 'latency': args.latency, 'jitter': args.jitter,
+            'throttle': args.throttle, 'page_size': args.page_size, 'seed': args.seed, 'gzip': args.gzip,
+            'compress_requests': args.compress_requests, 'keep_alive': args.keep_alive}
+    logging.disable(logging.CRITICAL)
+    results = run(names, opts)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'options': opts, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
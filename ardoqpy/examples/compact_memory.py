@@ -0,0 +1,41 @@
+"""
+measures the memory per cached component as a dict and as a CompactRecord
+components are generated with the attributes of a typical aggregated v1 component. no ardoq tenant needed
+
+python compact_memory.py [number of components]
+"""
+import sys
+import tracemalloc
+from ardoqpy import CompactRecord
+
+
+def make_component(i):
+    return {'_id': '%024x' % i, '_version': 3, 'name': 'Application %d' % i, 'description': 'description %d' % i,
+            'typeId': 'p%d' % (i % 12), 'type': 'Application', 'rootWorkspace': '%024x' % 7, 'model': '%024x' % 9,
+            'parent': None, 'children': [], 'component-key': 'ABC-%d' % i, 'ordering': i,
+            'created': '2024-01-01T10:00:00.000Z', 'createdBy': '%024x' % 1, 'createdByName': 'Jane Doe',
+            'createdByEmail': 'jane@example.com', 'lastUpdated': '2024-02-01T10:00:00.000Z',
+            'lastModifiedBy': '%024x' % 1, 'lastModifiedByName': 'Jane Doe',
+            'lastModifiedByEmail': 'jane@example.com', 'incomingReferenceCount': 2, 'outgoingReferenceCount': 3,
+            'lifecycle': 'Live', 'owner': 'team %d' % (i % 40), 'cost': i * 10}
+
+
+def measure(n, wrap):
+    tracemalloc.start()
+    comps = [wrap(make_component(i)) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(comps)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    as_dict = measure(n, lambda c: c)
+    as_record = measure(n, CompactRecord)
+    print(f"{n} components")
+    print(f"dict:          {as_dict:8.0f} bytes per component")
+    print(f"CompactRecord: {as_record:8.0f} bytes per component ({as_record / as_dict:.0%})")
+
+
+if __name__ == '__main__':
+    main()
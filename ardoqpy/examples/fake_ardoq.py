@@ -0,0 +1,432 @@
+"""
+in-process fake of the Ardoq v1 and v2 REST API for benchmarks and offline experiments
+keeps workspaces, components, and references in memory. implements the endpoints used by ArdoqClient,
+ArdoqSyncClient, and the v2 API client, with configurable latency and 429 injection
+
+    fake = FakeArdoq(latency=0.005, throttle=0.01)
+    url = fake.start()
+    ws_id = fake.add_workspace(components=50000, references=5000)
+    ardoq = ArdoqSyncClient(hosturl=url, token='fake')
+    ...
+    fake.stop()
+"""
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+V2_COMPONENT_KEYS = {'_id', '_version', 'rootWorkspace', 'name', 'typeId', 'parent', 'description', 'type',
+                     'created', 'lastUpdated'}
+V2_REFERENCE_KEYS = {'_id', '_version', 'rootWorkspace', 'targetWorkspace', 'source', 'target', 'type',
+                     'displayText', 'description', 'created', 'lastUpdated'}
+
+
+class FakeArdoq(object):
+
+    def __init__(self, latency=0.0, jitter=0.0, throttle=0.0, retry_after='0', page_size=1000, seed=1,
+                 gzip_responses=False, etags=False):
+        """
+        :param latency: seconds added to every request
+        :param jitter: max random seconds added on top of latency
+        :param throttle: fraction of requests answered with 429
+        :param retry_after: Retry-After header sent with the 429s. None for no header
+        :param page_size: page size of v2 list endpoints
+        :param seed: seed for the generated data, jitter, and throttling, so runs are reproducible
+        :param gzip_responses: gzip response bodies of 1KB or more for clients that accept gzip.
+            gzipped request bodies (Content-Encoding: gzip) are always accepted
+        :param etags: send an ETag with GET responses and answer If-None-Match with 304 when it matches
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.gzip_responses = gzip_responses
+        self.etags = etags
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()  # held while routing, and the routes create ids
+        self.workspaces = {}
+        self.components = {}  # _id -> component, for all workspaces
+        self.references = {}  # _id -> reference, for all workspaces
+        self.models = {}  # model id -> model
+        self.fields = []
+        self.next_id = 0
+        self.reset_stats()
+        self.server = None
+        self.url = None
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(_Handler):
+            ardoq = fake
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = []  # (time arrived, seconds, status, bytes in, bytes out) per request
+
+    def stats(self, start=None, end=None):
+        """
+        :param start: optional, only requests that arrived after this time.time()
+        :param end: optional, only requests that arrived before this time.time()
+        :return: dict with number of requests, list of durations, count per status, bytes in and out
+        """
+        with self.lock:
+            requests = [r for r in self.requests
+                        if (start is None or r[0] >= start) and (end is None or r[0] <= end)]
+        status = {}
+        for r in requests:
+            status[r[2]] = status.get(r[2], 0) + 1
+        return {'requests': len(requests), 'durations': [r[1] for r in requests], 'status': status,
+                'bytes_in': sum(r[3] for r in requests), 'bytes_out': sum(r[4] for r in requests)}
+
+    '''
+    data
+    '''
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return '%024x' % self.next_id
+
+    def add_workspace(self, components=0, references=0, description_size=100, type_count=10, name=None):
+        """
+        adds a workspace with generated components and references
+        :return: the workspace id
+        """
+        ws_id = self.new_id()
+        now = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        self.workspaces[ws_id] = {'meta': {'_id': ws_id, '_version': 1, 'name': name or 'workspace ' + ws_id,
+                                           'componentModel': 'model-' + ws_id, 'lastUpdated': now},
+                                  'components': {}, 'references': {}}
+        self.models['model-' + ws_id] = self.make_model('model-' + ws_id, type_count)
+        self.fields.extend({'_id': self.new_id(), 'name': 'field_%d' % i, 'label': 'Field %d' % i, 'type': 'Text',
+                            'model': 'model-' + ws_id, 'global': i == 0, 'componentType': ['p%d' % i],
+                            'referenceType': []}
+                           for i in range(min(type_count, 5)))
+        comp_ids = []
+        for i in range(components):
+            c = self.make_component(ws_id, i, description_size, type_count)
+            self._put_component(c)
+            comp_ids.append(c['_id'])
+        for i in range(references if comp_ids else 0):
+            r = {'_id': self.new_id(), '_version': 1, 'rootWorkspace': ws_id, 'targetWorkspace': ws_id,
+                 'source': comp_ids[i % len(comp_ids)], 'target': comp_ids[(i * 7 + 1) % len(comp_ids)],
+                 'type': i % 3, 'description': '', 'created': now, 'lastUpdated': now}
+            self._put_reference(r)
+        return ws_id
+
+    def make_component(self, ws_id, i, description_size=100, type_count=10):
+        now = '2024-01-01T10:00:00.000Z'
+        return {'_id': self.new_id(), '_version': 1, 'name': 'component %d' % i, 'typeId': 'p%d' % (i % type_count),
+                'type': 'Type %d' % (i % type_count), 'rootWorkspace': ws_id, 'model': 'model-' + ws_id,
+                'parent': None, 'description': ('d%d ' % i).ljust(description_size, 'x'),
+                'component-key': 'KEY-%d' % i, 'created': now, 'createdBy': 'user', 'lastUpdated': now,
+                'lastModifiedBy': 'user', 'incomingReferenceCount': 0, 'outgoingReferenceCount': 0,
+                'external_id': 'ext-%d' % i, 'owner': 'team %d' % (i % 20)}
+
+    @staticmethod
+    def make_model(model_id, type_count=10, reference_types=3):
+        root = {'p%d' % i: {'id': 'p%d' % i, 'name': 'Type %d' % i, 'level': 1, 'index': i, 'children': {},
+                            'shape': 'rect', 'color': '#%06x' % (i * 4099 % 0xffffff), 'returnsValue': False}
+                for i in range(type_count)}
+        ref_types = {str(i): {'id': i, 'name': 'Reference %d' % i, 'line': 'solid', 'color': '#000000'}
+                     for i in range(reference_types)}
+        return {'_id': model_id, '_version': 1, 'name': 'model ' + model_id, 'root': root,
+                'referenceTypes': ref_types, 'useAsTemplate': False}
+
+    def _touch(self, ws_id):
+        ws = self.workspaces.get(ws_id)
+        if ws is not None:
+            ws['meta']['_version'] += 1
+            ws['meta']['lastUpdated'] = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+
+    def _put_component(self, c):
+        self.components[c['_id']] = c
+        self.workspaces[c['rootWorkspace']]['components'][c['_id']] = c
+        self._touch(c['rootWorkspace'])
+        return c
+
+    def _put_reference(self, r):
+        self.references[r['_id']] = r
+        self.workspaces[r['rootWorkspace']]['references'][r['_id']] = r
+        self._touch(r['rootWorkspace'])
+        return r
+
+    def create_component(self, body):
+        c = dict(body)
+        c['_id'] = self.new_id()
+        c['_version'] = 1
+        c.setdefault('type', 'Type')
+        return self._put_component(c)
+
+    def create_reference(self, body):
+        r = dict(body)
+        r['_id'] = self.new_id()
+        r['_version'] = 1
+        if 'rootWorkspace' not in r and r.get('source') in self.components:
+            r['rootWorkspace'] = self.components[r['source']]['rootWorkspace']
+        return self._put_reference(r)
+
+    def update(self, entities, _id, body):
+        e = entities.get(_id)
+        if e is None:
+            return None
+        e.update(body)
+        e['_version'] += 1
+        self._touch(e['rootWorkspace'])
+        return e
+
+    def delete(self, entities, _id, kind):
+        e = entities.pop(_id, None)
+        if e is not None:
+            ws = self.workspaces[e['rootWorkspace']]
+            ws[kind].pop(_id, None)
+            if kind == 'components':  # ardoq deletes the references of a deleted component
+                # across workspaces too, a reference can point into another workspace
+                for r in [r for r in self.references.values() if r['source'] == _id or r['target'] == _id]:
+                    self.references.pop(r['_id'], None)
+                    self.workspaces[r['rootWorkspace']]['references'].pop(r['_id'], None)
+                    self._touch(r['rootWorkspace'])
+            self._touch(e['rootWorkspace'])
+        return e
+
+    @staticmethod
+    def to_v2(e, keys):
+        out = {k: v for k, v in e.items() if k in keys}
+        out['customFields'] = {k: v for k, v in e.items() if k not in keys}
+        return out
+
+    @staticmethod
+    def from_v2(body):
+        body = dict(body)
+        body.update(body.pop('customFields', None) or {})
+        return body
+
+    def batch(self, body):
+        # None if an update or delete is for an entity that doesn't exist. ardoq rejects the whole batch then
+        for kind, entities in (('components', self.components), ('references', self.references)):
+            for action in ('update', 'delete'):
+                if any(item['id'] not in entities for item in body.get(kind, {}).get(action, [])):
+                    return None
+        batch_ids = {}
+        res = {'components': {'created': [], 'updated': [], 'deleted': []},
+               'references': {'created': [], 'updated': [], 'deleted': []}}
+        comps = body.get('components', {})
+        refs = body.get('references', {})
+        for item in comps.get('create', []):
+            c = self.from_v2(item['body'])
+            c['parent'] = batch_ids.get(c.get('parent'), c.get('parent'))
+            c = self.create_component(c)
+            if 'batchId' in item:
+                batch_ids[item['batchId']] = c['_id']
+            res['components']['created'].append({'batchId': item.get('batchId'), 'id': c['_id'],
+                                                 'entity': self.to_v2(c, V2_COMPONENT_KEYS)})
+        for item in comps.get('update', []):
+            c = self.update(self.components, item['id'], self.from_v2(item['body']))
+            res['components']['updated'].append({'id': item['id'], 'entity': self.to_v2(c or {}, V2_COMPONENT_KEYS)})
+        for item in comps.get('delete', []):
+            self.delete(self.components, item['id'], 'components')
+            res['components']['deleted'].append({'id': item['id']})
+        for item in refs.get('create', []):
+            r = self.from_v2(item['body'])
+            r['source'] = batch_ids.get(r.get('source'), r.get('source'))
+            r['target'] = batch_ids.get(r.get('target'), r.get('target'))
+            r = self.create_reference(r)
+            res['references']['created'].append({'batchId': item.get('batchId'), 'id': r['_id'],
+                                                 'entity': self.to_v2(r, V2_REFERENCE_KEYS)})
+        for item in refs.get('update', []):
+            r = self.update(self.references, item['id'], self.from_v2(item['body']))
+            res['references']['updated'].append({'id': item['id'], 'entity': self.to_v2(r or {}, V2_REFERENCE_KEYS)})
+        for item in refs.get('delete', []):
+            self.delete(self.references, item['id'], 'references')
+            res['references']['deleted'].append({'id': item['id']})
+        return res
+
+    @staticmethod
+    def search(entities, query):
+        """
+        v1 component/search and fieldsearch. name matches part of the name. field and value, or the other params
+        of a fieldsearch, match a field. query values are strings, so field values are compared as strings
+        """
+        name = query.get('name')
+        fields = {k: v for k, v in query.items() if k not in ('workspace', 'org', 'name', 'field', 'value')}
+        if query.get('field'):
+            fields[query['field']] = query.get('value')
+        return [e for e in entities if (name is None or name in e.get('name', ''))
+                and all(str(e.get(k)) == v for k, v in fields.items())]
+
+    def page(self, entities, query, path, keys):
+        ws_id = query.get('rootWorkspace')
+        values = list(self.workspaces[ws_id][entities].values()) if ws_id in self.workspaces else []
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', self.page_size))
+        out = {'values': [self.to_v2(e, keys) for e in values[offset:offset + limit]], '_links': {}}
+        if offset + limit < len(values):
+            query = dict(query, offset=offset + limit, limit=limit)
+            out['_links']['next'] = {'href': self.url + path + '?' + urlencode(query)}
+        return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # headers and body are written separately. avoids a delayed ACK per request
+    ardoq = None  # set by FakeArdoq.start
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=None, headers=None):
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        if self.ardoq.etags and self.command == 'GET' and code == 200:
+            etag = '"%s"' % hashlib.sha1(data).hexdigest()
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get('If-None-Match') == etag:
+                code, data = 304, b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        if self.ardoq.gzip_responses and len(data) >= 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header('Connection', 'close')  # tells the client not to reuse the connection
+        self.end_headers()
+        self.wfile.write(data)
+        return code, len(data)
+
+    def _handle(self):
+        arrived = time.time()  # the request is counted in a time window by its arrival
+        start = time.perf_counter()
+        fake = self.ardoq
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        received = len(raw)  # on the wire, before gzip is decoded
+        with fake.lock:
+            delay = fake.latency + (fake.rng.uniform(0, fake.jitter) if fake.jitter else 0)
+            throttled = fake.throttle and fake.rng.random() < fake.throttle
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            headers = {'Retry-After': fake.retry_after} if fake.retry_after is not None else {}
+            code, sent = self._send(429, {'message': 'rate limited'}, headers)
+        else:
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if self.headers.get('Content-Encoding') == 'gzip':
+                raw = gzip.decompress(raw)
+            body = json.loads(raw) if raw else None
+            try:
+                with fake.lock:
+                    code, res = _route(fake, self.command, url.path, query, body)
+            except Exception as e:  # reported as a server error, like ardoq would
+                code, res = 500, {'message': repr(e)}
+            code, sent = self._send(code, res if code != 204 else None)
+        with fake.lock:
+            fake.requests.append((arrived, time.perf_counter() - start, code, received, sent))
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+def _found(e, code=200):
+    return (code, e) if e is not None else (404, {'message': 'not found'})
+
+
+def _route(fake, method, path, query, body):
+    m = re.match(r'^/api/(v2/)?([^/]+)(?:/([^/]+))?(?:/([^/]+))?/?$', path)
+    if m is None:
+        return 404, {'message': 'unknown path ' + path}
+    v2, resource, _id, sub = m.groups()
+    if v2:
+        return _route_v2(fake, method, path, resource, _id, sub, query, body)
+    if resource == 'workspace':
+        if _id is None:
+            return 200, [ws['meta'] for ws in fake.workspaces.values()]
+        ws = fake.workspaces.get(_id)
+        if ws is None:
+            return 404, {'message': 'not found'}
+        if sub == 'aggregated':
+            return 200, dict(ws['meta'], components=list(ws['components'].values()),
+                             references=list(ws['references'].values()), tags=[])
+        return 200, ws['meta']
+    if resource == 'model':
+        return _found(fake.models.get(_id))
+    if resource == 'field':
+        if method == 'POST':
+            fake.fields.append(dict(body, _id=fake.new_id()))
+            return 201, fake.fields[-1]
+        if _id is None:
+            return 200, fake.fields
+        return _found(next((f for f in fake.fields if f['_id'] == _id), None))
+    entities = fake.components if resource == 'component' else fake.references
+    kind = resource + 's'
+    if resource not in ('component', 'reference'):
+        return 404, {'message': 'unknown resource ' + resource}
+    if method == 'POST':
+        create = fake.create_component if resource == 'component' else fake.create_reference
+        return 201, create(body)
+    if _id in ('search', 'fieldsearch') or (_id is None and method == 'GET'):
+        ws = fake.workspaces.get(query.get('workspace'), {kind: {}})
+        if _id is None:
+            return 200, list(ws[kind].values())
+        return 200, fake.search(ws[kind].values(), query)
+    if method == 'GET':
+        return _found(entities.get(_id))
+    if method == 'PUT':
+        return _found(fake.update(entities, _id, body))
+    if method == 'DELETE':
+        return _found(fake.delete(entities, _id, kind) and {}, 204)
+    return 405, {'message': 'method not allowed'}
+
+
+def _route_v2(fake, method, path, resource, _id, sub, query, body):
+    if resource == 'me':
+        return 200, {'email': 'bench@example.com'}
+    if resource == 'batch' and method == 'POST':
+        return _found(fake.batch(body))
+    if resource == 'workspaces':
+        if _id is None:
+            return 200, {'values': [ws['meta'] for ws in fake.workspaces.values()], '_links': {}}
+        ws = fake.workspaces.get(_id)
+        if ws is not None and sub == 'context':
+            model = fake.models[ws['meta']['componentModel']]
+            return 200, {'componentTypes': [dict(t, children=[]) for t in model['root'].values()],
+                         'referenceTypes': model['referenceTypes']}
+        return _found(ws and ws['meta'])
+    if resource not in ('components', 'references'):
+        return 404, {'message': 'unknown resource ' + resource}
+    entities = fake.components if resource == 'components' else fake.references
+    keys = V2_COMPONENT_KEYS if resource == 'components' else V2_REFERENCE_KEYS
+    if _id is None:
+        if method == 'POST':
+            create = fake.create_component if resource == 'components' else fake.create_reference
+            return 201, fake.to_v2(create(fake.from_v2(body)), keys)
+        return 200, fake.page(resource, query, path, keys)
+    if method == 'GET':
+        e = entities.get(_id)
+        return _found(e and fake.to_v2(e, keys))
+    if method == 'PATCH':
+        e = fake.update(entities, _id, fake.from_v2(body))
+        return _found(e and fake.to_v2(e, keys))
+    if method == 'DELETE':
+        return _found(fake.delete(entities, _id, resource) and {}, 204)
+    return 405, {'message': 'method not allowed'}
@@ -0,0 +1,96 @@
+"""
+per-call cost of the logging on the sync client cache path
+ArdoqSyncClient used to call logging.basicConfig(level=DEBUG) on import and build f-string log messages
+on every call. this compares that setup with the default, where ardoqpy configures no logging
+
+each run syncs the same components against a cached workspace, so every call is a cache hit and no request is sent.
+the old setup is reproduced with basicConfig(DEBUG) writing to os.devnull, so the cost is formatting, not the terminal
+
+python logging_overhead.py --components 20000
+"""
+import argparse
+import logging
+import os
+import time
+
+from ardoqpy import ArdoqSyncClient
+
+WS_ID = 'a' * 24
+
+
+def workspace(n, type_count=10):
+    comps = [{'_id': '%024x' % i, 'name': 'component %d' % i, 'typeId': 'p%d' % (i % type_count),
+              'type': 'type %d' % (i % type_count), 'rootWorkspace': WS_ID, 'description': 'd%d' % i}
+             for i in range(n)]
+    return {'_id': WS_ID, 'name': 'bench', 'components': comps, 'references': [], 'tags': []}
+
+
+def rows(ws):
+    return [{'name': c['name'], 'typeId': c['typeId'], 'rootWorkspace': WS_ID, 'description': c['description']}
+            for c in ws['components']]
+
+
+def per_call(ardoq, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row in items:
+            ardoq.create_component(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items)
+
+
+def reset_logging():
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+        h.close()
+    root.setLevel(logging.WARNING)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='logging overhead of the sync client cache path')
+    parser.add_argument('--components', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per setup. the fastest run is reported')
+    args = parser.parse_args()
+
+    ws = workspace(args.components)
+    items = rows(ws)
+    ardoq = ArdoqSyncClient(hosturl='http://localhost', token='bench')
+    ardoq._cache_workspace(ws)
+
+    results = {}
+    reset_logging()
+    per_call(ardoq, items, 1)  # warm up
+    results['default, no logging configured'] = per_call(ardoq, items, args.repeat)
+
+    with open(os.devnull, 'w') as devnull:
+        logging.basicConfig(format='%(asctime)s %(message)s', level=logging.DEBUG, stream=devnull)
+        results['basicConfig(DEBUG) to devnull, as on import before'] = per_call(ardoq, items, args.repeat)
+        reset_logging()
+
+        logging.basicConfig(format='%(asctime)s %(message)s', level=logging.INFO, stream=devnull)
+        results['application logging at INFO'] = per_call(ardoq, items, args.repeat)
+        reset_logging()
+
+    # the message building alone, as the old f-string call and the new guarded call, with DEBUG off
+    logger = logging.getLogger('ardoqpy.bench')
+    ref = {'displayText': 'uses', 'type': 1}
+    n = 1000000
+    start = time.perf_counter()
+    for _ in range(n):
+        logger.debug(f"create_ref - cache_hit: {ref['displayText']}")
+    results['f-string debug call, DEBUG off'] = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('create_ref - cache_hit: %s', ref['displayText'])
+    results['guarded debug call, DEBUG off'] = (time.perf_counter() - start) / n
+
+    for name, seconds in results.items():
+        print(f'{name:<52} {seconds * 1e6:8.2f} us/call')
+
+
+if __name__ == '__main__':
+    main()
@@ -49,4 +49,13 @@ setup(
 
     keywords='architecture ardoq REST API wrapper tool',
     install_requires=['cookiejar', 'configparser', 'requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'stream': ['ijson'],
+        'http2': ['httpx[http2]'],
+        'brotli': ['brotli'],
+        'fast': ['orjson'],
+        'msgspec': ['msgspec'],
+        'ujson': ['ujson'],
+    },
 )
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'ardoqpy', 'examples'))
+
+from fake_ardoq import FakeArdoq
+
+
+@pytest.fixture
+def fake():
+    fake = FakeArdoq()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+def server_state(fake, ws_id):
+    # components and references of a workspace on the fake, to compare with the cache of a client
+    ws = fake.workspaces[ws_id]
+    return ({c['_id']: (c['name'], c.get('parent'), c.get('owner')) for c in ws['components'].values()},
+            {r['_id']: (r['source'], r['target'], r.get('type')) for r in ws['references'].values()})
+
+
+def cache_state(client, ws_id):
+    ws = client.ws[ws_id]
+    return ({c['_id']: (c['name'], c.get('parent'), c.get('owner')) for c in ws['components']},
+            {r['_id']: (r['source'], r['target'], r.get('type')) for r in ws['references']})
+
+
+def sync_client(fake, ws_ids=(), **kwargs):
+    # ArdoqSyncClient of the fake with the workspaces loaded into its cache
+    from ardoqpy import ArdoqSyncClient
+    ardoq = ArdoqSyncClient(hosturl=fake.url, token='t', **kwargs)
+    for ws_id in ws_ids:
+        ardoq.get_workspace(ws_id=ws_id)
+    return ardoq
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from ardoqpy import AsyncArdoqClient, NotFoundError, RetryPolicy, TooManyRequests
+
+
+def run(fake, coro_fn, **kwargs):
+    async def main():
+        async with AsyncArdoqClient(hosturl=fake.url, token='t', **kwargs) as ardoq:
+            return await coro_fn(ardoq)
+    return asyncio.run(main())
+
+
+def test_get_workspace(fake):
+    ws_id = fake.add_workspace(components=20, references=5)
+    ws = run(fake, lambda ardoq: ardoq.get_workspace(ws_id=ws_id, aggregated=True))
+    assert len(ws['components']) == 20
+    assert len(ws['references']) == 5
+
+
+def test_concurrent_creates(fake):
+    ws_id = fake.add_workspace()
+
+    async def create(ardoq):
+        return await asyncio.gather(*[ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'c%d' % i,
+                                                                    'typeId': 'p0'}) for i in range(30)])
+
+    created = run(fake, create, max_concurrency=4)
+    assert sorted(c['name'] for c in created) == sorted('c%d' % i for i in range(30))
+    assert len(fake.workspaces[ws_id]['components']) == 30
+
+
+def test_not_found(fake):
+    with pytest.raises(NotFoundError):
+        run(fake, lambda ardoq: ardoq.get_workspace(ws_id='0' * 24))
+
+
+def test_retries_throttled_requests(fake):
+    ws_id = fake.add_workspace(components=3)
+    fake.throttle = 0.5
+    for _ in range(10):
+        ws = run(fake, lambda ardoq: ardoq.get_workspace(ws_id=ws_id, aggregated=True),
+                 retry=RetryPolicy(max_retries=20, backoff=0))
+        assert len(ws['components']) == 3
+    assert fake.stats()['status'].get(429)
+
+
+def test_no_retry(fake):
+    ws_id = fake.add_workspace()
+    fake.throttle = 1.0
+    with pytest.raises(TooManyRequests):
+        run(fake, lambda ardoq: ardoq.get_workspace(ws_id=ws_id), retry=None)
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import cache_state, server_state, sync_client
+
+WRITE_MODES = [{}, {'patch': False}, {'compact': True}, {'batch_size': 3}, {'batch_size': 100},
+               {'write_workers': 4}]
+
+
+@pytest.mark.parametrize('mode', WRITE_MODES)
+def test_writes(fake, mode):
+    ws_id = fake.add_workspace(components=10, references=8, type_count=2)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    existing = [c['_id'] for c in ardoq.ws[ws_id]['components']]
+    parent = ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'parent', 'typeId': 'p0'})
+    child = ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'child', 'typeId': 'p0',
+                                         'parent': parent['_id']})
+    ardoq.create_reference(ref={'rootWorkspace': ws_id, 'source': child['_id'], 'target': existing[1], 'type': 1})
+    ardoq.create_reference(ref={'rootWorkspace': ws_id, 'source': parent['_id'], 'target': child['_id'],
+                                'type': 2})
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'component 1', 'typeId': 'p1', 'owner': 'me'})
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'child', 'typeId': 'p0', 'owner': 'again'})
+    ardoq.del_component(comp_id=existing[0])
+    ardoq.flush()
+    assert cache_state(ardoq, ws_id) == server_state(fake, ws_id)
+    comps = {c['name']: c for c in fake.workspaces[ws_id]['components'].values()}
+    assert comps['child']['parent'] == comps['parent']['_id']
+    assert comps['child']['owner'] == 'again'
+    assert comps['component 1']['owner'] == 'me'
+    assert 'component 0' not in comps
+    assert not ardoq._pending
+    assert ardoq.report['new_comps'] == 2 and ardoq.report['new_refs'] == 2
+
+
+@pytest.mark.parametrize('mode', WRITE_MODES)
+def test_delete_component_uncaches_its_references(fake, mode):
+    ws_id = fake.add_workspace(components=10, references=20, type_count=1)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    comp_id = ardoq.ws[ws_id]['components'][0]['_id']
+    attached = [r['_id'] for r in ardoq.ws[ws_id]['references'] if comp_id in (r['source'], r['target'])]
+    assert attached
+    ardoq.del_component(comp_id=comp_id)
+    ardoq.del_reference(ref_id=attached[0])  # went with the component already
+    others = [r['_id'] for r in ardoq.ws[ws_id]['references'] if r['_id'] not in attached]
+    ardoq.del_reference(ref_id=others[0])
+    ardoq.flush()
+    assert cache_state(ardoq, ws_id) == server_state(fake, ws_id)
+
+
+def test_simulate_sends_no_writes(fake):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = sync_client(fake, [ws_id], simulate=True)
+    fake.reset_stats()
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0'})
+    ardoq.del_component(comp_id=ardoq.ws[ws_id]['components'][0]['_id'])
+    assert fake.stats()['requests'] == 0
+    assert ardoq.report['new_comps'] == 1 and ardoq.report['del_comps'] == 1
+
+
+def test_create_that_fails_to_index_is_not_queued(fake, monkeypatch):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = sync_client(fake, [ws_id], batch_size=10)
+
+    def broken(c):
+        raise ValueError('broken index')
+
+    monkeypatch.setattr(ardoq.ws_index[ws_id], 'put_component', broken)
+    with pytest.raises(ValueError):
+        ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0'})
+    assert not ardoq._pending and not ardoq._pending_creates
+    monkeypatch.undo()
+    fake.reset_stats()
+    ardoq.flush()
+    assert fake.stats()['requests'] == 0
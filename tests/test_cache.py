@@ -0,0 +1,64 @@
+from ardoqpy import ArdoqClient, ResponseCache
+
+
+def client(fake, **kwargs):
+    return ArdoqClient(hosturl=fake.url, token='t', cache=ResponseCache(**kwargs))
+
+
+def test_hits(fake):
+    ws_id = fake.add_workspace(components=3)
+    ardoq = client(fake)
+    ardoq.get_model(ws_id=ws_id)
+    ardoq.get_model(ws_id=ws_id)
+    assert ardoq.cache.stats()['hits'] >= 1
+
+
+def test_component_write_invalidates_components_and_searches(fake):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = client(fake)
+    assert ardoq.find_component(ws_id=ws_id, comp_name='new', exact=True) == []
+    assert len(ardoq.get_component(ws_id=ws_id)) == 3
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0'})
+    assert [c['name'] for c in ardoq.find_component(ws_id=ws_id, comp_name='new', exact=True)] == ['new']
+    assert len(ardoq.get_component(ws_id=ws_id)) == 4
+
+
+def test_component_write_keeps_models(fake):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = client(fake)
+    ardoq.get_model(ws_id=ws_id)
+    hits = ardoq.cache.stats()['hits']
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0'})
+    ardoq.get_model(ws_id=ws_id)
+    assert ardoq.cache.stats()['hits'] == hits + 1
+
+
+def test_revalidates_with_etag(fake):
+    fake.etags = True
+    ws_id = fake.add_workspace(components=3)
+    ardoq = client(fake, ttl=0)
+    ardoq.get_model(ws_id=ws_id)
+    ardoq.get_model(ws_id=ws_id)
+    stats = ardoq.cache.stats()
+    assert stats['revalidated'] and not stats['hits']
+
+
+def test_invalidate_all(fake):
+    ws_id = fake.add_workspace(components=3)
+    ardoq = client(fake)
+    ardoq.get_model(ws_id=ws_id)
+    ardoq.cache.invalidate()
+    assert ardoq.cache.stats()['entries'] == 0
+
+
+def test_shared_cache_is_keyed_by_token(fake):
+    ws_id = fake.add_workspace(components=3)
+    cache = ResponseCache()
+    first = ArdoqClient(hosturl=fake.url, token='t1', cache=cache)
+    second = ArdoqClient(hosturl=fake.url, token='t2', cache=cache)
+    first.get_model(ws_id=ws_id)
+    entries = cache.stats()['entries']
+    second.get_model(ws_id=ws_id)
+    assert cache.stats()['hits'] == 0 and cache.stats()['entries'] == 2 * entries
+    first.get_model(ws_id=ws_id)
+    assert cache.stats()['hits'] > 0
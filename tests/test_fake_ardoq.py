@@ -0,0 +1,12 @@
+from ardoqpy import ArdoqClient
+
+
+def test_fake_search_filters_by_name(fake):
+    ws_id = fake.add_workspace(components=12, type_count=1)
+    ardoq = ArdoqClient(hosturl=fake.url, token='t')
+    assert sorted(c['name'] for c in ardoq.find_component(ws_id=ws_id, comp_name='component 1')) == \
+        ['component 1', 'component 10', 'component 11']
+    assert [c['name'] for c in ardoq.find_component(ws_id=ws_id, comp_name='component 1', exact=True)] == \
+        ['component 1']
+    assert [c['name'] for c in ardoq.find_component(ws_id=ws_id, field_name='name',
+                                                    field_value='component 2')] == ['component 2']
@@ -0,0 +1,57 @@
+import pytest
+
+from ardoqpy import ArdoqSyncClient, ReferenceGraph
+
+
+def graph():
+    return ReferenceGraph([{'_id': 'r1', 'source': 'a', 'target': 'b', 'type': 1},
+                           {'_id': 'r2', 'source': 'b', 'target': 'c', 'type': 2},
+                           {'_id': 'r3', 'source': 'c', 'target': 'd', 'type': 1}])
+
+
+def test_traversals():
+    g = graph()
+    assert g.neighbors('b', 'both') == ['c', 'a']
+    assert g.k_hop('a', 2) == {'b': 1, 'c': 2}
+    assert g.shortest_path('a', 'd') == ['a', 'b', 'c', 'd']
+    assert g.shortest_path('d', 'a') is None
+    assert g.shortest_path('a', 'd', ref_types=[1]) is None
+
+
+def test_remove_reference():
+    g = graph()
+    assert g.remove_reference('r2')
+    assert not g.remove_reference('r2')
+    assert g.shortest_path('a', 'd') is None
+    assert len(g) == 4 and g.edge_count == 2
+
+
+def test_rename_component():
+    g = graph()
+    g.rename_component('b', 'x')
+    assert 'b' not in g and g.shortest_path('a', 'd') == ['a', 'x', 'c', 'd']
+
+
+def test_rename_component_to_a_node_in_the_graph():
+    g = graph()
+    g.put_reference({'_id': 'r4', 'source': 'tmp', 'target': 'tmp', 'type': 1})
+    g.put_reference({'_id': 'r5', 'source': 'tmp', 'target': 'a', 'type': 1})
+    g.rename_component('tmp', 'd')
+    assert 'tmp' not in g and len(g) == 4
+    assert sorted(g.neighbors('d')) == ['a', 'd']
+    assert g.shortest_path('b', 'a') == ['b', 'c', 'd', 'a']
+
+
+@pytest.mark.parametrize('mode', [{}, {'batch_size': 10}, {'batch_size': 1}, {'write_workers': 3}])
+def test_graph_follows_queued_creates(fake, mode):
+    ws_id = fake.add_workspace()
+    ardoq = ArdoqSyncClient(hosturl=fake.url, token='t', **mode)
+    ardoq.get_workspace(ws_id=ws_id)
+    g = ardoq.graph()
+    x = ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'x', 'typeId': 'p0'})
+    y = ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'y', 'typeId': 'p0'})
+    ardoq.create_reference(ref={'rootWorkspace': ws_id, 'source': x['_id'], 'target': y['_id'], 'type': 1})
+    ardoq.flush()
+    ids = {c['name']: c['_id'] for c in fake.workspaces[ws_id]['components'].values()}
+    assert len(g) == 2 and g.edge_count == 1
+    assert g.neighbors(ids['x']) == [ids['y']]
@@ -0,0 +1,33 @@
+import pytest
+
+from conftest import sync_client
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_ingest(fake, processes):
+    ws_id = fake.add_workspace(components=10, type_count=1)
+    ardoq = sync_client(fake, [ws_id])
+    rows = [{'Name': 'component %d' % i, 'Kind': 'Type 0', 'Owner': 'o'} for i in range(10)]
+    rows += [{'Name': None, 'Kind': 'Type 0'}, {'Name': float('nan'), 'Kind': 'Type 0'},
+             {'Name': 123, 'Kind': 'Type 0'}, {'Name': 'new', 'Kind': 'Unknown'}]
+    stats = ardoq.ingest_components(ws_id, rows, {'Name': 'name', 'Kind': 'type', 'Owner': 'owner'},
+                                    chunk_size=4, processes=processes)
+    assert (stats['rows'], stats['created'], stats['updated'], stats['skipped']) == (14, 1, 10, 3)
+    assert sorted(c['name'] for c in fake.workspaces[ws_id]['components'].values())[0] == '123'
+    stats = ardoq.ingest_components(ws_id, rows, {'Name': 'name', 'Kind': 'type', 'Owner': 'owner'},
+                                    chunk_size=4, processes=processes)
+    assert (stats['created'], stats['updated'], stats['unchanged']) == (0, 0, 11)
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_ingest_keyed_rows_without_a_name(fake, processes):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = sync_client(fake, [ws_id])
+    rows = [{'Code': 'K1', 'Kind': 'Type 0'}, {'Code': 'K2', 'Kind': 'Type 0', 'Name': 'named'}]
+    mapping = {'Code': 'code', 'Kind': 'type', 'Name': 'name'}
+    stats = ardoq.ingest_components(ws_id, rows, mapping, key_field='code', processes=processes)
+    assert (stats['created'], stats['skipped']) == (2, 0)
+    stats = ardoq.ingest_components(ws_id, rows, mapping, key_field='code', processes=processes)
+    assert (stats['created'], stats['unchanged']) == (0, 2)
+    created = sorted((c['code'], c.get('name')) for c in fake.workspaces[ws_id]['components'].values() if 'code' in c)
+    assert created == [('K1', None), ('K2', 'named')]
@@ -0,0 +1,23 @@
+import pytest
+
+from ardoqpy import ArdoqClient
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_pages_send_the_org(fake, prefetch):
+    fake.page_size = 2
+    ws_id = fake.add_workspace(components=5)
+    ardoq = ArdoqClient(hosturl=fake.url, token='t', org='acme', version='v2')
+    sent = []
+    request = ardoq._request
+
+    def record(method, url, **kwargs):
+        sent.append((url, kwargs.get('params') or {}))
+        return request(method, url, **kwargs)
+
+    ardoq._request = record
+    assert len(list(ardoq.iter_components(ws_id=ws_id, prefetch=prefetch))) == 5
+    assert len(sent) == 3
+    for url, params in sent:
+        assert params.get('org') == 'acme' or 'org=acme' in url
+        assert not (params.get('org') and 'org=' in url)
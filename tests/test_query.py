@@ -0,0 +1,66 @@
+import pytest
+
+from ardoqpy import ArdoqSyncClient, QueryIndex, parse_conditions
+
+COMPONENTS = [
+    {'_id': 'a', 'name': 'Payments', 'typeId': 'p0', 'active': True, 'cost': 1, 'tags': ['x', 'y']},
+    {'_id': 'b', 'name': 'Payroll', 'typeId': 'p0', 'active': False, 'cost': 0},
+    {'_id': 'c', 'name': 'Billing', 'typeId': 'p1', 'active': 1, 'cost': 2.5},
+    {'_id': 'd', 'name': 'Ledger', 'typeId': 'p1', 'active': 0, 'tags': ['y']},
+]
+
+
+def run(conditions, index_after):
+    by_id = {c['_id']: c for c in COMPONENTS}
+    index = QueryIndex(COMPONENTS, index_after=index_after)
+    res = None
+    for _ in range(3):  # the second and third runs use the indexes
+        res = sorted(c['_id'] for c in index.run(parse_conditions(conditions), by_id.get))
+    return res
+
+
+@pytest.mark.parametrize('index_after', [1, 1000])
+@pytest.mark.parametrize('conditions, expected', [
+    ({'active': True}, ['a']),
+    ({'active': 1}, ['c']),
+    ({'active': False}, ['b']),
+    ({'active__ne': True}, ['b', 'c', 'd']),
+    ({'active__in': [True, 0]}, ['a', 'd']),
+    ({'cost__gte': 1}, ['a', 'c']),
+    ({'name__prefix': 'Pay'}, ['a', 'b']),
+    ({'name__icontains': 'LL'}, ['b', 'c']),
+    ({'tags__contains': 'y'}, ['a', 'd']),
+    ({'tags__exists': False}, ['b', 'c']),
+    ({'typeId': 'p0', 'cost__lt': 1}, ['b']),
+])
+def test_query(conditions, expected, index_after):
+    assert run(conditions, index_after) == expected
+
+
+def test_bad_conditions():
+    with pytest.raises(ValueError):
+        parse_conditions({'cost__lt': None})
+    with pytest.raises(ValueError):
+        parse_conditions({'name__prefix': 1})
+
+
+def test_sync_query_follows_the_cache(fake):
+    ws_id = fake.add_workspace(components=20, type_count=2)
+    ardoq = ArdoqSyncClient(hosturl=fake.url, token='t', index_after=1)
+    ardoq.get_workspace(ws_id=ws_id)
+    assert len(ardoq.query(ws_id, typeId='p0')) == 10
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0', 'flag': True})
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'one', 'typeId': 'p0', 'flag': 1})
+    assert len(ardoq.query(ws_id, typeId='p0')) == 12
+    assert [c['name'] for c in ardoq.query(ws_id, flag=True)] == ['new']
+    assert [c['name'] for c in ardoq.query(ws_id, flag=1)] == ['one']
+
+
+def test_sync_find_by_bool_field(fake):
+    ws_id = fake.add_workspace(type_count=1)
+    ardoq = ArdoqSyncClient(hosturl=fake.url, token='t')
+    ardoq.get_workspace(ws_id=ws_id)
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'one', 'typeId': 'p0', 'flag': 1})
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'yes', 'typeId': 'p0', 'flag': True},
+                           field_name='flag', field_value=True)
+    assert sorted(c['name'] for c in fake.workspaces[ws_id]['components'].values()) == ['one', 'yes']
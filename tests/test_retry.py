@@ -0,0 +1,58 @@
+import pytest
+
+from ardoqpy import ArdoqClient, RetryPolicy, TooManyRequests
+
+
+def test_retry_after_is_used():
+    assert RetryPolicy().delay(0, retry_after='7') == 7
+
+
+def test_retry_after_is_capped():
+    policy = RetryPolicy(max_retry_after=30)
+    assert policy.delay(0, retry_after='86400') == 30
+    assert policy.delay(0, retry_after='Wed, 21 Oct 2099 07:28:00 GMT') == 30
+
+
+def test_backoff_without_retry_after():
+    policy = RetryPolicy(backoff=1, max_backoff=4)
+    assert all(0 <= policy.delay(attempt) <= 4 for attempt in range(10))
+
+
+def test_should_retry():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry('GET', 503, 0)
+    assert policy.should_retry('GET', None, 1)
+    assert not policy.should_retry('GET', 503, 2)
+    assert not policy.should_retry('GET', 404, 0)
+    assert policy.should_retry('POST', 429, 0)
+    assert not policy.should_retry('POST', 503, 0)
+    assert not policy.should_retry('POST', None, 0)
+
+
+def test_retries_throttled_requests(fake):
+    ws_id = fake.add_workspace(components=3)
+    fake.throttle = 0.5
+    ardoq = ArdoqClient(hosturl=fake.url, token='t', retry=RetryPolicy(max_retries=20, backoff=0))
+    for _ in range(10):
+        assert len(ardoq.get_workspace(ws_id=ws_id, aggregated=True)['components']) == 3
+    created = ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new', 'typeId': 'p0'})
+    assert fake.components[created['_id']]['name'] == 'new'
+    assert fake.stats()['status'].get(429)
+
+
+def test_retries_are_on_by_default(fake):
+    ws_id = fake.add_workspace()
+    fake.throttle = 0.5
+    ardoq = ArdoqClient(hosturl=fake.url, token='t')
+    for _ in range(5):
+        ardoq.get_workspace(ws_id=ws_id)
+    assert fake.stats()['status'].get(429)
+
+
+def test_no_retry(fake):
+    ws_id = fake.add_workspace()
+    fake.throttle = 1.0
+    ardoq = ArdoqClient(hosturl=fake.url, token='t', retry=None)
+    with pytest.raises(TooManyRequests):
+        ardoq.get_workspace(ws_id=ws_id)
+    assert fake.stats()['requests'] == 1
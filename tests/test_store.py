@@ -0,0 +1,21 @@
+import pytest
+
+from ardoqpy import ArdoqSyncClient
+from conftest import cache_state, server_state
+
+
+def test_cache_file_is_reused(fake, tmp_path):
+    ws_id = fake.add_workspace(components=5, references=3)
+    path = str(tmp_path / 'ws.db')
+    ArdoqSyncClient(hosturl=fake.url, token='t', cache_file=path).get_workspace(ws_id=ws_id)
+    ardoq = ArdoqSyncClient(hosturl=fake.url, token='t', cache_file=path, stream=True)
+    requests = fake.stats()['requests']
+    ardoq.get_workspace(ws_id=ws_id)
+    assert fake.stats()['requests'] == requests + 1  # only the stamp
+    assert cache_state(ardoq, ws_id) == server_state(fake, ws_id)
+
+
+@pytest.mark.parametrize('kwargs', [{'stream': True}, {'cache_file': 'ws.db'}])
+def test_aggregated_modes_need_v1(kwargs):
+    with pytest.raises(ValueError):
+        ArdoqSyncClient(hosturl='http://localhost', token='t', version='v2', **kwargs)
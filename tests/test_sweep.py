@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import cache_state, server_state, sync_client
+
+
+@pytest.mark.parametrize('mode', [{}, {'batch_size': 2}])
+def test_sweep(fake, mode):
+    ws_id = fake.add_workspace(components=6, references=0, type_count=1)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    comps = ardoq.ws[ws_id]['components']
+    ardoq.create_reference(ref={'rootWorkspace': ws_id, 'source': comps[1]['_id'], 'target': comps[0]['_id'],
+                                'type': 1})
+    ardoq.flush()
+    ardoq.start_sync([ws_id])
+    for c in comps[1:]:
+        ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': c['name'], 'typeId': c['typeId']})
+    res = ardoq.sweep()
+    assert [c['name'] for c in res['components']] == ['component 0']
+    assert len(res['cascaded']) == 1
+    assert cache_state(ardoq, ws_id) == server_state(fake, ws_id)
+    assert len(fake.workspaces[ws_id]['components']) == 5
+
+
+def test_sweep_uncaches_references_from_other_workspaces(fake):
+    ws_a = fake.add_workspace(components=4, type_count=1)
+    ws_b = fake.add_workspace(components=4, type_count=1)
+    ardoq = sync_client(fake, [ws_a, ws_b])
+    target = ardoq.ws[ws_a]['components'][0]
+    ardoq.create_reference(ref={'rootWorkspace': ws_b, 'source': ardoq.ws[ws_b]['components'][0]['_id'],
+                                'target': target['_id'], 'type': 1})
+    ardoq.start_sync([ws_a])
+    for c in ardoq.ws[ws_a]['components'][1:]:
+        ardoq.create_component(comp={'rootWorkspace': ws_a, 'name': c['name'], 'typeId': c['typeId']})
+    res = ardoq.sweep()
+    assert len(res['cascaded']) == 1
+    assert ardoq.ws[ws_b]['references'] == []
+    assert cache_state(ardoq, ws_b) == server_state(fake, ws_b)
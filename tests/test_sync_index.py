@@ -0,0 +1,31 @@
+import pytest
+
+from conftest import sync_client
+
+
+@pytest.mark.parametrize('mode', [{}, {'batch_size': 10}])
+def test_update_by_field_without_name(fake, mode):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    c = ardoq.find_component(ws_id=ws_id, comp_name='component 1')[0]
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'typeId': c['typeId'], 'owner': 'x'},
+                           field_name='name', field_value=c['name'])
+    ardoq.flush()
+    assert fake.components[c['_id']]['owner'] == 'x'
+    assert len(fake.workspaces[ws_id]['components']) == 3
+
+
+@pytest.mark.parametrize('mode', [{}, {'batch_size': 10}, {'write_workers': 2}])
+def test_create_by_field_without_name(fake, mode):
+    ws_id = fake.add_workspace(components=3, type_count=1)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'typeId': 'p0', 'code': 'NEW'},
+                           field_name='code', field_value='NEW')
+    ardoq.flush()
+    assert [c.get('code') for c in fake.workspaces[ws_id]['components'].values()].count('NEW') == 1
+    ardoq.create_component(comp={'rootWorkspace': ws_id, 'typeId': 'p0', 'code': 'NEW', 'owner': 'x'},
+                           field_name='code', field_value='NEW')
+    ardoq.flush()
+    assert [c.get('owner') for c in fake.workspaces[ws_id]['components'].values() if c.get('code') == 'NEW'] == ['x']
+    assert ardoq.report['new_comps'] == 1 and ardoq.report['updated_comps'] == 1
+    assert ardoq.find_component(ws_id=ws_id, comp_name='component 1', exact=True)
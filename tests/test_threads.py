@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import sync_client
+
+
+@pytest.mark.parametrize('mode', [{}, {'batch_size': 50}])
+def test_threads_create_each_component_once(fake, mode):
+    ws_id = fake.add_workspace(type_count=1)
+    ardoq = sync_client(fake, [ws_id], **mode)
+    fake.latency = 0.02
+
+    def create(i):
+        comp = {'rootWorkspace': ws_id, 'name': 'c%d' % (i // 4), 'typeId': 'p0', 'code': 'C%d' % (i // 4)}
+        if i % 2:  # half of the threads match by name, the other half by the code field
+            return ardoq.create_component(comp=comp, field_name='code', field_value=comp['code'])
+        return ardoq.create_component(comp=comp)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(create, range(40)))
+    ardoq.flush()
+    names = sorted(c['name'] for c in fake.workspaces[ws_id]['components'].values())
+    assert names == sorted('c%d' % i for i in range(10))
+
+
+def test_preload_and_writes_load_a_workspace_once(fake):
+    ws_id = fake.add_workspace(components=50, type_count=1)
+    events = []
+    ardoq = sync_client(fake, hooks=[events.append])
+    fake.latency = 0.05
+
+    def create(i):
+        return ardoq.create_component(comp={'rootWorkspace': ws_id, 'name': 'new%d' % i, 'typeId': 'p0'})
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(create, i) for i in range(4)] + [pool.submit(ardoq.preload, [ws_id])]
+        for f in futures:
+            f.result()
+    assert sum(1 for e in events if e.kind == 'request' and e.resource.endswith('aggregated')) == 1
+    assert len(ardoq.ws[ws_id]['components']) == 54